@@ -1,7 +1,9 @@
 from __future__ import annotations
+from time import perf_counter
 from threading import Thread
-from typing import Callable
+from typing import Callable, Iterable
 import tkinter as tk
+import os
 
 try:
     from .terminaltk.sprites.creator import TkSpriteCache
@@ -16,6 +18,10 @@ except ImportError:
 ESuccess:type = bool|None # Optional[bool]
 Task:type = Callable[[], ESuccess|tuple[ESuccess,str]]
 DisplayText:type = Callable[str,None]
+TaskID:type = int
+
+PENDING, RUNNING, DONE, CANCELLED = range(4)
+POLL_INTERVAL:int = 50 # How often (in ms) to check for finished tasks
 
 class TaskList(tk.Frame):
     """
@@ -25,25 +31,33 @@ class TaskList(tk.Frame):
         * A string or none (extra info to be shown)
     The `display_text` option must be a `DisplayText`
 
+    Tasks run after the tasks in their `after` (by default, after the task
+    added before them). Tasks whose dependencies are done run at the same
+    time (up to `workers` of them). If a task fails (and not
+    `continue_on_fail`), everything that depends on it is cancelled. Tasks
+    are started and reported on from tkinter's thread.
+
     Options:
         bg, background, fg, foreground, font, display_text
     Options only on __init__:
         wait_sprite, tick_sprite, warn_sprite, cross_sprite, sprite_size
-        continue_on_fail grab_set
+        continue_on_fail grab_set workers
 
     Methods:
-        add(name:str, func:Task)
+        add(name:str, func:Task, after:Iterable[TaskID]|None) -> TaskID
         start()
 
     Properties:
-        idx:int # The index of the next task to be run
+        idx:int # The number of tasks started
+        timings:list[float|None] # How long (in seconds) each task took
     """
 
     __slots__ = "_sprites", "_fg", "_font", \
                 "_spinner", "_correct", "_wrong", "_sprite_size", \
                 "_continue_on_fail", "_display_text", \
                 "_idx", "_widgets", "_tasks", \
-                "_done_setup", "_waiting", "esuccess"
+                "_done_setup", "_waiting", "esuccess", "_workers", \
+                "_deps", "_status", "_results", "_times", "_gifs"
 
     def __init__(self, master:tk.Misc=None, **kwargs:dict) -> None:
         self._done_setup:bool = False
@@ -57,7 +71,13 @@ class TaskList(tk.Frame):
         self._zero:str = "warning"
         self._wrong:str = "x-red"
         self._sprite_size:int = 13
+        self._workers:int = os.cpu_count() or 1
         # State variables
+        self._deps:list[tuple[TaskID]] = []
+        self._status:list[int] = []
+        self._results:dict[TaskID:tuple[ESuccess,str]] = {}
+        self._times:list[list[float]] = []
+        self._gifs:dict[TaskID:object] = {}
         self._idx:int = 0
         self._state:int = 0 # 0(settingup) => 1(running) => 2(done)
         self._waiting:bool = False
@@ -76,6 +96,10 @@ class TaskList(tk.Frame):
     def idx(self) -> int:
         return self._idx
 
+    @property
+    def timings(self) -> list[float|None]:
+        return [end-start if end else None for start, end in self._times]
+
     def _toplevel(self) -> tk.Toplevel|tk.Tk:
         widget:tk.Misc = self
         while not isinstance(widget, tk.Tk|tk.Toplevel|BetterTk):
@@ -107,6 +131,9 @@ class TaskList(tk.Frame):
                 self._spinner = kwargs.pop(key)
             elif (key == "continue_on_fail") and (not self._done_setup):
                 self._continue_on_fail = kwargs.pop(key)
+            elif (key == "workers") and (not self._done_setup):
+                self._workers = kwargs.pop(key)
+                assert self._workers > 0, "ValueError"
             elif (key == "grab_set") and (not self._done_setup):
                 if not kwargs.pop("grab_set"): continue
                 try:
@@ -137,6 +164,8 @@ class TaskList(tk.Frame):
             return self._spinner
         if key == "continue_on_fail":
             return self._continue_on_fail
+        if key == "workers":
+            return self._workers
         if key == "display_text":
             return self._display_text
         return super().cget(key)
@@ -144,9 +173,20 @@ class TaskList(tk.Frame):
     def _redraw(self) -> None:
         pass # TODO
 
-    def add(self, task_name:str, func:Task, *, threaded:bool=True) -> None:
+    def add(self, task_name:str, func:Task, *, threaded:bool=True,
+            after:Iterable[TaskID]|None=None) -> TaskID:
+        """
+        Adds a task that runs after the tasks in `after` (if None, after the
+        last task added). Returns the task's id for use in `after`.
+        """
         assert self._state == 0, "RuntimeError"
         idx:int = len(self._widgets)
+        if after is None:
+            after:tuple[TaskID] = (idx-1,) if idx else ()
+        after:tuple[TaskID] = tuple(after)
+        for dep in after:
+            assert isinstance(dep, int), "TypeError"
+            assert 0 <= dep < idx, "Dependencies must be added first"
         bg:str = self.cget("bg")
         sep:dict = dict(bd=0, highlightthickness=0, width=1, height=1,
                         bg=self._fg)
@@ -170,64 +210,98 @@ class TaskList(tk.Frame):
         # Update state
         self._widgets.append((label, spinner))
         self._tasks.append((task_name, func, threaded))
+        self._deps.append(after)
+        self._status.append(PENDING)
+        self._times.append([0, 0])
+        return idx
 
     def start(self) -> None:
         assert self._state == 0, "RuntimeError"
         self._state:int = 1
-        self._next()
-
-    def _next(self) -> None:
-        assert self._state == 1, "RuntimeError"
-        esuccess, text = True, None
-
+        self._schedule()
+        self._poll()
+
+    def _schedule(self) -> None:
+        """
+        Start all of the tasks that are ready (up to the worker limit) or
+        finish if nothing is left
+        """
+        for idx, status in enumerate(self._status):
+            if self._status.count(RUNNING) >= self._workers:
+                break
+            if status != PENDING:
+                continue
+            if all(self._status[dep] == DONE for dep in self._deps[idx]):
+                self._start_task(idx)
+        if (PENDING not in self._status) and (RUNNING not in self._status):
+            if self._waiting: self.quit()
+            self._state:int = 2
+            self.on_finished()
+        elif RUNNING not in self._status:
+            # Can only happen if a dependency was cancelled
+            raise RuntimeError("TaskList deadlocked")
+
+    def _start_task(self, idx:TaskID) -> None:
         def call() -> None:
-            nonlocal esuccess, text, _state
             result:object = func()
             if isinstance(result, ESuccess):
                 result:tuple[ESuccess,str] = (result, "")
-            esuccess, text = result
-            _state = 1 # Done
-
-        def wait_done() -> None:
-            nonlocal esuccess, text, name, _state
-            if _state == 0:
-                self.after(100, wait_done)
-                return None
-            # Update spinner
-            gif.stop()
-            if esuccess:
-                sprite:str = self._correct
-            elif esuccess is None:
-                sprite:str = self._zero
-            else:
-                sprite:str = self._wrong
-            spinner.config(image=self._sprites[sprite])
-            if text:
-                spinner.config(command=lambda: self._display_text(text))
-            # Update self.esuccess
-            if self.esuccess:
-                self.esuccess:ESuccess = esuccess
-            # Check if we should continue or not
-            _continue:bool = ((esuccess in (True,None)) or \
-                              self._continue_on_fail) and \
-                             (self._idx < len(self._tasks))
-            if _continue:
-                self._next()
-            else:
-                if self._waiting: self.quit()
-                self._state:int = 2
-                self.on_finished()
+            self._times[idx][1] = perf_counter()
+            self._results[idx] = result
 
-        idx, self._idx = self._idx, self._idx+1
-        _state:int = 0 # Waiting
+        self._idx += 1
+        self._status[idx] = RUNNING
         name, func, threaded = self._tasks[idx]
         label, spinner = self._widgets[idx]
         gif = self._sprites.display_gif(self._spinner, 300,
                                         lambda img: spinner.config(image=img))
         gif.start()
+        self._gifs[idx] = gif
+        self._times[idx][0] = perf_counter()
         thread:Thread = Thread(target=call, daemon=True)
         (thread.start if threaded else thread.run)()
-        wait_done()
+
+    def _poll(self) -> None:
+        if self._state != 1:
+            return None
+        for idx in list(self._results):
+            self._task_done(idx, *self._results.pop(idx))
+        self._schedule()
+        if self._state == 1:
+            self.after(POLL_INTERVAL, self._poll)
+
+    def _task_done(self, idx:TaskID, esuccess:ESuccess, text:str) -> None:
+        self._status[idx] = DONE
+        label, spinner = self._widgets[idx]
+        # Update spinner
+        self._gifs.pop(idx).stop()
+        if esuccess:
+            sprite:str = self._correct
+        elif esuccess is None:
+            sprite:str = self._zero
+        else:
+            sprite:str = self._wrong
+        spinner.config(image=self._sprites[sprite])
+        if text:
+            spinner.config(command=lambda: self._display_text(text))
+        label.config(text=f"{self._tasks[idx][0]} ({self.timings[idx]:.2f}s)")
+        # Update self.esuccess
+        if self.esuccess:
+            self.esuccess:ESuccess = esuccess
+        if (esuccess is False) and (not self._continue_on_fail):
+            self._cancel_dependants(idx)
+
+    def _cancel_dependants(self, failed:TaskID) -> None:
+        cancelled:set[TaskID] = {failed}
+        for idx in range(failed+1, len(self._tasks)):
+            if self._status[idx] != PENDING:
+                continue
+            if cancelled.intersection(self._deps[idx]):
+                cancelled.add(idx)
+                self._status[idx] = CANCELLED
+                label, spinner = self._widgets[idx]
+                spinner.config(image=self._sprites[self._wrong])
+                label.config(text=f"{self._tasks[idx][0]} (cancelled)")
 
     def destroy(self) -> None:
         super().destroy()
@@ -276,9 +350,11 @@ class TaskListWindow(BetterTk):
         if self.autoclose and self.tasklist.esuccess:
             super().destroy()
 
-    def add(self, task_name:str, func:Task, *, threaded:bool=True) -> None:
+    def add(self, task_name:str, func:Task, *, threaded:bool=True,
+            after:Iterable[TaskID]|None=None) -> TaskID:
         assert self.tasklist._state == 0, "RuntimeError"
-        self.tasklist.add(task_name, func, threaded=threaded)
+        return self.tasklist.add(task_name, func, threaded=threaded,
+                                 after=after)
 
     def start(self) -> None:
         assert self.tasklist._state == 0, "RuntimeError"
@@ -291,26 +367,35 @@ class TaskListWindow(BetterTk):
     def idx(self) -> int:
         return self.tasklist.idx
 
+    @property
+    def timings(self) -> list[float|None]:
+        return self.tasklist.timings
+
 
 if __name__ == "__main__":
     from time import sleep
 
-    def task_sleep(sleep_time:float, tkinter:bool) -> Task:
+    def task_sleep(sleep_time:float, tkinter:bool, fail:bool=False) -> Task:
         def inner() -> ESuccess|tuple[ESuccess,str]:
-            print(f"Starting {tl.idx-1}")
+            print(f"Starting sleep {sleep_time}")
             if tkinter:
                 tl.after(int(sleep_time*1000), tl.quit)
                 tl.mainloop()
             else:
                 sleep(sleep_time)
-            print(f"Ending {tl.idx-1}")
+            print(f"Ending sleep {sleep_time}")
+            if fail:
+                return False, "Failed on purpose"
             return True if sleep_time > 1 else None, str(sleep_time)
         return inner
 
     master:tk.Tk = tk.Tk()
     tk.Button(master, text="Button", command=lambda:print("Hi\r")).pack()
-    tl:TaskList = TaskListWindow(master, autoclose=True)
-    tl.add("Sleep 2", task_sleep(2, True), threaded=False)
-    tl.add("Sleep 2", task_sleep(2, False))
-    tl.add("Sleep 1", task_sleep(1, False))
-    print(tl.wait())
+    tl:TaskList = TaskListWindow(master, autoclose=False, workers=2)
+    first:TaskID = tl.add("Sleep 2", task_sleep(2, True), threaded=False)
+    # These 2 run at the same time
+    a:TaskID = tl.add("Sleep 2", task_sleep(2, False), after=[first])
+    b:TaskID = tl.add("Fail 1", task_sleep(1, False, True), after=[first])
+    tl.add("Sleep 1 (after both)", task_sleep(1, False), after=[a, b])
+    tl.add("Sleep 1.5", task_sleep(1.5, False), after=[a])
+    print(tl.wait(), tl.timings)
@@ -0,0 +1,297 @@
+"""
+A benchmark for the IPC that doesn't need Tk. It spawns N-1 local child
+processes and measures, for every transport and serialiser:
+    * one-way latency (p50/p99) from the master to the children
+    * round-trip latency (p50/p99) of `IPC.call`
+    * messages/s and bytes/s when sending back-to-back
+    * the CPU used by an idle process (in CPU seconds per second)
+for small and 64KiB payloads. The results are printed as JSON so that runs
+can be compared.
+
+Usage:
+    python3 benchmark.py [--procs 3] [--messages 200] [--idle 2] [--out file]
+    python3 benchmark.py --test
+
+`--test` only checks (for every serialiser) that data that can't be
+serialised raises in `event_generate` without breaking the sender for that
+pid, and that senders to pids that went away are retired.
+
+Latencies use `time.monotonic` which is system-wide on Linux and Windows so
+timestamps from different processes can be compared.
+"""
+from __future__ import annotations
+from time import monotonic, sleep, process_time
+from subprocess import Popen, PIPE
+from threading import Lock
+import argparse
+import json
+import sys
+import os
+
+import serialiser
+import ipc as _ipc
+from ipc import IPC, Event, SIGUSR1, SELF_PID
+
+
+PAYLOADS:dict[str:int] = {"small":16, "64KiB":64*1024}
+# Only one transport (message files + named semaphores) exists for now
+TRANSPORTS:tuple[str] = ("files",)
+READY_TIMEOUT:float = 10
+DRAIN_TIMEOUT:float = 30
+
+
+def percentile(values:list[float], p:float) -> float|None:
+    if not values:
+        return None
+    values:list[float] = sorted(values)
+    return values[min(len(values)-1, int(len(values)*p/100))]
+
+def summarise(latencies:list[float]) -> dict[str:float|None]:
+    return {"p50_ms": _ms(percentile(latencies, 50)),
+            "p99_ms": _ms(percentile(latencies, 99)),
+            "n": len(latencies)}
+
+def _ms(seconds:float|None) -> float|None:
+    return None if seconds is None else seconds*1000
+
+
+class Child:
+    """
+    Records the latency and size of every "bench" event it gets and lets the
+    master read/reset the stats using `IPC.call`
+    """
+    __slots__ = "ipc", "lock", "latencies", "n", "bytes", "first", "last", \
+                "done"
+
+    def __init__(self, name:str) -> Child:
+        self.lock:Lock = Lock()
+        self.done:bool = False
+        self.reset()
+        self.ipc:IPC = IPC(name, sig=SIGUSR1)
+        self.ipc.register_call("echo", lambda event: event.data)
+        self.ipc.register_call("stats", lambda event: self.stats())
+        self.ipc.register_call("reset", lambda event: self.reset())
+        self.ipc.register_call("cpu", lambda event: process_time())
+        self.ipc.bind("bench", self.got, serial=True)
+        self.ipc.bind("bench-exit", lambda event: setattr(self, "done", True))
+
+    def got(self, event:Event) -> None:
+        now:float = monotonic()
+        with self.lock:
+            if self.first is None:
+                self.first:float = now
+            self.last:float = now
+            self.latencies.append(now-event.data["t"])
+            self.bytes += len(event.data["payload"])
+            self.n += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.latencies:list[float] = []
+            self.first:float|None = None
+            self.last:float|None = None
+            self.bytes:int = 0
+            self.n:int = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"n":self.n, "bytes":self.bytes, "first":self.first,
+                    "last":self.last, "latencies":list(self.latencies)}
+
+    def mainloop(self, master:int) -> None:
+        while (not self.done) and self.ipc.find_where(str(master)):
+            sleep(0.1)
+        self.ipc.close(close_signals=True)
+
+
+class Master:
+    __slots__ = "ipc", "children", "procs", "args"
+
+    def __init__(self, name:str, format:str, args:argparse.Namespace) -> Master:
+        self.args:argparse.Namespace = args
+        self.ipc:IPC = IPC(name, sig=SIGUSR1)
+        command:list[str] = [sys.executable, __file__, "--child", name,
+                             "--serialiser", format, "--master", str(SELF_PID)]
+        self.procs:list[Popen] = [Popen(command)
+                                  for _ in range(args.procs-1)]
+        self.children:list[int] = [proc.pid for proc in self.procs]
+        start:float = monotonic()
+        while set(self.children) - self.ipc.bound_pids("bench"):
+            if monotonic()-start > READY_TIMEOUT:
+                raise TimeoutError("Children didn't start in time")
+            sleep(0.01)
+
+    def close(self) -> None:
+        self.ipc.event_generate("bench-exit", where="others",
+                                ignore_bad_pids=True)
+        self.ipc.close()
+        for proc in self.procs:
+            proc.wait()
+
+    def call_all(self, name:str) -> list[object]:
+        futures:list = [self.ipc.call(pid, name, timeout=DRAIN_TIMEOUT)
+                        for pid in self.children]
+        return [future.result() for future in futures]
+
+    def send(self, payload:bytes) -> None:
+        self.ipc.event_generate("bench", where="others",
+                                data={"t":monotonic(), "payload":payload})
+
+    def one_way(self, payload:bytes) -> dict:
+        self.call_all("reset")
+        for _ in range(self.args.messages):
+            self.send(payload)
+            # Leave enough time between messages that we measure the latency
+            #   and not how long the message sat in a queue
+            self.ipc.flush()
+            sleep(0.002)
+        self.wait_for(self.args.messages)
+        latencies:list[float] = []
+        for stats in self.call_all("stats"):
+            latencies.extend(stats["latencies"])
+        return summarise(latencies)
+
+    def round_trip(self, payload:bytes) -> dict:
+        latencies:list[float] = []
+        for _ in range(self.args.messages):
+            start:float = monotonic()
+            self.ipc.call(self.children[0], "echo", payload,
+                          timeout=DRAIN_TIMEOUT).result()
+            latencies.append(monotonic()-start)
+        return summarise(latencies)
+
+    def throughput(self, payload:bytes) -> dict:
+        self.call_all("reset")
+        start:float = monotonic()
+        for _ in range(self.args.messages):
+            self.send(payload)
+        all_stats:list[dict] = self.wait_for(self.args.messages)
+        end:float = max(stats["last"] for stats in all_stats)
+        n:int = sum(stats["n"] for stats in all_stats)
+        size:int = sum(stats["bytes"] for stats in all_stats)
+        return {"msgs_per_s":n/(end-start), "bytes_per_s":size/(end-start),
+                "n":n}
+
+    def idle_cpu(self) -> dict:
+        children_before:list[float] = self.call_all("cpu")
+        before:float = process_time()
+        start:float = monotonic()
+        sleep(self.args.idle)
+        duration:float = monotonic()-start
+        master:float = (process_time()-before)/duration
+        children_after:list[float] = self.call_all("cpu")
+        # Ignore the cost of the "cpu" calls themselves (they are tiny)
+        children:list[float] = [(after-before)/duration for before, after in
+                                zip(children_before, children_after)]
+        return {"master_cpu_s_per_s":master,
+                "child_cpu_s_per_s":max(children, default=0)}
+
+    def wait_for(self, n:int) -> list[dict]:
+        start:float = monotonic()
+        while True:
+            all_stats:list[dict] = self.call_all("stats")
+            if all(stats["n"] >= n for stats in all_stats):
+                return all_stats
+            if monotonic()-start > DRAIN_TIMEOUT:
+                raise TimeoutError("Children didn't get all of the messages")
+            sleep(0.01)
+
+
+def test(args:argparse.Namespace) -> bool:
+    passed:bool = True
+    for format in serialiser.FORMATS:
+        _ipc.SERIALISERS = (format,)
+        args.procs:int = 2
+        master:Master = Master(f"ipc-test-{SELF_PID}-{format}", format, args)
+        try:
+            try:
+                master.ipc.event_generate("bench", where="others",
+                                          data={"payload":object()})
+                print(f"[{format}] Unserialisable data didn't raise")
+                passed:bool = False
+            except TypeError:
+                pass
+            master.send(b"after")
+            if not master.ipc.flush(timeout=5):
+                print(f"[{format}] Sender didn't flush after bad data")
+                passed:bool = False
+            master.wait_for(1)
+            # A pid that isn't listening retires its sender
+            proc:Popen = Popen([sys.executable, "-c", "input()"],
+                               stdin=PIPE)
+            master.ipc.event_generate("bench", where=str(proc.pid), data=0,
+                                      ignore_bad_pids=True)
+            master.ipc.flush(timeout=5)
+            proc.communicate(b"\n")
+            if proc.pid in master.ipc._senders:
+                print(f"[{format}] Sender for {proc.pid} wasn't retired")
+                passed:bool = False
+        except TimeoutError as error:
+            print(f"[{format}] {error}")
+            passed:bool = False
+        finally:
+            master.close()
+    return passed
+
+
+def run(args:argparse.Namespace) -> dict:
+    results:dict = {"procs":args.procs, "messages":args.messages,
+                    "idle_s":args.idle, "python":sys.version.split()[0],
+                    "platform":sys.platform, "runs":[]}
+    for transport in TRANSPORTS:
+        for format in serialiser.FORMATS:
+            _ipc.SERIALISERS = (format,)
+            name:str = f"ipc-benchmark-{SELF_PID}-{format}"
+            print(f"[BENCH]: {transport}/{format}", file=sys.stderr)
+            master:Master = Master(name, format, args)
+            try:
+                run:dict = {"transport":transport, "serialiser":format,
+                            "idle":master.idle_cpu(), "payloads":{}}
+                for payload_name, size in PAYLOADS.items():
+                    payload:bytes = b"x"*size
+                    run["payloads"][payload_name] = {
+                                        "size": size,
+                                        "one_way": master.one_way(payload),
+                                        "round_trip": master.round_trip(payload),
+                                        "throughput": master.throughput(payload),
+                                                    }
+                results["runs"].append(run)
+            finally:
+                master.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IPC benchmark")
+    parser.add_argument("--procs", type=int, default=3,
+                        help="number of processes including the master")
+    parser.add_argument("--messages", type=int, default=200,
+                        help="messages per measurement")
+    parser.add_argument("--idle", type=float, default=2,
+                        help="seconds to measure the idle CPU usage for")
+    parser.add_argument("--out", default=None, help="write the JSON here")
+    parser.add_argument("--test", action="store_true",
+                        help="only check the senders' error handling")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--serialiser", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--master", type=int, default=None,
+                        help=argparse.SUPPRESS)
+    args:argparse.Namespace = parser.parse_args()
+
+    if args.child is not None:
+        _ipc.SERIALISERS = (args.serialiser,)
+        Child(args.child).mainloop(args.master)
+    elif args.test:
+        if test(args):
+            print("Tests: \x1b[92mPassed\x1b[0m")
+        else:
+            print("Tests: \x1b[91mFailed\x1b[0m")
+            sys.exit(1)
+    else:
+        assert args.procs >= 2, "Need at least 1 child process"
+        output:str = json.dumps(run(args), indent=2)
+        if args.out is None:
+            print(output)
+        else:
+            with open(args.out, "w") as file:
+                file.write(output)
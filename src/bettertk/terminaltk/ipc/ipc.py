@@ -1,12 +1,17 @@
 from __future__ import annotations
-from threading import Thread, Lock, Event as _Event
+from threading import Thread, Lock, Condition, Event as _Event
+from concurrent.futures import Future, CancelledError
+from collections import defaultdict, deque
 from contextlib import contextmanager
-from collections import defaultdict
+from time import sleep, perf_counter
 from datetime import datetime
+from itertools import count
 from typing import Callable
-from time import sleep
 from os import environ
+import traceback
+import selectors
 import tempfile
+import heapq
 
 try:
     from .tmpfs.os_tools import *
@@ -19,13 +24,45 @@ except ImportError:
 TimeStamp:type = float
 EventType:type = str
 Threaded:type = bool
+Serial:type = bool
 Location:type = str
 BindID:type = int
 Break:type = bool
 Pid:type = int
+CallID:type = int
 Handler:type = Callable["Event",Break|None]
-EventBindings:type = list[tuple[Threaded,Handler]]
+CallHandler:type = Callable["Event",object]
+EventBindings:type = list[tuple[Threaded,Handler,Serial]]
 ATTEMPTS:int = 100 # Part of timeout process
+# The serialisers this process can decode (in order of preference) and the
+#   features it supports. They are advertised to the other processes in
+#   `CAPABILITIES_FILE`
+SERIALISERS:tuple[str] = ("binary", "json")
+FEATURES:tuple[str] = ("batch",)
+CAPABILITIES_FILE:str = "capabilities"
+# Events sent to the same pid within BATCH_WINDOW seconds of each other are
+#   merged into a single message (of at most BATCH_MAX_EVENTS events)
+BATCH_WINDOW:float = 0.001
+BATCH_MAX_EVENTS:int = 256
+# Threaded handlers run on at most POOL_WORKERS threads. If more than
+#   POOL_WARN_DEPTH handlers are waiting for a worker, it's logged
+POOL_WORKERS:int = 4
+POOL_WARN_DEPTH:int = 64
+# Events used by the IPCs to keep their peer registries up to date. They are
+#   never passed to the user's handlers
+JOIN_EVENT:EventType = "ipc-join"
+PEER_EVENT:EventType = "ipc-peer"
+LEAVE_EVENT:EventType = "ipc-leave"
+# Events used by `IPC.call`
+CALL_EVENT:EventType = "ipc-call"
+REPLY_EVENT:EventType = "ipc-reply"
+CANCEL_EVENT:EventType = "ipc-cancel"
+INTERNAL_EVENTS:frozenset[EventType] = frozenset((JOIN_EVENT, PEER_EVENT,
+                                                  LEAVE_EVENT, CALL_EVENT,
+                                                  REPLY_EVENT, CANCEL_EVENT))
+# How often (in seconds) to check if peers are alive when pidfds aren't
+#   supported
+PEER_POLL_INTERVAL:float = 2
 
 if environ.get("IPC_LOG_PATH", None):
     LOG:File|None = open(environ.get("IPC_LOG_PATH"), "a+")
@@ -142,6 +179,10 @@ class TmpFilesystem:
         with self.lock_wrapper("fs_write.lock"):
             os.remove(self.normalise(path))
 
+    def rename(self, src:str, dst:str) -> None:
+        # Atomic if both paths are on the same filesystem
+        os.replace(self.normalise(src), self.normalise(dst))
+
     def join(self, *paths:tuple[str]) -> str:
         return os.path.join(*paths)
 
@@ -208,6 +249,384 @@ class Event:
 serialiser.register(Event, "ipc.Event", Event.serialise, Event.deserialise)
 
 
+class _Sender:
+    """
+    Sends events to a single pid. `IPC.event_generate` queues the events and
+    a single thread sends them in order. All of the events queued since the
+    last send are merged into one message so a burst of events only costs a
+    single file and a single signal. The sender retires (and drops whatever
+    is left in its queue) once its pid can't be reached.
+    """
+    __slots__ = "ipc", "pid", "dead", "_queue", "_lock", "_wake", "_idle"
+
+    def __init__(self, ipc:IPC, pid:Pid) -> _Sender:
+        self._queue:list[tuple[Event,int,bool]] = []
+        self._lock:Lock = Lock()
+        self._wake:_Event = _Event()
+        self._idle:_Event = _Event()
+        self._idle.set()
+        self.dead:bool = False
+        self.ipc:IPC = ipc
+        self.pid:Pid = pid
+        Thread(target=self._loop, daemon=True).start()
+
+    def put(self, event:Event, *, timeout:int, ignore_bad_pids:bool) -> bool:
+        """
+        Queue event. Returns false if the sender was retired/closed
+        """
+        with self._lock:
+            if self.dead:
+                return False
+            self._queue.append((event, timeout, ignore_bad_pids))
+            self._idle.clear()
+            self._wake.set()
+        return True
+
+    def flush(self, timeout:float|None=None) -> bool:
+        """
+        Block until everything queued has been sent. Returns false on timeout
+        """
+        return self._idle.wait(timeout)
+
+    def close(self, timeout:float|None=None) -> None:
+        self.flush(timeout)
+        with self._lock:
+            self.dead:bool = True
+        self._wake.set()
+
+    def retire(self) -> None:
+        """
+        Stop sending to pid (it's gone). `IPC._get_sender` makes a new sender
+        if pid is sent to again (it might have been a pid that wasn't
+        listening yet)
+        """
+        with self.ipc._senders_lock:
+            if self.ipc._senders.get(self.pid, None) is self:
+                self.ipc._senders.pop(self.pid)
+        with self._lock:
+            self.dead:bool = True
+            self._queue.clear()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait()
+            if BATCH_WINDOW and (not self.dead):
+                sleep(BATCH_WINDOW)
+            with self._lock:
+                batch:list[tuple[Event,int,bool]] = \
+                                               self._queue[:BATCH_MAX_EVENTS]
+                del self._queue[:BATCH_MAX_EVENTS]
+                if not self._queue:
+                    self._wake.clear()
+            if batch:
+                self._send(batch)
+            with self._lock:
+                if not self._queue:
+                    self._idle.set()
+                    if self.dead:
+                        break
+
+    def _send(self, batch:list[tuple[Event,int,bool]]) -> None:
+        if self.ipc.dead:
+            return None
+        events:list[Event] = [event for event, _, _ in batch]
+        timeout:int = max(timeout for _, timeout, _ in batch)
+        ignore:bool = all(ignore for _, _, ignore in batch)
+        try:
+            if not self.ipc._send_events(self.pid, events, timeout=timeout):
+                self.retire()
+        except ProcessLookupError as error:
+            self.retire()
+            if not ignore:
+                log(f"failed to send {len(events)} events to {self.pid}: " \
+                    f"{error!r}", 1)
+        except FileExistsError as error:
+            if not ignore:
+                log(f"failed to send {len(events)} events to {self.pid}: " \
+                    f"{error!r}", 1)
+        except Exception:
+            # Don't let a single bad batch kill the thread
+            log(f"error sending {len(events)} events to {self.pid}:\n" \
+                f"{traceback.format_exc()}", 1)
+
+
+class _HandlerPool:
+    """
+    A bounded pool of worker threads that runs the threaded handlers.
+    Handlers submitted with `serial=True` never run concurrently with
+    themselves so they see the events in the order they arrived.
+    It also keeps track of the queue depth and how long handlers wait for a
+    worker and take to run.
+    """
+    __slots__ = "_tasks", "_cond", "_workers", "_idle", "_serial", "_stop", \
+                "_stats"
+
+    def __init__(self) -> _HandlerPool:
+        self._tasks:deque[tuple[Handler,Event,float,Serial]] = deque()
+        self._serial:dict[Handler:deque[tuple[Event,float]]] = {}
+        self._cond:Condition = Condition(Lock())
+        self._stop:bool = False
+        self._workers:int = 0
+        self._idle:int = 0
+        self._stats:dict[str:float] = dict(submitted=0, completed=0,
+                                           max_depth=0, total_wait=0,
+                                           total_run=0, max_wait=0)
+
+    def submit(self, handler:Handler, event:Event, serial:Serial) -> None:
+        queued_at:float = perf_counter()
+        with self._cond:
+            self._stats["submitted"] += 1
+            if serial:
+                # If the handler is already running/queued, wait our turn
+                pending:deque|None = self._serial.get(handler, None)
+                if pending is not None:
+                    pending.append((event,queued_at))
+                    return None
+                self._serial[handler] = deque()
+            self._tasks.append((handler,event,queued_at,serial))
+            depth:int = len(self._tasks)
+            if depth > self._stats["max_depth"]:
+                self._stats["max_depth"] = depth
+            if depth == POOL_WARN_DEPTH:
+                log(f"handler pool falling behind ({depth=})", 1)
+            if self._idle:
+                self._cond.notify()
+            elif self._workers < POOL_WORKERS:
+                self._workers += 1
+                Thread(target=self._worker, daemon=True).start()
+
+    def stats(self) -> dict[str:float]:
+        with self._cond:
+            stats:dict[str:float] = dict(self._stats)
+            stats["depth"] = len(self._tasks)
+            stats["workers"] = self._workers
+        completed:int = stats.pop("completed") or 1
+        stats["avg_wait"] = stats.pop("total_wait")/completed
+        stats["avg_run"] = stats.pop("total_run")/completed
+        return stats
+
+    def close(self) -> None:
+        with self._cond:
+            self._stop:bool = True
+            self._cond.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while (not self._tasks) and (not self._stop):
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if not self._tasks:
+                    self._workers -= 1
+                    return None
+                handler, event, queued_at, serial = self._tasks.popleft()
+            start:float = perf_counter()
+            try:
+                handler(event)
+            except Exception:
+                traceback.print_exc()
+            end:float = perf_counter()
+            log(f"threaded binding for event[{id(event)}] ({handler!r}) " \
+                f"waited {(start-queued_at)*1000:.1f}ms and ran for " \
+                f"{(end-start)*1000:.1f}ms", 4)
+            with self._cond:
+                self._stats["completed"] += 1
+                self._stats["total_wait"] += start-queued_at
+                self._stats["total_run"] += end-start
+                self._stats["max_wait"] = max(self._stats["max_wait"],
+                                              start-queued_at)
+                if serial:
+                    pending:deque = self._serial[handler]
+                    if pending:
+                        event, queued_at = pending.popleft()
+                        self._tasks.append((handler,event,queued_at,serial))
+                    else:
+                        self._serial.pop(handler)
+
+
+class _PeerRegistry:
+    """
+    The in-memory view of the other processes using the same IPC name and the
+    events each of them is bound to. Peers announce themselves when they
+    join/leave and dead peers are detected using pidfds (or by polling
+    `pid_exists` every `PEER_POLL_INTERVAL` seconds where pidfds aren't
+    available). `on_dead` is called (from the watcher thread) with the pid of
+    every peer that died without saying goodbye.
+    """
+    __slots__ = "_peers", "_pidfds", "_lock", "_selector", "_on_dead", "_stop"
+
+    def __init__(self, on_dead:Callable[[Pid],None]) -> _PeerRegistry:
+        self._peers:dict[Pid:frozenset[EventType]] = {}
+        self._pidfds:dict[Pid:int] = {}
+        self._on_dead:Callable[[Pid],None] = on_dead
+        self._lock:Lock = Lock()
+        self._stop:bool = False
+        if hasattr(os, "pidfd_open"):
+            self._selector:selectors.BaseSelector = selectors.DefaultSelector()
+        else:
+            self._selector:selectors.BaseSelector|None = None
+        Thread(target=self._watch, daemon=True).start()
+
+    def add(self, pid:Pid, events:Iterable[EventType]) -> None:
+        """
+        Add a peer or replace the set of events it's bound to
+        """
+        with self._lock:
+            is_new:bool = pid not in self._peers
+            self._peers[pid] = frozenset(events)
+        if is_new:
+            log(f"peer {pid} joined", 3)
+            self._watch_pid(pid)
+
+    def remove(self, pid:Pid) -> bool:
+        with self._lock:
+            existed:bool = self._peers.pop(pid, None) is not None
+            pidfd:int|None = self._pidfds.pop(pid, None)
+        if pidfd is not None:
+            try:
+                self._selector.unregister(pidfd)
+            except (KeyError, ValueError):
+                pass
+            os.close(pidfd)
+        if existed:
+            log(f"peer {pid} left", 3)
+        return existed
+
+    def pids(self) -> set[Pid]:
+        with self._lock:
+            return set(self._peers)
+
+    def bound_to(self, event:EventType) -> set[Pid]:
+        """
+        The pids of the peers that will handle event (including the peers
+        bound to all events)
+        """
+        with self._lock:
+            return {pid for pid, events in self._peers.items()
+                    if (event in events) or ("" in events)}
+
+    def __contains__(self, pid:Pid) -> bool:
+        with self._lock:
+            return pid in self._peers
+
+    def close(self) -> None:
+        """
+        Forget every peer and close their pidfds. The watcher thread closes
+        the selector when it notices (within `PEER_POLL_INTERVAL` seconds)
+        """
+        self._stop:bool = True
+        for pid in self.pids():
+            self.remove(pid)
+
+    def _watch_pid(self, pid:Pid) -> None:
+        if self._selector is None:
+            return None
+        try:
+            pidfd:int = os.pidfd_open(pid)
+        except ProcessLookupError:
+            self._dead(pid)
+            return None
+        except OSError:
+            return None # Kernel too old, `_watch` will poll this pid
+        with self._lock:
+            if self._stop or (pid not in self._peers):
+                os.close(pidfd)
+                return None
+            self._pidfds[pid] = pidfd
+            self._selector.register(pidfd, selectors.EVENT_READ, pid)
+
+    def _dead(self, pid:Pid) -> None:
+        if self.remove(pid):
+            log(f"peer {pid} died", 2)
+            self._on_dead(pid)
+
+    def _watch(self) -> None:
+        while not self._stop:
+            if self._selector is None:
+                sleep(PEER_POLL_INTERVAL)
+                ready:list[Pid] = []
+            else:
+                # A pidfd becomes readable when the process dies
+                ready:list[Pid] = [key.data for key, _ in
+                                   self._selector.select(PEER_POLL_INTERVAL)]
+            with self._lock:
+                unwatched:list[Pid] = [pid for pid in self._peers
+                                       if pid not in self._pidfds]
+            for pid in unwatched:
+                if not pid_exists(pid):
+                    ready.append(pid)
+            for pid in ready:
+                self._dead(pid)
+        if self._selector is not None:
+            with self._lock:
+                pidfds, self._pidfds = self._pidfds, {}
+            for pidfd in pidfds.values():
+                os.close(pidfd)
+            self._selector.close()
+
+
+class RemoteError(Exception):
+    """
+    Set on the future returned by `IPC.call` if the remote handler raised an
+    exception. `type_name` is the name of the exception's class and
+    `remote_traceback` is the formatted traceback from the other process.
+    """
+
+    def __init__(self, type_name:str, message:str,
+                 remote_traceback:str="") -> RemoteError:
+        super().__init__(f"{type_name}: {message}")
+        self.remote_traceback:str = remote_traceback
+        self.type_name:str = type_name
+        self.message:str = message
+
+
+class _Timeouts:
+    """
+    A single thread that calls `callback(key)` for every key that reaches its
+    deadline. Used instead of a `threading.Timer` per `IPC.call`.
+    """
+    __slots__ = "_heap", "_cond", "_callback", "_started", "_stop"
+
+    def __init__(self, callback:Callable[[object],None]) -> _Timeouts:
+        self._heap:list[tuple[float,int,object]] = []
+        self._callback:Callable[[object],None] = callback
+        self._cond:Condition = Condition(Lock())
+        self._started:bool = False
+        self._stop:bool = False
+
+    def add(self, key:object, timeout:float) -> None:
+        deadline:float = perf_counter() + timeout
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, id(key), key))
+            if not self._started:
+                self._started:bool = True
+                Thread(target=self._loop, daemon=True).start()
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._stop:bool = True
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stop:
+                    if self._heap:
+                        wait:float = self._heap[0][0] - perf_counter()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._stop:
+                    return None
+                _, _, key = heapq.heappop(self._heap)
+            self._callback(key)
+
+
 _sig_to_ipc:dict = {}
 def close_all_ipcs(close_signals:bool=True) -> None:
     while _sig_to_ipc:
@@ -220,7 +639,11 @@ def close_all_ipcs(close_signals:bool=True) -> None:
 
 class IPC:
     __slots__ = "name", "_bindings", "_bindings_lock", "_call_queue", "_fs", \
-                "_root", "_bound", "_old_signal", "dead", "sig"
+                "_root", "_old_signal", "dead", "sig", \
+                "_peer_caps", "_senders", "_senders_lock", "_msg_ids", \
+                "_pool", "_wake_r", "_wake_w", "_wake_event", \
+                "_tk_listeners", "_tk", "_peers", "_calls", "_call_ids", \
+                "_pending_calls", "_incoming_calls", "_call_timeouts"
 
     def __init__(self, name:str, sig) -> IPC:
         if sig in _sig_to_ipc:
@@ -232,7 +655,28 @@ class IPC:
         self._fs:TmpFilesystem = TmpFilesystem(name)
         self._bindings_lock:Lock = Lock()
         self._root:str = str(SELF_PID)
-        self._bound:bool = False
+        self._peer_caps:dict[Pid:frozenset[str]] = {}
+        self._senders:dict[Pid:_Sender] = {}
+        self._senders_lock:Lock = Lock()
+        self._msg_ids:Iterator[int] = count()
+        self._pool:_HandlerPool = _HandlerPool()
+        self._peers:_PeerRegistry = _PeerRegistry(self._peer_dead)
+        self._calls:dict[str:tuple[CallHandler,Threaded]] = {}
+        self._call_ids:Iterator[CallID] = count()
+        self._pending_calls:dict[CallID:tuple[Pid,Future]] = {}
+        self._incoming_calls:dict[tuple[Pid,CallID]:bool] = {}
+        self._call_timeouts:_Timeouts = _Timeouts(self._call_timed_out)
+        self._wake_event:_Event = _Event()
+        self._tk_listeners:list[Callable[[],None]] = []
+        self._tk:object|None = None
+        # Self-pipe written to when `_call_queue` gets something new. Tk on
+        #   Windows can't wait on pipes so only use it on posix
+        if os.name == "posix":
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+        else:
+            self._wake_r = self._wake_w = None
         self._old_signal = None
         self.dead:bool = False
         self.name:str = name
@@ -251,11 +695,14 @@ class IPC:
         """
         Generates an event at a location with arbitrary data.
         The location passed in is resolved into a set of pids by `find_where`
-        The timeout passed in is the number of milliseconds to try to send
-        the event for before raising a `FileExistsError` (target recieved too
-        many messages and hasn't handled them - might have died). The
-        `FileExistsError` is raised in another thread for speed reasons
-        If `ignore_bad_pids` is true, it ignores and skips timeout errors.
+        Events for other processes are queued and sent (in order) by a
+        persistent sender per pid, which merges events generated close
+        together into a single message. Use `flush` to wait for them.
+        The data is checked (serialised once) so data that can't be
+        serialised raises here and not in the sender's thread.
+        The timeout passed in is the number of milliseconds to try to notify
+        the target for before giving up (the target might have died). Errors
+        are logged from the sender's thread unless `ignore_bad_pids` is true.
         """
         assert not self.dead, "IPC already closed"
         if event == "":
@@ -266,37 +713,90 @@ class IPC:
         assert_type(event, EventType, "event")
         assert_type(ignore_bad_pids, bool, "ignore_bad_pids")
 
-        def inner(pid:int) -> None:
+        event:Event = Event(event, data, _from=self._root)
+        log(f"creating {event!r}", 4)
+        pids:set[Pid] = self.find_where(where, event=event.type)
+        if pids - {SELF_PID}:
+            # Both formats support the same objects so check with the fastest
+            serialiser.bin_dumps(event)
+        for pid in pids:
+            log(f"sending {event=!r} to {pid}", 1)
             if pid == SELF_PID:
-                log(f"sending {event=!r} to {SELF_PID}", 1)
                 self._got_event(event)
-            else:
-                try:
-                    log(f"sending {event=!r} to {SELF_PID}", 1)
-                    self._send_data(pid, data, timeout=timeout)
-                except (FileExistsError, ProcessLookupError) as error:
-                    if not ignore_bad_pids:
-                        raise error
+                continue
+            sender:_Sender = self._get_sender(pid)
+            # Retry if it was retired since `_get_sender` returned it
+            while not sender.put(event, timeout=timeout,
+                                 ignore_bad_pids=ignore_bad_pids):
+                sender:_Sender = self._get_sender(pid)
 
-        event:Event = Event(event, data, _from=self._root)
-        log(f"creating {event!r}", 4)
-        data:bytes = serialiser.dumps(event).encode("utf-8")
-        threads:list[Thread] = []
-        for pid in self.find_where(where):
-            thread:Thread = Thread(target=inner, args=(pid,), daemon=True)
-            threads.append(thread)
-            thread.start()
-        for thread in threads:
-            thread.join()
+    def flush(self, timeout:float|None=None) -> bool:
+        """
+        Blocks until all of the events queued by `event_generate` have been
+        sent. The timeout is in seconds. Returns false on timeout.
+        """
+        with self._senders_lock:
+            senders:list[_Sender] = list(self._senders.values())
+        return all([sender.flush(timeout) for sender in senders])
+
+    def call(self, pid:Pid, name:str, payload:object=None, *,
+             timeout:float|None=None) -> Future:
+        """
+        Call the handler registered (with `register_call`) as name in process
+        pid (a single pid, not a `Location`) and return a
+        `concurrent.futures.Future` for the result. The future fails with:
+            * `RemoteError` if the remote handler raised an exception
+            * `LookupError` if pid has no handler called name
+            * `TimeoutError` if there is no reply within timeout seconds
+            * `ProcessLookupError` if pid dies before replying
+        Cancelling the future tells pid to skip the call if it hasn't started
+        it yet. Either way its reply is ignored.
+        """
+        assert not self.dead, "IPC already closed"
+        assert_type(pid, Pid, "pid")
+        assert_type(name, str, "name")
+        future:Future = Future()
+        if not self.find_where(str(pid)):
+            future.set_exception(ProcessLookupError(f"No process with {pid=}"))
+            return future
+        call_id:CallID = next(self._call_ids)
+        self._pending_calls[call_id] = (pid, future)
+        future.add_done_callback(lambda f: self._call_done(call_id, f))
+        if timeout is not None:
+            self._call_timeouts.add(call_id, timeout)
+        log(f"calling {name!r} in {pid=} ({call_id=})", 2)
+        data:dict = {"id":call_id, "name":name, "payload":payload}
+        self.event_generate(CALL_EVENT, data=data, where=str(pid))
+        return future
+
+    def register_call(self, name:str, handler:CallHandler,
+                      threaded:Threaded=True) -> None:
+        """
+        Register a handler that other processes can call with `IPC.call`.
+        The handler gets an `Event` (its data is the payload and its `_from`
+        is the caller's pid) and its return value (or exception) is sent
+        back to the caller. If `threaded` is false, the handler is called from
+        `call_queued_events` like the non-threaded bindings.
+        """
+        assert not self.dead, "IPC already closed"
+        assert_type(name, str, "name")
+        assert_type(handler, Callable, "handler")
+        assert_type(threaded, Threaded, "threaded")
+        self._calls[name] = (handler, threaded)
+
+    def unregister_call(self, name:str) -> None:
+        self._calls.pop(name, None)
 
     def bind(self, event:EventType, handler:Handler,
-             threaded:Threaded=True) -> None:
+             threaded:Threaded=True, serial:Serial=False) -> None:
         """
         Bind a handler to an event. When this process receives an event
         matching the event passed in, the handler will be called.
         If `threaded` is true, then the handler will be immediately be called
-        from a new thread. If `threaded` is false, then the handler will be
-        called next time `call_queued_events` is called.
+        from a worker thread. If `serial` is also true, the handler is never
+        called concurrently with itself so it gets the events in order.
+        If `threaded` is false, then the handler will be called next time
+        `call_queued_events` is called.
         If a handler returns a truthy, then the handlers registered before it
         will not be called
 
@@ -313,12 +813,13 @@ class IPC:
         assert_type(event, EventType, "event")
         assert_type(handler, Callable, "handler")
         assert_type(threaded, Threaded, "threaded")
+        assert_type(serial, Serial, "serial")
         with self._bindings_lock:
-            self._bindings[event].append((threaded,handler))
+            is_new:bool = not self._bindings[event]
+            self._bindings[event].append((threaded,handler,serial))
         log(f"bound to {event!r}", 3)
-        if not self._bound:
-            self._add_listener() # Adds the listener for all events
-            self._bound:bool = True
+        if is_new:
+            self._announce()
 
     def unbind(self, event:EventType, handler:Handler=None) -> None:
         """
@@ -332,43 +833,117 @@ class IPC:
             if handler is None:
                 self._bindings[event].clear()
             else:
-                for i, (_,h) in enumerate(self._bindings[event]):
+                for i, (_,h,_) in enumerate(self._bindings[event]):
                     if h == handler:
                         self._bindings[event].pop(i)
-                        return None
+                        break
+            is_empty:bool = not self._bindings[event]
         log(f"unbound from {event!r}", 3)
+        if is_empty:
+            self._announce()
+
+    def _bound_events(self) -> list[EventType]:
+        with self._bindings_lock:
+            return sorted(event for event, bindings in self._bindings.items()
+                          if bindings)
 
-    def find_where(self, where:Location) -> set[Pid]:
+    def _announce(self, event:EventType=PEER_EVENT,
+                  where:Location="others") -> None:
+        """
+        Tell the peers which events we are bound to
+        """
+        self.event_generate(event, data=self._bound_events(), where=where,
+                            ignore_bad_pids=True)
+
+    def find_where(self, where:Location, *,
+                   event:EventType|None=None) -> set[Pid]:
         """
         Takes where (type Location) and returns the set of pids that match
         that location.
         Currently the only ones supported are:
+            * all (all procs)
             * others (all other proc)
             * this (only this proc)
+            * bound (only the other procs bound to `event`)
             * <pid> (the pid of the proc)
         You can pass multiple locations using "+" as a separator like this:
-            * "this+other" (all processes)
+            * "this+others" (all processes)
             * "123" (only the proc with pid=123)
             * "123+456" (only the procs with pids 123 and 456)
+        The other procs are looked up in the peer registry so this doesn't
+        touch the filesystem.
         """
         assert not self.dead, "IPC already closed"
         assert_type(where, Location, "where")
         locs:set[Pid] = set()
         for where in where.split("+"):
-            if where == "others":
-                all_pids:set[Pid] = {Pid(pid) for pid in self.get_all_pids()}
-                locs.update(all_pids-{SELF_PID})
+            if where == "all":
+                locs.update(self._peers.pids())
+                locs.add(SELF_PID)
+            elif where == "others":
+                locs.update(self._peers.pids())
             elif where == "this":
                 locs.add(SELF_PID)
+            elif where == "bound":
+                if event is None:
+                    raise ValueError('"bound" location needs an event')
+                locs.update(self._peers.bound_to(event))
             elif where.isdigit():
-                if pid_exists(int(where)):
-                    locs.add(Pid(where))
+                pid:Pid = Pid(where)
+                if (pid == SELF_PID) or (pid in self._peers):
+                    locs.add(pid)
+                elif pid_exists(pid):
+                    locs.add(pid) # Maybe not an IPC peer (yet)
             else:
                 raise NotImplementedError(f"Invalid location={where!r} - " \
                                           f"read documentation")
         log(f"find_where({where=!r}) => {locs}", 4)
         return locs
 
+    def bound_pids(self, event:EventType) -> set[Pid]:
+        """
+        Returns the pids of the other processes that are bound to event
+        (including those bound to all events)
+        """
+        return self._peers.bound_to(event)
+
+    def _peer_capabilities(self, pid:Pid) -> frozenset[str]:
+        """
+        Read (and cache) the capabilities that pid advertised. Processes that
+        don't advertise anything only understand single json events.
+        """
+        caps:frozenset[str]|None = self._peer_caps.get(pid, None)
+        if caps is not None:
+            return caps
+        path:str = self._fs.join(str(pid), CAPABILITIES_FILE)
+        try:
+            with self._fs.open(path, "r", lock=False) as file:
+                caps:frozenset[str] = frozenset(file.read().split())
+        except (FileNotFoundError, UnicodeDecodeError):
+            caps:frozenset[str] = frozenset()
+        log(f"{pid=} has capabilities {set(caps)}", 3)
+        self._peer_caps[pid] = caps
+        return caps
+
+    def _peer_format(self, pid:Pid) -> str:
+        """
+        Negotiate the serialiser used for messages sent to pid. We pick the
+        first of our `SERIALISERS` that pid advertised.
+        """
+        caps:frozenset[str] = self._peer_capabilities(pid)
+        for option in SERIALISERS:
+            if option in caps:
+                return option
+        return "json"
+
+    def _get_sender(self, pid:Pid) -> _Sender:
+        with self._senders_lock:
+            sender:_Sender|None = self._senders.get(pid, None)
+            if sender is None:
+                sender:_Sender = _Sender(self, pid)
+                self._senders[pid] = sender
+            return sender
+
     def _got_event(self, event:Event) -> None:
         """
         If we got an event, execute the handler (if threaded) or put it in a
@@ -376,26 +951,147 @@ class IPC:
         """
         assert not self.dead, "IPC already closed"
         assert_type(event, Event, "event")
+        if event.type in INTERNAL_EVENTS:
+            return self._got_internal_event(event)
         non_threaded_handlers:list[Handler] = []
         # In threaded handlers, ignore the return value
         bindings:list = self._bindings[event.type] + self._bindings[""]
         log(f"got event {event!r}", 1)
-        for (threaded,handler) in reversed(bindings):
+        for (threaded,handler,serial) in reversed(bindings):
             if handler is not None:
                 if threaded:
                     log(f"calling threaded binding for " \
                         f"event[{id(event)}] ({handler!r})", 2)
-                    Thread(target=handler, args=(event,), daemon=True).start()
+                    self._pool.submit(handler, event, serial)
                 else:
                     non_threaded_handlers.append(handler)
         # Add non-threaded handlers to queue
-        self._call_queue.append((non_threaded_handlers,event))
+        if non_threaded_handlers:
+            self._call_queue.append((non_threaded_handlers,event))
+            self.wakeup()
+
+    def _got_internal_event(self, event:Event) -> None:
+        """
+        Handle the events the peers use to keep their registries up to date
+        """
+        if not event._from.isdigit():
+            return None
+        pid:Pid = Pid(event._from)
+        log(f"got {event.type!r} from {pid}", 3)
+        if event.type == LEAVE_EVENT:
+            self._peers.remove(pid)
+            self._forget_peer(pid)
+            return None
+        if event.type == CALL_EVENT:
+            return self._got_call(pid, event)
+        if event.type == REPLY_EVENT:
+            return self._got_reply(pid, event.data)
+        if event.type == CANCEL_EVENT:
+            key:tuple[Pid,CallID] = (pid, event.data)
+            if key in self._incoming_calls:
+                self._incoming_calls[key] = True
+            return None
+        events:list[EventType] = event.data or []
+        self._peers.add(pid, [e for e in events if isinstance(e, EventType)])
+        if event.type == JOIN_EVENT:
+            self._announce(where=str(pid))
+
+    def _got_call(self, pid:Pid, event:Event) -> None:
+        """
+        Someone used `IPC.call` on us. Run the handler (in the pool or from
+        `call_queued_events`) and send back the result
+        """
+        data:dict = event.data
+        call_id:CallID = data["id"]
+        name:str = data["name"]
+        key:tuple[Pid,CallID] = (pid, call_id)
+        handler, threaded = self._calls.get(name, (None, True))
+        call_event:Event = Event(name, data.get("payload", None),
+                                 _from=event._from, timestamp=event.timestamp)
+
+        def run_call(call_event:Event) -> None:
+            if self._incoming_calls.pop(key, False):
+                log(f"skipping cancelled call {name!r} ({call_id=})", 2)
+                return None
+            reply:dict = {"id":call_id}
+            if handler is None:
+                reply.update(ok=False, type="LookupError",
+                             msg=f"No call registered as {name!r}", tb="")
+            else:
+                try:
+                    reply.update(ok=True, value=handler(call_event))
+                except Exception as error:
+                    reply.update(ok=False, type=type(error).__qualname__,
+                                 msg=str(error), tb=traceback.format_exc())
+            if not self.dead:
+                self.event_generate(REPLY_EVENT, data=reply, where=str(pid),
+                                    ignore_bad_pids=True)
+
+        self._incoming_calls[key] = False
+        if threaded:
+            self._pool.submit(run_call, call_event, False)
+        else:
+            self._call_queue.append(([run_call],call_event))
+            self.wakeup()
+
+    def _got_reply(self, pid:Pid, data:dict) -> None:
+        _, future = self._pending_calls.pop(data["id"], (None, None))
+        if (future is None) or future.done():
+            return None # Cancelled or timed out
+        if data.get("ok", False):
+            future.set_result(data.get("value", None))
+        elif data.get("type", None) == "LookupError":
+            future.set_exception(LookupError(data.get("msg", "")))
+        else:
+            future.set_exception(RemoteError(data.get("type", "Exception"),
+                                             data.get("msg", ""),
+                                             data.get("tb", "")))
+
+    def _call_done(self, call_id:CallID, future:Future) -> None:
+        pid, _ = self._pending_calls.pop(call_id, (None, None))
+        if future.cancelled() and (pid is not None) and (not self.dead):
+            log(f"cancelling call {call_id=} in {pid=}", 2)
+            self.event_generate(CANCEL_EVENT, data=call_id, where=str(pid),
+                                ignore_bad_pids=True)
+
+    def _call_timed_out(self, call_id:CallID) -> None:
+        _, future = self._pending_calls.pop(call_id, (None, None))
+        if (future is not None) and (not future.done()):
+            future.set_exception(TimeoutError(f"Call {call_id} timed out"))
+
+    def _peer_dead(self, pid:Pid) -> None:
+        # Clean up after the other process
+        self._forget_peer(pid)
+        try:
+            self._fs.removedir(str(pid))
+        except FileNotFoundError:
+            pass
+
+    def _forget_peer(self, pid:Pid) -> None:
+        self._peer_caps.pop(pid, None)
+        # Fail the calls that pid will never reply to
+        for call_id, (call_pid, future) in tuple(self._pending_calls.items()):
+            if (call_pid == pid) and (not future.done()):
+                self._pending_calls.pop(call_id, None)
+                future.set_exception(ProcessLookupError(f"{pid=} is gone"))
+        with self._senders_lock:
+            sender:_Sender|None = self._senders.pop(pid, None)
+        if sender is not None:
+            sender.close(timeout=0)
 
     def call_queued_events(self) -> None:
         """
-        Call this method regularly if you called `.bind(threaded=False)`.
-        It handles all of the handlers from the current thread.
+        Call this method when `wakeup_fd` is readable (or regularly) if you
+        called `.bind(threaded=False)`. It handles all of the handlers from
+        the current thread.
         """
+        self._wake_event.clear()
+        if self._wake_r is not None:
+            try:
+                while os.read(self._wake_r, 4096):
+                    pass
+            except (BlockingIOError, OSError):
+                pass
         while self._call_queue:
             handlers, event = self._call_queue.pop(0)
             for handler in handlers:
@@ -404,27 +1100,142 @@ class IPC:
                 ret:Break|None = handler(event)
                 if ret: break
 
+    def wakeup_fd(self) -> int|None:
+        """
+        Returns a file descriptor that becomes readable whenever there is
+        something for `call_queued_events` to do (which also reads from it).
+        Returns None on systems where the file descriptor can't be used with
+        the event loops (Windows).
+        """
+        return self._wake_r
+
+    def wakeup(self) -> None:
+        """
+        Wake up whoever is waiting on `wakeup_fd`/`wait_queued_events` and
+        `attach_tk`'s callbacks. Safe to call from any thread.
+        """
+        self._wake_event.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"\x00")
+            except (BlockingIOError, OSError):
+                pass # The pipe is full so it's already readable
+
+    def wait_queued_events(self, timeout:float|None=None) -> bool:
+        """
+        Block until there is something for `call_queued_events` to do. The
+        timeout is in seconds. Returns false on timeout.
+        """
+        return self._wake_event.wait(timeout)
+
+    def attach_tk(self, widget:tk.Misc, *, callback:Callable[[],None]=None,
+                  poll:int=200) -> Callable[[],None]:
+        """
+        Call `call_queued_events` from the Tk mainloop as soon as something
+        is queued (using `createfilehandler` on `wakeup_fd`) instead of
+        polling. After that, `callback` (if given) is called. Where Tk can't
+        wait on the file descriptor, it falls back to polling every `poll`
+        milliseconds. Returns a function that removes the callback.
+        """
+        assert not self.dead, "IPC already closed"
+        if callback is not None:
+            self._tk_listeners.append(callback)
+
+        def handler(*args:tuple) -> None:
+            if self.dead: return None
+            self.call_queued_events()
+            for listener in tuple(self._tk_listeners):
+                listener()
+
+        def poll_loop() -> None:
+            try:
+                handler()
+            finally:
+                if not self.dead:
+                    widget.after(poll, poll_loop)
+
+        if self._tk is None:
+            self._tk = widget.tk
+            if self._wake_r is None:
+                widget.after(poll, poll_loop)
+            else:
+                import tkinter as tk
+                self._tk.createfilehandler(self._wake_r, tk.READABLE, handler)
+            # Handle anything that was queued before we attached
+            widget.after_idle(handler)
+
+        def detach() -> None:
+            if callback in self._tk_listeners:
+                self._tk_listeners.remove(callback)
+        return detach
+
+    def handler_stats(self) -> dict[str:float]:
+        """
+        Returns (and logs) statistics about the threaded handlers: the number
+        of workers, current and maximum queue depth, the average/maximum time
+        handlers waited for a worker and the average time they ran for (all
+        times are in seconds).
+        """
+        stats:dict[str:float] = self._pool.stats()
+        log(f"handler stats: {stats}", 2)
+        return stats
+
     def get_all_pids(self) -> Iterable[str]:
+        """
+        Returns this process's pid and the pids of all of the peers in the
+        registry.
+        """
+        assert not self.dead, "IPC already closed"
+        yield str(SELF_PID)
+        for pid in self._peers.pids():
+            yield str(pid)
+
+    def _scan_pids(self) -> Iterable[Pid]:
         """
         Read all of the folders at the top of fs and assume any numbered
         folders are pids. If the pid doesn't exist, delete the folder.
+        Only used to find the peers when joining.
         """
-        assert not self.dead, "IPC already closed"
         for folder in self._fs.listdirs("."):
             if not folder.isdigit():
                 continue
             if int(folder) != SELF_PID:
                 # Clean up after the other process
                 if not pid_exists(int(folder)):
-                    self._fs.removedir(folder)
+                    try:
+                        self._fs.removedir(folder)
+                    except FileNotFoundError:
+                        pass
                     continue
-            yield folder
+            yield Pid(folder)
 
     def close(self, close_signals:bool=False) -> None:
         assert not self.dead, "IPC already closed"
         log(f"closing down", 1)
+        self.event_generate(LEAVE_EVENT, where="others", ignore_bad_pids=True)
+        # Give the senders a chance to send everything left in their queues
+        with self._senders_lock:
+            senders:list[_Sender] = list(self._senders.values())
+            self._senders.clear()
+        for sender in senders:
+            sender.close(timeout=1)
+        self._pool.close()
+        self._peers.close()
+        self._call_timeouts.close()
         _sig_to_ipc.pop(self.sig)
         self.dead:bool = True
+        for _, future in tuple(self._pending_calls.values()):
+            future.cancel()
+        if (self._tk is not None) and (self._wake_r is not None):
+            try:
+                self._tk.deletefilehandler(self._wake_r)
+            except Exception:
+                pass # The Tk interpreter might already be destroyed
+        if self._wake_r is not None:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+        self._wake_event.set()
         # signal only works in main thread of the main interpreter
         # signal_register(self.sig, self._old_signal)
         self._fs.removedir(self._root)
@@ -438,30 +1249,44 @@ class IPC:
         # For each file in our folder:
         events:list[Event] = []
         for filename in self._fs.listfiles(self._root):
+            if not filename.endswith(".msg"):
+                continue
             # Get the path
             path:str = self._fs.join(self._root, filename)
             # If we read and decode the data correctly, delete the file. Assume
             # if we can decode data, it's the full data and we should not expect
             # anyone to write to that file anyways
             try:
-                with self._fs.open(path, "r", lock=False) as file:
+                with self._fs.open(path, "rb", lock=False) as file:
                     data:bytes = file.read()
-                event:Event = serialiser.loads(data)
-                assert_type(event, Event, "event")
+                batch:Event|list[Event] = serialiser.auto_loads(data)
+                if not isinstance(batch, list):
+                    batch:list[Event] = [batch]
+                for event in batch:
+                    assert_type(event, Event, "event")
             except (TypeError, ValueError, UnicodeDecodeError):
                 ### TODO: Tell user we received a malformed message
-                ###   the file might be a partial serialisation since
-                #     File.write isn't atomic
                 continue
             self._fs.removefile(path)
-            events.append(event)
-        # Sort events based on their timestamp
+            events.extend(batch)
+        # Sort events based on their timestamp (stable so batches keep order)
         for event in sorted(events, key=lambda event: event.timestamp):
             self._got_event(event)
 
     def _on_init(self) -> None:
         assert not self.dead, "IPC already closed"
         self._fs.makedir(self._root)
+        # Advertise the serialisers we can decode and what we support
+        path:str = self._fs.join(self._root, CAPABILITIES_FILE)
+        with self._fs.open(path, "w", lock=False) as file:
+            file.write("\n".join(SERIALISERS+FEATURES))
+        # Listen for events straight away so we hear about the other peers
+        self._add_listener()
+        # Find the peers and tell them we joined. They reply with `PEER_EVENT`
+        for pid in self._scan_pids():
+            if pid != SELF_PID:
+                self._peers.add(pid, ())
+        self._announce(JOIN_EVENT)
 
     def _add_listener(self) -> None:
         assert not self.dead, "IPC already closed"
@@ -483,41 +1308,66 @@ class IPC:
         signal_register(self.sig, inner)
         Thread(target=threaded, daemon=True).start()
 
+    def _send_events(self, pid:Pid, events:list[Event], *,
+                     timeout:int=1000) -> bool:
+        """
+        Send a list of events to a specific pid (in order) and notify it once.
+        If pid supports batches, all of the events go in a single message.
+        Returns false if pid's folder is gone (it isn't listening).
+        """
+        assert not self.dead, "IPC already closed"
+        fmt_dumps, _ = serialiser.FORMATS[self._peer_format(pid)]
+        if "batch" in self._peer_capabilities(pid):
+            messages:list[bytes] = [fmt_dumps(events)]
+        else:
+            messages:list[bytes] = [fmt_dumps(event) for event in events]
+        for data in messages:
+            if not self._write_data(pid, data):
+                return False # pid must have not created a folder/died
+        self._notify(pid, timeout=timeout)
+        return True
+
     def _send_data(self, pid:Pid, data:bytes, *, timeout:int=1000) -> None:
         """
         Send data to a specific pid. The timeout is in milliseconds.
-        To send the data we first pick a free file using `self._fs`,
-          we write the data to the file, we notify pid of the message
+        To send the data we write the data to a new message file and we
+          notify pid of the message
         """
         assert not self.dead, "IPC already closed"
-        delay:float = timeout/ATTEMPTS # in milliseconds
-        # Try to find a free file for the message
+        if self._write_data(pid, data):
+            self._notify(pid, timeout=timeout)
+
+    def _write_data(self, pid:Pid, data:bytes) -> bool:
+        """
+        Write a new message file in pid's folder. The message names are unique
+        to this process so there is no need to look for a free file or take
+        the filesystem lock. The file is renamed once written so the receiver
+        never sees a partial message. Returns false if pid's folder is gone.
+        """
         log(f"writing message to {pid=}", 3)
-        while True:
-            try:
-                file:File|None = self._fs.get_free_file(str(pid), "%d%d.msg",
-                                                        mode="wb")
-                if file: break
-            except FileNotFoundError:
-                return None # pid must have not created a folder/died
-            # Wait delay and try again
-            sleep(delay/1000)
-            timeout -= delay
-            if timeout <= 0:
-                raise FileExistsError("Too many messages left to pid but " \
-                                      "none of them are read")
-        # Write and flush message
-        with file:
-            file.write(data)
+        name:str = f"{SELF_PID}_{next(self._msg_ids)}"
+        tmp_path:str = self._fs.join(str(pid), f"{name}.tmp")
+        try:
+            with self._fs.open(tmp_path, "wb", lock=False) as file:
+                file.write(data)
+            self._fs.rename(tmp_path, self._fs.join(str(pid), f"{name}.msg"))
+        except FileNotFoundError:
+            return False
         log(f"wrote message to {pid=}", 4)
+        return True
+
+    def _notify(self, pid:Pid, *, timeout:int=1000) -> None:
+        """
+        Notify pid that there are new messages. The timeout is in milliseconds
+        """
+        delay:float = timeout/ATTEMPTS # in milliseconds
         log(f"sending signal to {pid=}", 4)
-        # Try to notify the pid that a new message has been sent
         while True:
             try:
                 signal_send(pid, self.sig)
                 break
             except OSError:
-                continue
+                pass
             # Wait delay and try again
             sleep(delay/1000)
             timeout -= delay
@@ -555,3 +1405,4 @@ if __name__ == "__main__":
     ipc:BaseIPC = IPC("program_name", sig=SIGUSR1)
     ipc.bind("focus", lambda e: print("@", e), threaded=True)
     ipc.event_generate("focus", where="others")
+    ipc.flush()
@@ -39,6 +39,14 @@ This module defines `dumps` and `loads` functions like the json library. It
 also defines `enc_dumps` and `enc_loads` which work with `bytes` instead of
 `str` using the "utf-8" encoding.
 
+There is also a compact binary backend (`bin_dumps` and `bin_loads`) that
+uses length-prefixed tagged values. It handles str, bytes, int, float, list
+and dict natively and falls back to the `register`ed serialisers for every
+other type so both backends support exactly the same objects. Binary data
+always starts with `BINARY_MAGIC`, so `auto_loads` can decode the output of
+either backend. `FORMATS` maps the backend names to their (dumps, loads)
+functions, both working on bytes.
+
 Issues:
     * It detects circular references by catching `RecursionError`s in `dumps`.
         This is a problem since https://github.com/python/cpython/issues/132744
@@ -51,6 +59,7 @@ Issues:
 from __future__ import annotations
 from base64 import b64encode, b64decode
 from typing import TypeVar, Callable
+import struct
 import json
 
 
@@ -157,12 +166,170 @@ def loads(data:str, **kwargs:dict) -> object:
     #   TypeError
     #   ValueError
     #   json.decoder.JSONDecodeError (a type of ValueError)
-    return _loads(json.loads(data), **kwargs)
+    try:
+        return _loads(json.loads(data), **kwargs)
+    except RecursionError:
+        raise ValueError("Data is nested too deeply") from None
 
 def enc_loads(data:bytes, **kwargs:dict) -> object:
     return loads(data.decode("utf-8"), **kwargs)
 
 
+BINARY_MAGIC:bytes = b"\x00BS1"
+_INT64:struct.Struct = struct.Struct("<q")
+_FLOAT:struct.Struct = struct.Struct("<d")
+_LENGTH:struct.Struct = struct.Struct("<I")
+_INT64_MIN, _INT64_MAX = -(1<<63), (1<<63)-1
+
+def _bin_dumps(obj:object, output:list[bytes], **kwargs:dict) -> None:
+    T:type = type(obj)
+    if T is str:
+        data:bytes = obj.encode("utf-8")
+        output.append(b"s" + _LENGTH.pack(len(data)))
+        output.append(data)
+    elif T is int:
+        if _INT64_MIN <= obj <= _INT64_MAX:
+            output.append(b"i" + _INT64.pack(obj))
+        else:
+            data:bytes = obj.to_bytes((obj.bit_length()+8)>>3, "little",
+                                      signed=True)
+            output.append(b"I" + _LENGTH.pack(len(data)))
+            output.append(data)
+    elif T is float:
+        output.append(b"f" + _FLOAT.pack(obj))
+    elif obj is None:
+        output.append(b"n")
+    elif obj is True:
+        output.append(b"t")
+    elif obj is False:
+        output.append(b"F")
+    elif T is bytes:
+        output.append(b"b" + _LENGTH.pack(len(obj)))
+        output.append(obj)
+    elif T is list:
+        output.append(b"l" + _LENGTH.pack(len(obj)))
+        for value in obj:
+            _bin_dumps(value, output, **kwargs)
+    elif T is dict:
+        output.append(b"d" + _LENGTH.pack(len(obj)))
+        for key, value in obj.items():
+            _bin_dumps(key, output, **kwargs)
+            _bin_dumps(value, output, **kwargs)
+    else:
+        serialiser:Serialiser = _serialisers.get(T, None)
+        if serialiser is None:
+            raise TypeError(f"No serialisation method registered for "\
+                            f"{T.__qualname__}")
+        data:dict = serialiser(obj, **kwargs)
+        if not isinstance(data, dict):
+            raise TypeError("Serialiser must return a dict")
+        typename:bytes = _typenames.get(T).encode("utf-8")
+        output.append(b"o" + _LENGTH.pack(len(typename)))
+        output.append(typename)
+        _bin_dumps(data, output, **kwargs)
+
+MAX_DEPTH:int = 200 # Deeper binary data is rejected by `bin_loads`
+_unpack_int64 = _INT64.unpack_from
+_unpack_float = _FLOAT.unpack_from
+_unpack_length = _LENGTH.unpack_from
+_STR, _BYTES, _BIGINT, _OBJECT, _INT, _FLOAT_TAG, _NONE, _TRUE, _FALSE, \
+_LIST, _DICT = b"sbIoifntFld"
+
+def _bin_loads(data:bytes, idx:int, depth:int,
+               kwargs:dict) -> tuple[object,int]:
+    # `kwargs` is passed as a dict and the tags are compared as ints because
+    #   this is called once for every value
+    tag:int = data[idx]
+    idx += 1
+    if tag == _STR:
+        end:int = idx + 4 + _unpack_length(data, idx)[0]
+        if end > len(data):
+            raise ValueError("Truncated binary data")
+        return str(data[idx+4:end], "utf-8"), end
+    if tag == _INT:
+        return _unpack_int64(data, idx)[0], idx+8
+    if tag == _FLOAT_TAG:
+        return _unpack_float(data, idx)[0], idx+8
+    if tag == _NONE:
+        return None, idx
+    if tag == _TRUE:
+        return True, idx
+    if tag == _FALSE:
+        return False, idx
+    if tag in (_LIST, _DICT, _OBJECT):
+        if depth >= MAX_DEPTH:
+            raise ValueError("Binary data is nested too deeply")
+        depth += 1
+    if tag == _LIST:
+        length:int = _unpack_length(data, idx)[0]
+        idx += 4
+        output:list = [None]*length
+        for i in range(length):
+            output[i], idx = _bin_loads(data, idx, depth, kwargs)
+        return output, idx
+    if tag == _DICT:
+        length:int = _unpack_length(data, idx)[0]
+        idx += 4
+        output:dict = {}
+        for _ in range(length):
+            key, idx = _bin_loads(data, idx, depth, kwargs)
+            output[key], idx = _bin_loads(data, idx, depth, kwargs)
+        return output, idx
+    if tag in (_BYTES, _BIGINT, _OBJECT):
+        end:int = idx + 4 + _unpack_length(data, idx)[0]
+        if end > len(data):
+            raise ValueError("Truncated binary data")
+        raw:bytes = bytes(data[idx+4:end])
+        if tag == _BYTES:
+            return raw, end
+        if tag == _BIGINT:
+            return int.from_bytes(raw, "little", signed=True), end
+        fields, end = _bin_loads(data, end, depth, kwargs)
+        if not isinstance(fields, dict):
+            raise ValueError("Registered object data must be a dict")
+        return _load_object(fields, raw.decode("utf-8"), **kwargs), end
+    raise ValueError(f"Unknown binary tag {tag!r}")
+
+
+def bin_dumps(obj:object, **kwargs:dict) -> bytes:
+    output:list[bytes] = [BINARY_MAGIC]
+    try:
+        _bin_dumps(obj, output, **kwargs)
+    except RecursionError:
+        raise ValueError("Circular reference detected") from None
+    return b"".join(output)
+
+def bin_loads(data:bytes, **kwargs:dict) -> object:
+    # Raises:
+    #   TypeError
+    #   ValueError
+    #   struct.error (if the data is truncated)
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError("Not binary serialised data")
+    try:
+        obj, idx = _bin_loads(data, len(BINARY_MAGIC), 0, kwargs)
+    except (struct.error, IndexError) as error:
+        raise ValueError("Truncated binary data") from error
+    if idx != len(data):
+        raise ValueError("Extra data after the end of the binary data")
+    return obj
+
+def auto_loads(data:bytes, **kwargs:dict) -> object:
+    """
+    Decodes data from either `enc_dumps` or `bin_dumps`
+    """
+    if data.startswith(BINARY_MAGIC):
+        return bin_loads(data, **kwargs)
+    return enc_loads(data, **kwargs)
+
+
+# name => (dumps, loads) where both work on bytes
+FORMATS:dict[str:tuple[Callable,Callable]] = {
+                                               "binary": (bin_dumps, bin_loads),
+                                               "json": (enc_dumps, enc_loads),
+                                             }
+
+
 _typenames:dict[type:str] = DoubleDict()
 _serialisers:dict[type:Serialiser] = {}
 _deserialisers:dict[type:Deserialiser] = {}
@@ -233,7 +400,42 @@ def _register_builtins() -> None:
              json_to_val_type(signal.Signals))
 
 
+def _benchmark() -> dict[str:dict[str:float]]:
+    """
+    Microbenchmark comparing the throughput of the backends on messages that
+    look like the ones the IPC sends (mostly terminal output for `print`).
+    Run with `python3 serialiser.py --bench`
+    """
+    from timeit import Timer
+    payloads:dict[str:object] = {
+        "small": {"type":"print", "from":"1234", "timestamp":1.5,
+                  "data":"Hello world\n"},
+        "64KiB": {"type":"print", "from":"1234", "timestamp":1.5,
+                  "data":"x"*(64*1024)},
+        "nested": {"type":"run", "from":"1234", "timestamp":1.5,
+                   "data":[["cd", "/tmp"], {"env":{str(i):i for i in range(50)}},
+                           list(range(200)), [1.5]*100]},
+    }
+    results:dict[str:dict[str:float]] = {}
+    for name, payload in payloads.items():
+        for format, (fmt_dumps, fmt_loads) in FORMATS.items():
+            data:bytes = fmt_dumps(payload)
+            n_dumps, t_dumps = Timer(lambda: fmt_dumps(payload)).autorange()
+            n_loads, t_loads = Timer(lambda: fmt_loads(data)).autorange()
+            results[f"{name}/{format}"] = {
+                                            "size": len(data),
+                                            "dumps/s": n_dumps/t_dumps,
+                                            "loads/s": n_loads/t_loads,
+                                          }
+            print(f"{name:>7}/{format:<6} size={len(data):>6} " \
+                  f"dumps={n_dumps/t_dumps:>10.0f}/s " \
+                  f"loads={n_loads/t_loads:>10.0f}/s")
+    return results
+
+
 if __name__ == "__main__":
+    import sys
+
     class MyClass:
         __slots__ = "attr"
 
@@ -283,32 +485,50 @@ if __name__ == "__main__":
 
     failed_any_tests:bool = False
     failed:bool = False
-    for obj in TESTS:
-        if failed: print("-"*20)
-        failed:bool = False
-        try:
-            serialised:str = dumps(obj)
-        except:
-            print(f"Serialiser errored on {obj!r}")
-            failed_any_tests:bool = True
-            continue
+    for format, (fmt_dumps, fmt_loads) in FORMATS.items():
+        for obj in TESTS:
+            if failed: print("-"*20)
+            failed:bool = False
+            try:
+                serialised:bytes = fmt_dumps(obj)
+            except:
+                print(f"[{format}] Serialiser errored on {obj!r}")
+                failed_any_tests:bool = True
+                continue
+            try:
+                data:object = fmt_loads(serialised)
+                assert type(data) == type(auto_loads(serialised))
+            except:
+                print(f"[{format}] Deserialiser errored on {obj!r}")
+                failed_any_tests:bool = True
+                continue
+            if type(obj) != type(data):
+                failed:bool = True
+            elif obj != data:
+                failed:bool = True
+            if failed:
+                failed_any_tests:bool = True
+                print(f"[{format}] Serialiser+Deserialiser didn't work on " \
+                      f"{obj!r}")
+                print(f"Serialised data: {serialised!r}")
+                print(f"Deserialised data: {data}")
+    # Malformed data (too deep, truncated) must raise ValueError
+    deep:bytes = BINARY_MAGIC + b"l\x01\x00\x00\x00"*100_000 + b"n"
+    for format, data in (("binary", deep), ("binary", deep[:-1]),
+                         ("json", b"["*100_000 + b"]"*100_000)):
         try:
-            data:object = loads(serialised)
-        except:
-            print(f"Deserialiser errored on {obj!r}")
+            FORMATS[format][1](data)
+        except ValueError:
+            pass
+        except BaseException as error:
+            print(f"[{format}] Malformed data raised {error!r}")
             failed_any_tests:bool = True
-            continue
-        if type(obj) != type(data):
-            failed:bool = True
-        elif obj != data:
-            failed:bool = True
-        if failed:
-            failed_any_tests:bool = True
-            print(f"Serialiser+Deserialiser didn't work on {obj!r}")
-            print(f"Serialised data: {serialised!r}")
-            print(f"Deserialised data: {data}")
+
     if failed_any_tests:
         print("-"*20)
         print("Tests: \x1b[91mFailed\x1b[0m")
     else:
         print("Tests: \x1b[92mPassed\x1b[0m")
+
+    if "--bench" in sys.argv:
+        _benchmark()
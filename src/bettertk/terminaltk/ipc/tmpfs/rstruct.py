@@ -6,6 +6,7 @@ Internally all sizes are in bits but externally the user should only ever use
 the BIT and BYTE constants or their own classes that inherit from Struct.
 """
 from __future__ import annotations
+import struct as _struct
 import functools
 
 
@@ -203,6 +204,30 @@ class _Array:
         return _init_type(self.type, mem, size=self._unit_size, loffset=0,
                           roffset=0)
 
+    def unpack(self) -> list[object]:
+        """
+        Read every item in the array. Arrays of simple Structs are decoded
+        with a single `struct.iter_unpack` call.
+        """
+        packer:_struct.Struct|None = getattr(self.type, "_packer_", None)
+        if packer is not None:
+            from_packed:Callable = self.type._from_packed
+            return [from_packed(values)
+                    for values in packer.iter_unpack(self._mem)]
+        return [_unpack_value(self[i]) for i in range(self._n)]
+
+    def pack(self, values:list[object]) -> None:
+        assert len(values) == self._n, "SizingError"
+        packer:_struct.Struct|None = getattr(self.type, "_packer_", None)
+        if packer is not None:
+            to_packed:Callable = self.type._to_packed
+            unit_size:int = self._unit_size>>3
+            for i, value in enumerate(values):
+                packer.pack_into(self._mem, i*unit_size, *to_packed(value))
+            return None
+        for i, value in enumerate(values):
+            _pack_value(self[i], value)
+
     def __repr__(self) -> str:
         return f"Array[{self._n}]<{self.type}>"
 
@@ -256,17 +281,28 @@ class ByteString(ByteArray):
         return self.value
 
     def set(self, value:str) -> None:
-        assert isinstance(value, str), "TypeError"
-        assert not value.endswith("\x00"), "ValueError"
-        assert len(value) <= len(self), "LengthError"
-        data:bytes = value.encode("utf-8")+b"\x00"
+        data:bytes = _encode_bytestring(value, len(self))+b"\x00"
         data:bytes = data[:len(self)]
         self._mem[:len(data)] = data
 
 
+def _encode_bytestring(value:str, length:int) -> bytes:
+    assert isinstance(value, str), "TypeError"
+    assert not value.endswith("\x00"), "ValueError"
+    data:bytes = value.encode("utf-8")
+    assert len(data) <= length, "LengthError"
+    return data
+
+
+# Sizes (in bits) that the struct module can pack/unpack directly
+_UINT_FORMATS:dict[int:str] = {8:"B", 16:"H", 32:"I", 64:"Q"}
+_UINT_STRUCTS:dict[int:_struct.Struct] = {size:_struct.Struct(">"+fmt)
+                                          for size, fmt in _UINT_FORMATS.items()}
+
+
 @functools.total_ordering
 class UInt:
-    __slots__ = "_mem", "_size", "_loffset", "_lmask", "_lunmask"
+    __slots__ = "_mem", "_size", "_loffset", "_lmask", "_lunmask", "_fmt"
 
     def __init__(self, mem:memoryview, *, loffset:int, roffset:int,
                  size:int) -> Uint:
@@ -276,9 +312,16 @@ class UInt:
         self._size:int = size
         self._lmask:int = (1<<(8-loffset))-1
         self._lunmask:int = ((1<<self._loffset)-1) << (8-self._loffset)
+        # Byte aligned ints of a standard size can use the struct module
+        if loffset == 0:
+            self._fmt:_struct.Struct|None = _UINT_STRUCTS.get(size, None)
+        else:
+            self._fmt:_struct.Struct|None = None
 
     @property
     def value(self) -> int:
+        if self._fmt is not None:
+            return self._fmt.unpack_from(self._mem)[0]
         return ((self._mem[0]&self._lmask) << (self._size-8+self._loffset)) | \
                (int.from_bytes(self._mem[self._loffset!=0:], "big"))
 
@@ -286,8 +329,9 @@ class UInt:
         return self.value
 
     def set(self, value:int) -> None:
-        assert isinstance(value, int), "TypeError"
-        assert 0 <= value <= (1<<self._size)-1, "OverflowError"
+        _check_uint(value, self._size)
+        if self._fmt is not None:
+            return self._fmt.pack_into(self._mem, 0, value)
         value:bytes = value.to_bytes((self._size+7)>>3, "big")
         self._mem[0] = (self._mem[0]&self._lunmask) | value[0]
         self._mem[1:] = value[1:]
@@ -309,25 +353,38 @@ class UInt:
         return (1<<self._size)-1
 
 
+def _check_uint(value:int, size:int) -> None:
+    assert isinstance(value, int), "TypeError"
+    assert 0 <= value <= (1<<size)-1, "OverflowError"
+
+def _check_int(value:int, size:int) -> None:
+    assert isinstance(value, int), "TypeError"
+    assert -(1<<(size-1)) <= value <= (1<<(size-1))-1, "OverflowError"
+
+def _uint_to_int(value:int, size:int) -> int:
+    if value & (1<<(size-1)):
+        return (1<<(size-1))-1-value
+    return value
+
+def _int_to_uint(value:int, size:int) -> int:
+    if value < 0:
+        return (1<<(size-1))-1-value
+    return value
+
+
 class Int(UInt):
     __slots__ = ()
 
     @property
     def value(self) -> int:
-        value:int = super().value
-        if value & (1<<(self._size-1)):
-            return (1<<(self._size-1))-1-value
-        return value
+        return _uint_to_int(super().value, self._size)
 
     def get(self) -> int:
         return self.value
 
     def set(self, value:int) -> None:
-        if value < 0:
-            return super().set((1<<(self._size-1))-1-value)
-        else:
-            assert value <= self.max_value, "OverflowError"
-        return super().set(value)
+        _check_int(value, self._size)
+        return super().set(_int_to_uint(value, self._size))
 
     @property
     def min_value(self) -> int:
@@ -342,6 +399,8 @@ BASE_TYPES:tuple[type] = (Int, UInt, BitArray, ByteArray, ByteString, Padding)
 EXPANDABLES:tuple[type] = (Padding, UInt, Int)
 Field:type = tuple[str,_Size|_Uncomputed,type]
 Fields:type = list[Field]
+# name => (offset in bits, size in bits, type)
+Layout:type = dict[str:tuple[int,int,type]]
 
 
 class _StructMeta(type):
@@ -353,8 +412,49 @@ class _StructMeta(type):
             raise TypeError("You must override _fields_ if inheriting " \
                             "from Struct")
         dct["_fields_"] = _StructMeta.check(dct["_fields_"])
+        dct["_layout_"], dct["_bits_"] = _StructMeta.layout(dct["_fields_"])
+        dct["_packer_"] = _StructMeta.packer(dct["_fields_"])
         return super().__new__(Class, name, bases, dct)
 
+    @staticmethod
+    def layout(fields:Fields) -> tuple[Layout,int]:
+        """
+        Precomputes the offset, size and type of every accessible field so
+        that attribute access doesn't have to walk `_fields_`
+        """
+        layout:Layout = {}
+        offset:int = 0
+        for name, size, T in fields:
+            size:int = sizeof(size)._size()
+            if T is not Padding:
+                layout[name] = (offset, size, T)
+            offset += size
+        return layout, offset
+
+    @staticmethod
+    def packer(fields:Fields) -> _struct.Struct|None:
+        """
+        If every field is byte aligned and the struct module understands all
+        of their types, return a `struct.Struct` that can pack/unpack the whole
+        record in one go. Otherwise return None.
+        """
+        fmt:str = ">"
+        for name, size, T in fields:
+            size:int = sizeof(size)._size()
+            if size&7:
+                return None
+            if T is Padding:
+                fmt += f"{size>>3}x"
+            elif T in (UInt, Int):
+                if size not in _UINT_FORMATS:
+                    return None
+                fmt += _UINT_FORMATS[size]
+            elif T in (ByteArray, ByteString):
+                fmt += f"{size>>3}s"
+            else:
+                return None
+        return _struct.Struct(fmt)
+
     @staticmethod
     def check(fields:Fields) -> Fields:
         if not isinstance(fields, list|tuple):
@@ -415,35 +515,46 @@ class _StructMeta(type):
 
 
 class Struct(metaclass=_StructMeta):
-    __slots__ = "_mem", "_loffset", "_roffset"
+    __slots__ = "_mem", "_loffset", "_roffset", "_cache"
     _fields_ = None
+    _layout_:Layout = None
+    _bits_:int = 0
+    _packer_:_struct.Struct|None = None
 
     def __init__(self, mem:memoryview, *, loffset:int=0, roffset:int=0,
                  force_no_chk:bool=False) -> Struct:
         self._mem, self._loffset, self._roffset = mem, loffset, roffset
+        self._cache:dict[str:object] = {}
         if not force_no_chk:
-            real_size:int = self.__class__.size()._size() >> 3
+            real_size:int = self.__class__._bits_ >> 3
             assert len(mem) == real_size, "SizeCheckError"
 
-    def _attr_access(self, key:str, value:object=None, *, _set:bool) -> object:
+    def _get_field(self, key:str) -> object:
+        ret:object = self._cache.get(key, None)
+        if ret is not None:
+            return ret
         if not isinstance(key, str):
             raise TypeError("key should be a string")
-        left:int = self._loffset
-        for name, size, T in self._fields_:
-            size:int = sizeof(size)._size()
-            if name == key:
-                right:int = left+size
-                mem:memoryview = self._mem[left>>3:(right+7)>>3]
-                assert len(mem) == (size+(left&7)+7)>>3, "InternalSizingError"
-                ret:object =  _init_type(T, mem, size=size, loffset=left&7,
-                                         roffset=(8-(right&7))&7)
-                if _set:
-                    if not hasattr(ret, "set"):
-                        raise RuntimeError(f"Can't replace {ret!r}")
-                    return ret.set(value)
-                return ret
-            left += size
-        raise KeyError(f"Unknown {key=!r}")
+        try:
+            left, size, T = self._layout_[key]
+        except KeyError:
+            raise KeyError(f"Unknown {key=!r}") from None
+        left += self._loffset
+        right:int = left+size
+        mem:memoryview = self._mem[left>>3:(right+7)>>3]
+        assert len(mem) == (size+(left&7)+7)>>3, "InternalSizingError"
+        ret:object = _init_type(T, mem, size=size, loffset=left&7,
+                                roffset=(8-(right&7))&7)
+        self._cache[key] = ret
+        return ret
+
+    def _attr_access(self, key:str, value:object=None, *, _set:bool) -> object:
+        ret:object = self._get_field(key)
+        if _set:
+            if not hasattr(ret, "set"):
+                raise RuntimeError(f"Can't replace {ret!r}")
+            return ret.set(value)
+        return ret
 
     def __setattr__(self, key:str, value:object) -> None:
         if key.startswith("_"):
@@ -452,21 +563,103 @@ class Struct(metaclass=_StructMeta):
             self._attr_access(key, value, _set=True)
 
     def __getattr__(self, key:str) -> Struct|BitArray|ByteArray|int:
+        if key.startswith("_"):
+            raise AttributeError(key)
         return self._attr_access(key, _set=False)
 
+    def unpack(self) -> dict[str:object]:
+        """
+        Read all of the (non-padding) fields at once. UInt/Int fields become
+        ints, ByteArrays become bytes, ByteStrings become strs, BitArrays
+        become tuples of bools, Structs become dicts and Arrays become lists.
+        """
+        if (self._packer_ is not None) and (self._loffset == 0):
+            values:tuple = self._packer_.unpack_from(self._mem)
+            return self._from_packed(values)
+        return {name:_unpack_value(self._get_field(name))
+                for name in self._layout_}
+
+    def pack(self, **values:dict[str:object]) -> None:
+        """
+        Write many fields at once. If all fields are given and the struct is
+        simple enough, this is a single `struct.pack_into` call.
+        """
+        if (self._packer_ is not None) and (self._loffset == 0) and \
+           (values.keys() == self._layout_.keys()):
+            self._packer_.pack_into(self._mem, 0, *self._to_packed(values))
+            return None
+        for name, value in values.items():
+            _pack_value(self._get_field(name), value)
+
+    @classmethod
+    def _from_packed(Class:type[Struct], values:tuple) -> dict[str:object]:
+        output:dict[str:object] = {}
+        for (name, (_, size, T)), value in zip(Class._layout_.items(), values):
+            if T is Int:
+                value:int = _uint_to_int(value, size)
+            elif T is ByteString:
+                value:str = value.split(b"\x00", 1)[0].decode("utf-8")
+            output[name] = value
+        return output
+
+    @classmethod
+    def _to_packed(Class:type[Struct], values:dict[str:object]) -> list:
+        output:list[object] = []
+        for name, (_, size, T) in Class._layout_.items():
+            # Same checks as the fields' `set` because `struct` would
+            #   silently truncate/pad strings or raise `struct.error`
+            value:object = values[name]
+            if T is Int:
+                _check_int(value, size)
+                value:int = _int_to_uint(value, size)
+            elif T is UInt:
+                _check_uint(value, size)
+            elif T is ByteString:
+                value:bytes = _encode_bytestring(value, size>>3)
+            elif T is ByteArray:
+                assert len(value) == (size>>3), "SizingError"
+            output.append(value)
+        return output
+
     @classmethod
     def size(Class:type[Struct]) -> _Size:
         assert issubclass(Class, Struct), "TypeError"
         assert Class != Struct, "TypeError"
-        output:int = 0
-        for name, size, T in Class._fields_:
-            output += sizeof(size)._size()
-        return _Size(None, output)
+        return _Size(None, Class._bits_)
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} object>"
 
 
+def _unpack_value(obj:object) -> object:
+    if isinstance(obj, UInt|ByteString):
+        return obj.value
+    if isinstance(obj, ByteArray):
+        return bytes(obj._mem)
+    if isinstance(obj, BitArray):
+        return tuple(obj[i] for i in range(len(obj)))
+    if isinstance(obj, Struct|_Array):
+        return obj.unpack()
+    raise NotImplementedError(f"Unreachable {obj=}")
+
+def _pack_value(obj:object, value:object) -> None:
+    if isinstance(obj, UInt|ByteString):
+        obj.set(value)
+    elif isinstance(obj, ByteArray):
+        assert len(value) == len(obj), "SizingError"
+        obj._mem[:] = value
+    elif isinstance(obj, BitArray):
+        assert len(value) == len(obj), "SizingError"
+        for i, bit in enumerate(value):
+            obj[i] = bit
+    elif isinstance(obj, Struct):
+        obj.pack(**value)
+    elif isinstance(obj, _Array):
+        obj.pack(value)
+    else:
+        raise NotImplementedError(f"Unreachable {obj=}")
+
+
 def sizeof(t:type) -> _Size|_Uncomputed:
     if t == 0:
         return NO_SIZE
@@ -487,7 +680,7 @@ def _init_type(T:type, memview:memoryview, *, loffset:int, roffset:int,
     if isinstance(T, type):
         if issubclass(T, Struct):
             return T(memview, **kwargs)
-        if T in (BitArray, ByteArray, UInt, Int):
+        if T in (BitArray, ByteArray, ByteString, UInt, Int):
             return T(memview, size=size, **kwargs)
         if issubclass(T, Padding):
             raise RuntimeError("Padding is always inaccessible.")
@@ -539,6 +732,47 @@ def _test_bytestring() -> None:
     assert bs.value == bs.get(), "TestError"
     assert bytes(mem) == b"\xff12345678\xff", "TestError"
 
+def _test_pack() -> None:
+    class Record(Struct):
+        _fields_ = [
+                     ("a", 1*BYTE, Int),
+                     ("b", 2*BYTE, UInt),
+                     ("c", 4*BYTE, ByteString),
+                   ]
+    class Records(Struct):
+        _fields_ = [
+                     ("records", 3*Record, Array(3,Record)),
+                     ("flags",      3*BIT, BitArray),
+                     ("d",         13*BIT, UInt),
+                   ]
+    assert Record._packer_ is not None, "TestError"
+    assert Records._packer_ is None, "TestError"
+    mem = memoryview(bytearray(sizeof(Records).to_bytes()))
+    records = Records(mem)
+    values = [dict(a=-i, b=i*1000, c=str(i)) for i in range(3)]
+    records.records.pack(values)
+    assert records.records.unpack() == values, "TestError"
+    assert records.records[2].a == -2, "TestError"
+    assert records.records[2].c.value == "2", "TestError"
+    records.pack(d=8000, flags=(1,0,1))
+    assert records.d == 8000, "TestError"
+    assert records.d is records.d, "TestError" # Cached accessor
+    assert records.unpack() == dict(records=values, flags=(True,False,True),
+                                    d=8000), "TestError"
+    # The bulk path must check the values like the fields' `set`
+    for bad, error in ((dict(a=0, b=0, c="12345"), "LengthError"),
+                       (dict(a=0, b=1<<16, c=""), "OverflowError"),
+                       (dict(a=-129, b=0, c=""), "OverflowError")):
+        for pack in (lambda: records.records[0].pack(**bad),
+                     lambda: [records.records[0].pack(**{k:v})
+                              for k, v in bad.items()]):
+            try:
+                pack()
+            except AssertionError as err:
+                assert str(err) == error, "TestError"
+            else:
+                raise AssertionError("TestError")
+
 
 def _test() -> None:
     global all_tests, max_test_values, get_States, randint, seed, test_obj
@@ -565,6 +799,7 @@ def _test() -> None:
                                            for j, test in enumerate(all_tests)]
 
     _test_bytestring()
+    _test_pack()
     _test_containers(get_states, n=100_000)
 
     get_t3_state = lambda: [test_obj.t3[i] for i in range(len(test_obj.t3))]
@@ -0,0 +1,183 @@
+"""
+A throughput benchmark for the pty terminal that doesn't need Tk.
+The fixtures are the recorded output of programs run on a pty:
+    * seq:       `seq 1 1000000` (a flood of short lines)
+    * ls:        a coloured `ls -l` of a few big folders (lots of SGR)
+    * progress:  a coloured progress bar redrawn using "\\r"
+Each one is fed to `AnsiParser` in CHUNK_SIZE chunks (like `PtyTerminal`
+reads them) and the results are printed as JSON so that runs can be
+compared. "inserts" is how many "text" operations the parser makes.
+
+The operations are also applied to a `Screen` (80x24 with the default
+scrollback) and its damage is taken after every chunk (the widget does it
+once per frame which is never more often). "drawn_lines" is how many lines
+the widget would have had to draw.
+
+Usage:
+    python3 benchmark.py [--repeat 3] [--record folder] [--fixtures folder]
+                         [--out file]
+
+--record saves the fixtures in the folder and --fixtures replays saved
+fixtures instead of recording them again. --test only checks that malformed
+sequences and huge counts are handled (without running the benchmark).
+"""
+from __future__ import annotations
+from time import perf_counter
+from subprocess import Popen
+import argparse
+import codecs
+import json
+import pty
+import sys
+import os
+
+from ptyterm import AnsiParser, Screen, Damage, Op, CHUNK_SIZE
+
+
+PROGRESS:str = r"""
+import sys
+N = 100_000
+for i in range(N+1):
+    done = i*40//N
+    sys.stdout.write(f"\r\x1b[32m[{'#'*done:<40}]\x1b[0m \x1b[1m{i*100//N:3}%\x1b[0m")
+print()
+"""
+FIXTURES:dict[str:list[str]] = {
+                "seq": ["seq", "1", "1000000"],
+                "ls": ["ls", "--color=always", "-l", "/usr/bin", "/usr/lib",
+                       "/usr/share"],
+                "progress": [sys.executable, "-c", PROGRESS],
+                               }
+
+
+def record(command:list[str]) -> bytes:
+    """
+    Runs `command` on a pty and returns everything that it wrote
+    """
+    master_fd, slave_fd = pty.openpty()
+    proc:Popen = Popen(command, stdin=slave_fd, stdout=slave_fd,
+                       stderr=slave_fd, close_fds=True,
+                       env=os.environ|dict(TERM="xterm-256color"))
+    os.close(slave_fd)
+    chunks:list[bytes] = []
+    while True:
+        try:
+            chunk:bytes = os.read(master_fd, CHUNK_SIZE)
+        except OSError: # EIO when the program exits
+            break
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(master_fd)
+    proc.wait()
+    return b"".join(chunks)
+
+def chunks(data:bytes) -> list[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")("backslashreplace")
+    return [decoder.decode(data[i:i+CHUNK_SIZE])
+            for i in range(0, len(data), CHUNK_SIZE)]
+
+def parse(data:list[str]) -> dict:
+    parser:AnsiParser = AnsiParser()
+    ops:int = 0
+    inserts:int = 0
+    start:float = perf_counter()
+    for chunk in data:
+        for op in parser.feed(chunk):
+            inserts += (op[0] == "text")
+            ops += 1
+    return {"s":perf_counter()-start, "ops":ops, "inserts":inserts}
+
+def draw(data:list[str]) -> dict:
+    parser:AnsiParser = AnsiParser()
+    screen:Screen = Screen(80, 24)
+    drawn:int = 0
+    start:float = perf_counter()
+    for chunk in data:
+        screen.apply(parser.feed(chunk))
+        damage:Damage|None = screen.take_damage()
+        if damage is not None:
+            drawn += len(damage.scrollback) + len(damage.rows)
+    return {"s":perf_counter()-start, "drawn_lines":drawn}
+
+def test() -> bool:
+    passed:bool = True
+    # Private markers after the first character are ignored
+    for sequence in ("\x1b[8>d", "\x1b[1<2m", "\x1b[?1;?2h", "\x1b[1;>2H"):
+        try:
+            ops:list[Op] = AnsiParser().feed(f"a{sequence}b")
+        except ValueError as error:
+            print(f"{sequence!r} raised {error!r}")
+            passed:bool = False
+            continue
+        if ops != [("text", "ab", ())]:
+            print(f"{sequence!r} wasn't ignored: {ops!r}")
+            passed:bool = False
+    # Huge counts are clamped to the screen
+    screen:Screen = Screen(80, 24)
+    screen.apply(AnsiParser().feed("x\x1b[999999999@\x1b[999999999L"
+                                   "\x1b[999999999;999999999H"))
+    if (len(screen.lines[0].chars) != 80) or (len(screen.lines) != 24) or \
+       ((screen.x, screen.y) != (79, 23)):
+        print("Huge counts weren't clamped to the screen")
+        passed:bool = False
+    return passed
+
+def run(args:argparse.Namespace) -> dict:
+    results:dict = {"chunk_size":CHUNK_SIZE, "repeat":args.repeat,
+                    "python":sys.version.split()[0], "fixtures":{}}
+    for name, command in FIXTURES.items():
+        print(f"[BENCH]: {name}", file=sys.stderr)
+        if args.fixtures is None:
+            data:bytes = record(command)
+        else:
+            with open(os.path.join(args.fixtures, f"{name}.out"), "rb") as file:
+                data:bytes = file.read()
+        if args.record is not None:
+            os.makedirs(args.record, exist_ok=True)
+            with open(os.path.join(args.record, f"{name}.out"), "wb") as file:
+                file.write(data)
+        decoded:list[str] = chunks(data)
+        best:dict = min((parse(decoded) for _ in range(args.repeat)),
+                        key=lambda result: result["s"])
+        screen:dict = min((draw(decoded) for _ in range(args.repeat)),
+                          key=lambda result: result["s"])
+        lines:int = data.count(b"\n")
+        results["fixtures"][name] = {"bytes":len(data), "lines":lines,
+                                     "ops":best["ops"],
+                                     "inserts":best["inserts"],
+                                     "s":best["s"],
+                                     "MB_per_s":len(data)/best["s"]/1e6,
+                                     "lines_per_s":lines/best["s"],
+                                     "screen_s":screen["s"],
+                                     "screen_MB_per_s":
+                                            len(data)/screen["s"]/1e6,
+                                     "drawn_lines":screen["drawn_lines"]}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pty terminal benchmark")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="parse every fixture this many times (best wins)")
+    parser.add_argument("--record", default=None,
+                        help="save the fixtures in this folder")
+    parser.add_argument("--fixtures", default=None,
+                        help="use the fixtures saved in this folder")
+    parser.add_argument("--out", default=None, help="write the JSON here")
+    parser.add_argument("--test", action="store_true",
+                        help="only check the handling of malformed output")
+    args:argparse.Namespace = parser.parse_args()
+
+    if args.test:
+        if not test():
+            print("Tests: \x1b[91mFailed\x1b[0m")
+            sys.exit(1)
+        print("Tests: \x1b[92mPassed\x1b[0m")
+        sys.exit(0)
+    output:str = json.dumps(run(args), indent=2)
+    if args.out is None:
+        print(output)
+    else:
+        with open(args.out, "w") as file:
+            file.write(output)
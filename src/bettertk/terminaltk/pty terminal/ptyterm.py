@@ -1,11 +1,15 @@
 from __future__ import annotations
 from threading import Thread, Lock
 from subprocess import Popen
+from collections import deque
+from itertools import islice
 import pty, fcntl, termios
 from tkinter import font
 from time import sleep
 import tkinter as tk
+import codecs
 import ctypes
+import re
 import os
 
 
@@ -61,7 +65,7 @@ class PtyPeekaboo:
         fcntl.ioctl(self.fd, termios.TIOCSWINSZ, bytes(winsize))
 
 
-CHUNK_SIZE:int = 1024
+CHUNK_SIZE:int = 1<<16
 ST:str = "\x1b\\"
 BEL:str = "\x07"
 BS:str = "\b"
@@ -71,6 +75,15 @@ NL = LF = "\n"
 SP = " "
 TAB = "\t"
 VT = "\v"
+TAB_SIZE:int = 8
+# An unfinished escape sequence longer than this is dropped
+MAX_SEQUENCE:int = 4096
+# Default number of lines kept after they scroll off the top of the screen
+SCROLLBACK_LINES:int = 10_000
+# Milliseconds between redraws of the Text widget
+FRAME_DELAY:int = 16
+# Private modes that switch to the alternate screen (used by `less`, `vim`)
+ALT_SCREEN_MODES:tuple[int] = (47, 1047, 1049)
 
 INT_TO_COLOUR = {0:"black",
                  1:"red",
@@ -79,21 +92,703 @@ INT_TO_COLOUR = {0:"black",
                  4:"blue",
                  5:"magenta",
                  6:"cyan",
-                 7:"white"}
+                 7:"white",
+                 8:"#7f7f7f",
+                 9:"#ff5555",
+                 10:"#55ff55",
+                 11:"#ffff55",
+                 12:"#5c5cff",
+                 13:"#ff55ff",
+                 14:"#55ffff",
+                 15:"#ffffff"}
+
+# (operation name, *args). "text" is ("text", run, tags) where the run can
+#   have "\n"s in it (from "\n" or "\r\n")
+Op:type = tuple
+Tags:type = tuple[str]
+# A line as (text, tags) pieces (how the scrollback keeps lines)
+Spans:type = list[tuple[str,Tags]]
+
+# One token per match. Plain text (with newlines) is matched as one run so
+#   flooding output (like `seq`) is only a few tokens per chunk
+TOKEN_RE:re.Pattern = re.compile(r"""
+     (?P<text>(?:[^\x00-\x09\x0b-\x1f\x7f]+|\r\n)+)
+    |(?P<csi>\x1b\[(?P<params>[0-?]*)(?P<inter>[ -/]*)(?P<final>[@-~]))
+    |(?P<osc>\x1b\](?P<osc_data>[^\x07\x1b]*)(?:\x07|\x1b\\))
+    |(?P<string>\x1b[P^_X].*?\x1b\\)
+    |(?P<esc>\x1b(?P<esc_inter>[ -/]*)(?P<esc_final>[0-OQ-WYZ\\`-~]))
+    |(?P<control>[\x00-\x1a\x1c-\x1f\x7f])
+""", re.VERBOSE|re.DOTALL)
+# What an escape sequence cut off by the end of the chunk looks like
+PARTIAL_RE:re.Pattern = re.compile(r"""
+    \x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[P^_X].*|[ -/]*)\Z
+""", re.VERBOSE|re.DOTALL)
+
+C0_TABLE:dict[str:str] = {CR:"cr",
+                          BS:"backspace",
+                          TAB:"tab",
+                          BEL:"bell",
+                          VT:"linefeed",
+                          FF:"linefeed"}
+ESC_TABLE:dict[str:str] = {"7":"save_cursor",
+                           "8":"restore_cursor",
+                           "c":"reset",
+                           "D":"index",
+                           "E":"next_line",
+                           "M":"reverse_index"}
+# CSI final byte: (operation name, default for missing/zero parameters,
+#                  number of parameters)
+CSI_TABLE:dict[str:tuple[str,int,int]] = {"A":("cursor_up", 1, 1),
+                                          "B":("cursor_down", 1, 1),
+                                          "C":("cursor_right", 1, 1),
+                                          "D":("cursor_left", 1, 1),
+                                          "E":("cursor_next_line", 1, 1),
+                                          "F":("cursor_prev_line", 1, 1),
+                                          "G":("cursor_column", 1, 1),
+                                          "`":("cursor_column", 1, 1),
+                                          "d":("cursor_row", 1, 1),
+                                          "H":("cursor_move", 1, 2),
+                                          "f":("cursor_move", 1, 2),
+                                          "J":("erase_display", 0, 1),
+                                          "K":("erase_line", 0, 1),
+                                          "@":("insert_chars", 1, 1),
+                                          "P":("delete_chars", 1, 1),
+                                          "X":("erase_chars", 1, 1),
+                                          "L":("insert_lines", 1, 1),
+                                          "M":("delete_lines", 1, 1),
+                                          "S":("scroll_up", 1, 1),
+                                          "T":("scroll_down", 1, 1),
+                                          "r":("scroll_region", 0, 2)}
+# CSI parameters that aren't just numbers (with private markers like "?"
+#   anywhere in them) are ignored apart from "?" modes
+NUMERIC_PARAMS_RE:re.Pattern = re.compile(r"[\d;:]*")
+# Parameters are clamped to this so that counts like "\x1b[999999999@"
+#   can't make huge lists
+MAX_PARAM:int = 1<<16
+SGR_ATTRS:dict[int:str] = {1:"BOLD", 3:"ITALIC", 4:"UNDERLINED"}
+SGR_CLEAR_ATTRS:dict[int:tuple[str]] = {22:("BOLD",),
+                                        23:("ITALIC",),
+                                        24:("UNDERLINED",)}
+
+
+class AnsiParser:
+    """
+    Turns the output of a program into a list of operations for the screen.
+    Whole chunks are consumed at once: plain text (including newlines) is
+    split out with a regex and consecutive text with the same style becomes
+    one "text" operation. Escape sequences are looked up in tables. A
+    sequence that is cut off by the end of a chunk is kept for the next one.
+    """
+    __slots__ = "buffer", "fg", "bg", "attrs", "tags"
+
+    def __init__(self) -> AnsiParser:
+        self.buffer:str = ""
+        self.reset_style()
+
+    def reset_style(self) -> None:
+        self.fg:str|None = None
+        self.bg:str|None = None
+        self.attrs:set[str] = set()
+        self.tags:Tags = ()
+
+    def feed(self, data:str) -> list[Op]:
+        data:str = self.buffer + data
+        ops:list[Op] = []
+        # Text waiting to be added to ops (so that runs with the same style
+        #   are joined)
+        text:list[str] = []
+        text_tags:Tags = ()
+        match = TOKEN_RE.match
+        numeric = NUMERIC_PARAMS_RE.fullmatch
+        pos, end = 0, len(data)
+        while pos < end:
+            token:re.Match|None = match(data, pos)
+            if token is None:
+                # Only escape sequences can fail to match
+                if (end-pos < MAX_SEQUENCE) and PARTIAL_RE.match(data, pos):
+                    break
+                pos += 1 # Drop the ESC of a broken sequence
+                continue
+            pos:int = token.end()
+            kind:str = token.lastgroup
+            if kind == "text":
+                if text and (text_tags != self.tags):
+                    ops.append(("text", "".join(text), text_tags))
+                    text.clear()
+                text.append(token.group())
+                text_tags:Tags = self.tags
+                continue
+            if (kind == "csi") and (token.group("final") == "m"):
+                params:str = token.group("params")
+                if numeric(params):
+                    self.sgr(self.get_params(params))
+                continue
+            op:Op|None = self.get_op(kind, token)
+            if op is None:
+                continue
+            if text:
+                ops.append(("text", "".join(text), text_tags))
+                text.clear()
+            ops.append(op)
+        if text:
+            ops.append(("text", "".join(text), text_tags))
+        self.buffer:str = data[pos:]
+        for i, op in enumerate(ops):
+            if (op[0] == "text") and ("\r" in op[1]):
+                ops[i] = ("text", op[1].replace("\r\n", "\n"), op[2])
+        return ops
+
+    def get_op(self, kind:str, token:re.Match) -> Op|None:
+        if kind == "control":
+            name:str|None = C0_TABLE.get(token.group(), None)
+            return None if name is None else (name,)
+        if kind == "csi":
+            params:str = token.group("params")
+            final:str = token.group("final")
+            if params[:1] == "?":
+                if token.group("inter") or (final not in "hl") or \
+                   (not NUMERIC_PARAMS_RE.fullmatch(params, 1)):
+                    return None
+                return ("set_mode" if final == "h" else "reset_mode",
+                        *self.get_params(params[1:]))
+            if token.group("inter") or (final not in CSI_TABLE) or \
+               (not NUMERIC_PARAMS_RE.fullmatch(params)):
+                return None
+            name, default, nargs = CSI_TABLE[final]
+            args:list[int] = self.get_params(params)
+            args += [0]*(nargs-len(args))
+            return (name, *(arg or default for arg in args[:nargs]))
+        if kind == "osc":
+            ps, _, pt = token.group("osc_data").partition(";")
+            if ps in ("0", "2"):
+                return ("title", pt)
+            return None
+        if kind == "esc":
+            if token.group("esc_inter"):
+                return None # Character set designations
+            name:str|None = ESC_TABLE.get(token.group("esc_final"), None)
+            if name == "reset":
+                self.reset_style()
+            return None if name is None else (name,)
+        return None # DCS/SOS/PM/APC strings are ignored
+
+    @staticmethod
+    def get_params(params:str) -> list[int]:
+        # Sub-parameters (after ":") are ignored. Only called on params that
+        #   match `NUMERIC_PARAMS_RE`
+        return [min(int(param.split(":", 1)[0] or 0), MAX_PARAM)
+                for param in params.split(";")]
+
+    def sgr(self, args:list[int]) -> None:
+        i:int = 0
+        while i < len(args):
+            code:int = args[i]
+            if code == 0:
+                self.fg = self.bg = None
+                self.attrs.clear()
+            elif code in SGR_ATTRS:
+                self.attrs.add(SGR_ATTRS[code])
+            elif code in SGR_CLEAR_ATTRS:
+                self.attrs.difference_update(SGR_CLEAR_ATTRS[code])
+            elif 30 <= code <= 37:
+                self.fg:str = f"FG{code-30}"
+            elif 90 <= code <= 97:
+                self.fg:str = f"FG{code-90+8}"
+            elif code == 39:
+                self.fg:str|None = None
+            elif 40 <= code <= 47:
+                self.bg:str = f"BG{code-40}"
+            elif 100 <= code <= 107:
+                self.bg:str = f"BG{code-100+8}"
+            elif code == 49:
+                self.bg:str|None = None
+            elif code in (38, 48):
+                # 256 colours (only the first 16 are supported) or rgb
+                colour:str|None = None
+                if args[i+1:i+2] == [5]:
+                    if args[i+2:i+3] and (args[i+2] < len(INT_TO_COLOUR)):
+                        colour:str = f"{'FG' if code == 38 else 'BG'}{args[i+2]}"
+                    i += 2
+                elif args[i+1:i+2] == [2]:
+                    i += 4
+                if (colour is not None) and (code == 38):
+                    self.fg:str = colour
+                elif colour is not None:
+                    self.bg:str = colour
+            i += 1
+        self.tags:Tags = tuple(tag for tag in (self.fg, self.bg) if tag) + \
+                         tuple(sorted(self.attrs))
+
+
+class Line:
+    __slots__ = "chars", "tags"
+
+    def __init__(self, width:int) -> Line:
+        self.chars:list[str] = [SP]*width
+        self.tags:list[Tags] = [()]*width
+
+    @classmethod
+    def from_text(cls, text:str, tags:Tags, width:int) -> Line:
+        line:Line = cls.__new__(cls)
+        blank:int = width - len(text)
+        line.chars:list[str] = list(text) + [SP]*blank
+        line.tags:list[Tags] = [tags]*len(text) + [()]*blank
+        return line
+
+    def clear(self, start:int, end:int) -> None:
+        self.chars[start:end] = [SP]*len(self.chars[start:end])
+        self.tags[start:end] = [()]*len(self.tags[start:end])
+
+    def resize(self, width:int) -> None:
+        missing:int = width - len(self.chars)
+        self.chars.extend([SP]*missing)
+        self.tags.extend([()]*missing)
+        del self.chars[width:]
+        del self.tags[width:]
+
+    def spans(self) -> Spans:
+        """
+        Returns the line as (text, tags) spans without trailing blanks
+        """
+        chars, tags = self.chars, self.tags
+        if (not tags) or (tags.count(tags[0]) == len(tags)):
+            text:str = "".join(chars)
+            return [(text if tags and tags[0] else text.rstrip(SP),
+                     tags[0] if tags else ())]
+        spans:Spans = []
+        start:int = 0
+        for i in range(1, len(tags)+1):
+            if (i == len(tags)) or (tags[i] != tags[start]):
+                spans.append(("".join(chars[start:i]), tags[start]))
+                start:int = i
+        if not spans[-1][1]:
+            spans[-1] = (spans[-1][0].rstrip(SP), ())
+            if not spans[-1][0]:
+                spans.pop()
+        return spans
+
+
+class Damage:
+    """
+    What changed in a `Screen` since the last `Screen.take_damage`:
+        scrollback        The lines that were added to the scrollback (at
+                          most the scrollback's size)
+        clear_scrollback  If the scrollback was cleared before that
+        full              If every row changed (the grid must be redrawn)
+        rows              {row: spans} for the rows that changed
+        cursor            (row, column) of the cursor
+    """
+    __slots__ = "scrollback", "clear_scrollback", "full", "rows", "cursor"
+
+    def __init__(self, scrollback:list[Spans], clear_scrollback:bool,
+                 full:bool, rows:dict[int:Spans], cursor:tuple[int,int]):
+        self.clear_scrollback:bool = clear_scrollback
+        self.cursor:tuple[int,int] = cursor
+        self.scrollback:list[Spans] = scrollback
+        self.rows:dict[int:Spans] = rows
+        self.full:bool = full
+
+
+class Screen:
+    """
+    The state of the terminal (without Tk): a grid of `height` lines, the
+    cursor and the scrollback which is a ring buffer of at most `scrollback`
+    lines. Operations from `AnsiParser` are applied using `apply`. The rows
+    that change are tracked so that the widget only redraws those, once per
+    frame (see `take_damage`), no matter how much output there was.
+    """
+    __slots__ = "width", "height", "lines", "scrollback", "x", "y", "top", \
+                "bottom", "saved_cursor", "main", "dirty", "all_dirty", \
+                "scrolled", "cleared_scrollback", "cursor_visible", \
+                "title", "bells", "handlers"
+
+    def __init__(self, width:int, height:int, *,
+                 scrollback:int=SCROLLBACK_LINES) -> Screen:
+        assert scrollback >= 0, "ValueError"
+        self.scrollback:deque[Spans] = deque(maxlen=scrollback)
+        self.width:int = width
+        self.height:int = height
+        self.title:str = ""
+        self.bells:int = 0
+        self.reset()
+        # Operation name: method
+        self.handlers:dict[str:Callable] = {
+                                    "text": self.text,
+                                    "cr": self.cr,
+                                    "linefeed": self.linefeed,
+                                    "index": self.linefeed,
+                                    "next_line": self.next_line,
+                                    "reverse_index": self.reverse_index,
+                                    "backspace": self.backspace,
+                                    "tab": self.tab,
+                                    "bell": self.bell,
+                                    "title": self.set_title,
+                                    "cursor_up": self.cursor_up,
+                                    "cursor_down": self.cursor_down,
+                                    "cursor_right": self.cursor_right,
+                                    "cursor_left": self.cursor_left,
+                                    "cursor_next_line": self.cursor_next_line,
+                                    "cursor_prev_line": self.cursor_prev_line,
+                                    "cursor_column": self.cursor_column,
+                                    "cursor_row": self.cursor_row,
+                                    "cursor_move": self.cursor_move,
+                                    "erase_line": self.erase_line,
+                                    "erase_display": self.erase_display,
+                                    "insert_chars": self.insert_chars,
+                                    "delete_chars": self.delete_chars,
+                                    "erase_chars": self.erase_chars,
+                                    "insert_lines": self.insert_lines,
+                                    "delete_lines": self.delete_lines,
+                                    "scroll_up": self.scroll_up,
+                                    "scroll_down": self.scroll_down,
+                                    "scroll_region": self.scroll_region,
+                                    "save_cursor": self.save_cursor,
+                                    "restore_cursor": self.restore_cursor,
+                                    "set_mode": self.set_mode,
+                                    "reset_mode": self.reset_mode,
+                                    "reset": self.reset,
+                                           }
+
+    def reset(self) -> None:
+        self.lines:list[Line] = [Line(self.width) for _ in range(self.height)]
+        self.x = self.y = 0
+        self.top, self.bottom = 0, self.height-1
+        self.saved_cursor:tuple[int,int] = (0, 0)
+        # The main screen's lines and cursor while on the alternate screen
+        self.main:tuple[list[Line],int,int]|None = None
+        self.cursor_visible:bool = True
+        self.cleared_scrollback:bool = False
+        self.dirty:set[int] = set()
+        self.all_dirty:bool = True
+        self.scrolled:int = 0
+
+    def apply(self, ops:list[Op]) -> None:
+        handlers:dict[str:Callable] = self.handlers
+        for op in ops:
+            handler:Callable|None = handlers.get(op[0], None)
+            if handler is not None:
+                handler(*op[1:])
+
+    def take_damage(self) -> Damage|None:
+        """
+        Returns what changed since the last call (None if nothing did)
+        """
+        if not (self.all_dirty or self.dirty or self.scrolled or
+                self.cleared_scrollback):
+            return None
+        scrolled:int = min(self.scrolled, len(self.scrollback))
+        scrollback:list[Spans] = list(islice(self.scrollback,
+                                             len(self.scrollback)-scrolled,
+                                             None))
+        # New scrollback lines move the grid down in the widget
+        full:bool = self.all_dirty or (len(scrollback) > 0)
+        rows:range|set[int] = range(self.height) if full else self.dirty
+        damage:Damage = Damage(scrollback, self.cleared_scrollback, full,
+                               {row:self.lines[row].spans() for row in rows},
+                               (self.y, min(self.x, self.width-1)))
+        self.cleared_scrollback:bool = False
+        self.all_dirty:bool = False
+        self.dirty:set[int] = set()
+        self.scrolled:int = 0
+        return damage
+
+    def resize(self, width:int, height:int) -> None:
+        if width != self.width:
+            for line in self.lines:
+                line.resize(width)
+            self.width:int = width
+        if height < self.height:
+            # Keep the cursor on the screen by scrolling lines off the top
+            extra:int = max(0, self.y+1-height)
+            self._push_scrollback([line.spans()
+                                   for line in self.lines[:extra]])
+            self.lines:list[Line] = self.lines[extra:extra+height]
+            self.y -= extra
+        else:
+            self.lines.extend(Line(width) for _ in range(height-self.height))
+        self.height:int = height
+        self.x = min(self.x, width-1)
+        self.top, self.bottom = 0, height-1
+        self.all_dirty:bool = True
+
+    # Text
+    def text(self, run:str, tags:Tags) -> None:
+        pieces:list[str] = run.split(NL)
+        if pieces[0]:
+            self.write(pieces[0], tags)
+        i:int = 1
+        # At most `height` lines until the cursor is at the bottom
+        while (i < len(pieces)) and not ((self.y == self.bottom == \
+                                          self.height-1) and (self.top == 0)):
+            self.x:int = 0
+            self.linefeed()
+            if pieces[i]:
+                self.write(pieces[i], tags)
+            i += 1
+        if i < len(pieces):
+            self._append_lines(pieces[i:], tags)
+
+    def _append_lines(self, pieces:list[str], tags:Tags) -> None:
+        """
+        Adds the pieces as new lines at the bottom of the screen (each one
+        after a newline) when the cursor is on the last line and the whole
+        screen scrolls. Lines that go straight through the screen into the
+        scrollback are never made into cells and lines that would scroll
+        past the scrollback's size are never made at all.
+        """
+        width:int = self.width
+        skipped:int = max(0, len(pieces)-(self.scrollback.maxlen+self.height))
+        rows:list[str] = []
+        for piece in islice(pieces, skipped, None):
+            rows.extend(piece[start:start+width]
+                        for start in range(0, len(piece) or 1, width))
+        cut:int = len(self.lines) + len(rows) - self.height
+        old:int = min(cut, len(self.lines))
+        self._push_scrollback([line.spans() for line in self.lines[:old]])
+        if tags:
+            self._push_scrollback([[(row, tags)] for row in rows[:cut-old]])
+        else:
+            self._push_scrollback([[(row.rstrip(SP), ())]
+                                   for row in rows[:cut-old]])
+        if self.main is None:
+            self.scrolled += skipped
+        self.lines:list[Line] = self.lines[old:] + \
+                                [Line.from_text(row, tags, width)
+                                 for row in rows[cut-old:]]
+        last:str = pieces[-1]
+        self.x:int = len(last) - (max(0, len(last)-1)//width)*width
+        self.all_dirty:bool = True
+
+    def write(self, data:str, tags:Tags) -> None:
+        width:int = self.width
+        while data:
+            if self.x >= width:
+                # Auto-wrap (delayed until there is something to write)
+                self.x:int = 0
+                self.linefeed()
+            line:Line = self.lines[self.y]
+            size:int = min(width-self.x, len(data))
+            line.chars[self.x:self.x+size] = data[:size]
+            line.tags[self.x:self.x+size] = [tags]*size
+            self.dirty.add(self.y)
+            self.x += size
+            data:str = data[size:]
+
+    def cr(self) -> None:
+        self.x:int = 0
+
+    def bell(self) -> None:
+        self.bells += 1
+
+    def set_title(self, title:str) -> None:
+        self.title:str = title
+
+    # Scrolling
+    def linefeed(self) -> None:
+        if self.y == self.bottom:
+            self.scroll_up(1)
+        elif self.y < self.height-1:
+            self.y += 1
+
+    def next_line(self) -> None:
+        self.x:int = 0
+        self.linefeed()
+
+    def reverse_index(self) -> None:
+        if self.y == self.top:
+            self.scroll_down(1)
+        elif self.y > 0:
+            self.y -= 1
+
+    def scroll_up(self, n:int) -> None:
+        n:int = min(n, self.bottom-self.top+1)
+        if (self.top == 0) and (self.bottom == self.height-1):
+            # The whole screen moves so everything has to be redrawn
+            self._push_scrollback([line.spans() for line in self.lines[:n]])
+            del self.lines[:n]
+            self.lines.extend(Line(self.width) for _ in range(n))
+            self.all_dirty:bool = True
+            return None
+        if self.top == 0:
+            self._push_scrollback([line.spans() for line in self.lines[:n]])
+        del self.lines[self.top:self.top+n]
+        self.lines[self.bottom-n+1:self.bottom-n+1] = [Line(self.width)
+                                                       for _ in range(n)]
+        self.dirty.update(range(self.top, self.bottom+1))
+
+    def scroll_down(self, n:int) -> None:
+        n:int = min(n, self.bottom-self.top+1)
+        del self.lines[self.bottom-n+1:self.bottom+1]
+        self.lines[self.top:self.top] = [Line(self.width) for _ in range(n)]
+        self.dirty.update(range(self.top, self.bottom+1))
+
+    def _push_scrollback(self, lines:list[Spans]) -> None:
+        # The alternate screen doesn't have a scrollback
+        if (self.main is None) and (self.scrollback.maxlen != 0):
+            self.scrollback.extend(lines)
+            self.scrolled += len(lines)
+
+    def scroll_region(self, top:int, bottom:int) -> None:
+        top, bottom = (top or 1)-1, min(bottom or self.height, self.height)-1
+        if top >= bottom:
+            top, bottom = 0, self.height-1
+        self.top, self.bottom = top, bottom
+        self.x = self.y = 0
+
+    # Cursor
+    def backspace(self) -> None:
+        self.x:int = max(0, min(self.x, self.width-1)-1)
+
+    def tab(self) -> None:
+        self.x:int = min(self.width-1, (self.x//TAB_SIZE+1)*TAB_SIZE)
+
+    def cursor_up(self, n:int) -> None:
+        self.y:int = max(0, self.y-n)
+
+    def cursor_down(self, n:int) -> None:
+        self.y:int = min(self.height-1, self.y+n)
+
+    def cursor_right(self, n:int) -> None:
+        self.x:int = min(self.width-1, self.x+n)
+
+    def cursor_left(self, n:int) -> None:
+        self.x:int = max(0, min(self.x, self.width-1)-n)
+
+    def cursor_next_line(self, n:int) -> None:
+        self.cursor_down(n)
+        self.x:int = 0
+
+    def cursor_prev_line(self, n:int) -> None:
+        self.cursor_up(n)
+        self.x:int = 0
+
+    def cursor_column(self, column:int) -> None:
+        self.x:int = max(0, min(self.width-1, column-1))
+
+    def cursor_row(self, row:int) -> None:
+        self.y:int = max(0, min(self.height-1, row-1))
+
+    def cursor_move(self, row:int, column:int) -> None:
+        self.cursor_row(row)
+        self.cursor_column(column)
+
+    def save_cursor(self) -> None:
+        self.saved_cursor:tuple[int,int] = (self.x, self.y)
+
+    def restore_cursor(self) -> None:
+        x, y = self.saved_cursor
+        self.x, self.y = min(x, self.width-1), min(y, self.height-1)
+
+    # Erasing and editing
+    def erase_line(self, mode:int) -> None:
+        start, end = {0:(self.x, self.width), 1:(0, self.x+1),
+                      2:(0, self.width)}.get(mode, (0, 0))
+        self.lines[self.y].clear(start, end)
+        self.dirty.add(self.y)
+
+    def erase_display(self, mode:int) -> None:
+        if mode == 0:
+            rows:range = range(self.y+1, self.height)
+            self.erase_line(0)
+        elif mode == 1:
+            rows:range = range(0, self.y)
+            self.erase_line(1)
+        elif mode in (2, 3):
+            rows:range = range(self.height)
+        else:
+            return None
+        for row in rows:
+            self.lines[row].clear(0, self.width)
+        self.dirty.update(rows)
+        if mode == 3:
+            self.scrollback.clear()
+            self.cleared_scrollback:bool = True
+            self.scrolled:int = 0
+
+    def insert_chars(self, n:int) -> None:
+        line:Line = self.lines[self.y]
+        x:int = min(self.x, self.width-1)
+        n:int = min(n, self.width-x)
+        line.chars[x:x] = [SP]*n
+        line.tags[x:x] = [()]*n
+        line.resize(self.width)
+        self.dirty.add(self.y)
+
+    def delete_chars(self, n:int) -> None:
+        line:Line = self.lines[self.y]
+        x:int = min(self.x, self.width-1)
+        del line.chars[x:x+n]
+        del line.tags[x:x+n]
+        line.resize(self.width)
+        self.dirty.add(self.y)
+
+    def erase_chars(self, n:int) -> None:
+        x:int = min(self.x, self.width-1)
+        self.lines[self.y].clear(x, x+n)
+        self.dirty.add(self.y)
+
+    def insert_lines(self, n:int) -> None:
+        if self.top <= self.y <= self.bottom:
+            top, self.top = self.top, self.y
+            self.scroll_down(n)
+            self.top:int = top
+            self.x:int = 0
+
+    def delete_lines(self, n:int) -> None:
+        if self.top <= self.y <= self.bottom:
+            top, self.top = self.top, self.y
+            self.scroll_up(n)
+            self.top:int = top
+            self.x:int = 0
+
+    # Modes
+    def set_mode(self, *modes:int) -> None:
+        for mode in modes:
+            if mode == 25:
+                self.cursor_visible:bool = True
+            elif (mode in ALT_SCREEN_MODES) and (self.main is None):
+                self.main = (self.lines, self.x, self.y)
+                self.lines:list[Line] = [Line(self.width)
+                                         for _ in range(self.height)]
+                self.all_dirty:bool = True
+
+    def reset_mode(self, *modes:int) -> None:
+        for mode in modes:
+            if mode == 25:
+                self.cursor_visible:bool = False
+            elif (mode in ALT_SCREEN_MODES) and (self.main is not None):
+                self.lines, self.x, self.y = self.main
+                self.main = None
+                # The terminal might have been resized since
+                for line in self.lines:
+                    line.resize(self.width)
+                height, self.height = self.height, len(self.lines)
+                self.resize(self.width, height)
+                self.all_dirty:bool = True
 
 
 class TerminalScreen:
-    __slots__ = "text", "queue", "cursor_tags", "width", "height"
-
-    def __init__(self, text:tk.Text, size:(int,int)) -> None:
+    """
+    Draws a `Screen` in a tk.Text. The Text has the scrollback lines (at
+    most the screen's scrollback size) followed by the grid's rows. The
+    damage is drawn once per frame so a program flooding output only costs
+    about one redraw of the grid per frame.
+    """
+    __slots__ = "text", "screen", "lock", "width", "height", "rendered"
+
+    def __init__(self, text:tk.Text, size:(int,int), *,
+                 scrollback:int=SCROLLBACK_LINES) -> None:
         assert isinstance(text, tk.Text), "TypeError"
         self.text:tk.Text = text
         self.text.config(width=size[0], height=size[1])
         self.text.bind("<KeyPress>", self.key_pressed)
         self.config_tags()
-        self.queue:list[tuple[bool,str]] = []
+        self.screen:Screen = Screen(*size, scrollback=scrollback)
+        # How many scrollback lines are in the Text widget
+        self.rendered:int = 0
+        self.lock:Lock = Lock()
         self.resize(*size)
-        self.apply_queue()
+        self.flush()
 
     def config_tags(self) -> None:
         # Font magic
@@ -102,9 +797,6 @@ class TerminalScreen:
         self.text.config(font=font.Font(self.text, **kwargs))
         bold = font.Font(self.text, **{**kwargs, "weight":"bold"})
         italic = font.Font(self.text, **{**kwargs, "slant":"italic"})
-        # Set up other stuff
-        self.cursor_tags:list[str] = []
-        self.text.mark_set("termcursor", "1.0")
         # Tags
         for number, colour in INT_TO_COLOUR.items():
             self.text.tag_config(f"BG{number}", background=colour)
@@ -113,132 +805,100 @@ class TerminalScreen:
         self.text.tag_config("ITALIC", font=italic)
         self.text.tag_config("BOLD", font=bold)
 
-    # Not thread-safe
     def resize(self, width:int, height=int) -> None:
+        with self.lock:
+            self.screen.resize(width, height)
         self.width:int = width
         self.height:int = height
 
-    def write(self, data:str, is_ansi:bool) -> None:
-        self.queue.append((is_ansi, data))
+    # Called from the thread reading the pty
+    def write(self, ops:list[Op]) -> None:
+        with self.lock:
+            self.screen.apply(ops)
 
     # Inside tkinter's thread
-    def apply_queue(self) -> None:
-        #print(len(self.queue))
-        while len(self.queue) > 0:
-            self.handle_event(*self.queue.pop(0))
-        self.text.after(100, self.apply_queue)
-
-    def handle_event(self, is_ansi:bool, data:str) -> None:
-        if not is_ansi:
-            self.insert(data)
-        elif data == "\r":
-            self.text.mark_set("termcursor", "termcursor linestart")
-        elif data == "\n":
-            self.insert_newline()
-        elif data.startswith("FG") or data.startswith("BG"):
-            self.cursor_tags.append(data)
-        elif data in ("BOLD", "ITALIC", "UNDERLINED"):
-            self.cursor_tags.append(data)
-        elif data == "RESET_COLOUR":
-            self.cursor_tags.clear()
-
-        elif data.startswith("ERRASE"):
-            data:str = data.removeprefix("ERRASE")
-            if (data[0] == "K") and (data[1] != "?"):
-                data:int = int(data[1:])
-                if (data == 0) or (data == 2):
-                    self.text.delete("termcursor", "termcursor lineend")
-                if (data == 1) or (data == 2):
-                    chars:int = int(self.text.index("termcursor").split(".")[1])
-                    self.text.delete("termcursor linestart", "termcursor")
-                    self.text.insert("termcursor", " "*chars)
-                if data not in (0, 1, 2):
-                    print(f"[DEBUG] Unhandled ANSI: ERRASEK{data!r}")
-            elif (data[0] == "J") and (data[1] != "?"):
-                data:int = int(data[1:])
-                if data == 0:
-                    self.text.delete("termcursor", "end")
-                elif (data == 2) or (data == 3):
-                    line, char = self.get_cursor()
-                    self.text.delete("1.0", "end")
-                    if (line != 1) or (char != 1):
-                        self.assure(line=line, char=char)
-                else:
-                    print(f"[DEBUG] Unhandled ANSI: ERRASEJ{data!r}")
-            else:
-                print(f"[DEBUG] Unhandled ANSI: ERRASE{data!r}")
-
-        elif data.startswith("CURSOR_MOVE"):
-            data:str = data.removeprefix("CURSOR_MOVE")
-            row, column = data.split(";")
-            self.assure(line=int(row), char=int(column)-1)
-
-        elif data.startswith("INSERT_BLANK_CHARS"):
-            chars:int = int(data.removeprefix("INSERT_BLANK_CHARS"))
-            if self.text.compare("termcursor", "!=", "termcursor lineend"):
-                idx:str = self.text.index("termcursor")
-                self.text.insert("termcursor", " "*chars)
-                self.text.mark_set("termcursor", idx)
-
-        elif data.startswith("CURSOR_UP"):
-            n:int = int(data.removeprefix("CURSOR_UP"))
-            line, char = self.get_cursor()
-            self.assure(line=line-n, char=char)
-
-        elif data.startswith("CURSOR_DOWN"):
-            n:int = int(data.removeprefix("CURSOR_DOWN"))
-            line, char = self.get_cursor()
-            self.assure(line=line+n, char=char)
-
-        elif data.startswith("CURSOR_RIGHT"):
-            n:int = int(data.removeprefix("CURSOR_RIGHT"))
-            line, char = self.get_cursor()
-            self.assure(line=line, char=char+n)
-
-        elif data.startswith("CURSOR_LEFT"):
-            n:int = int(data.removeprefix("CURSOR_LEFT"))
-            line, char = self.get_cursor()
-            self.assure(line=line, char=char-n)
-
+    def flush(self) -> None:
+        with self.lock:
+            damage:Damage|None = self.screen.take_damage()
+            bells:int = self.screen.bells
+            self.screen.bells:int = 0
+        if damage is not None:
+            self.draw(damage)
+        if bells:
+            self.text.bell()
+        self.text.after(FRAME_DELAY, self.flush)
+
+    def draw(self, damage:Damage) -> None:
+        at_bottom:bool = (self.text.yview()[1] == 1)
+        if damage.clear_scrollback and self.rendered:
+            self.text.delete("1.0", f"{self.rendered+1}.0")
+            self.rendered:int = 0
+        if damage.scrollback or damage.full:
+            # Drop the oldest lines to stay within the scrollback's size
+            cap:int = self.screen.scrollback.maxlen
+            extra:int = self.rendered + len(damage.scrollback) - cap
+            if extra > 0:
+                self.text.delete("1.0", f"{extra+1}.0")
+                self.rendered -= extra
+            # Redraw the grid after the new scrollback lines in 1 insert
+            lines:list[Spans] = damage.scrollback + \
+                                [damage.rows[row] for row in sorted(damage.rows)]
+            self.text.delete(f"{self.rendered+1}.0", "end")
+            self.text.insert(f"{self.rendered+1}.0", *join_spans(lines))
+            self.rendered += len(damage.scrollback)
         else:
-            print(f"[DEBUG] Unhandled ANSI: {data!r}")
+            for row, spans in damage.rows.items():
+                line:int = self.rendered + row + 1
+                self.text.delete(f"{line}.0", f"{line}.end")
+                args:list = join_spans([spans])
+                if args[0]:
+                    self.text.insert(f"{line}.0", *args)
+        row, column = damage.cursor
+        self.text.mark_set("insert", f"{self.rendered+row+1}.{column}")
+        if at_bottom:
+            self.text.see("insert")
 
     def key_pressed(self, event:tk.Event) -> str:
         print(f"[DEBUG]: {event}")
         return "break"
 
-    def get_cursor(self) -> tuple[int,int]:
-        line, column = self.text.index("termcursor").split(".")
-        return int(line), int(column)
-
-    def assure(self, *, line:int, char:int) -> None:
-        line, char = max(0, line), max(0, char)
-        cline, cchar = self.text.index(f"{line}.{char}").split(".")
-        cline, cchar = int(cline), int(cchar)
-        if cline < line:
-            self.text.insert("end", "\n"*(line-cline))
-            crow:int = 0
-        if cchar < char:
-            self.text.insert(f"{line}.{char}", " "*(char-cchar))
 
-    def insert(self, data:str) -> None:
-        prevdata:str = self.text.get("termcursor", f"termcursor +{len(data)}c")
-        self.text.insert("termcursor", data, self.cursor_tags)
-        chars:int = (prevdata+"\n").find("\n")
-        self.text.delete("termcursor", f"termcursor +{chars}c")
-
-    def insert_newline(self) -> None:
-        if text.compare("termcursor +1l", "==", "end"):
-            self.text.insert("termcursor lineend", "\n")
-        self.text.mark_set("termcursor", f"termcursor +1l linestart")
+def join_spans(lines:list[Spans]) -> list:
+    """
+    Turns lines of (text, tags) spans into the arguments of tk.Text.insert
+    (text, tags, text, tags, ...) with the lines joined by "\\n" and
+    neighbouring spans with the same tags merged
+    """
+    args:list = []
+    pieces:list[str] = []
+    last:Tags|None = None
+    for i, spans in enumerate(lines):
+        if i != 0:
+            spans:list = [(NL, ())] + spans
+        for text, tags in spans:
+            if not text:
+                continue
+            if (tags != last) and pieces:
+                args += ("".join(pieces), last)
+                pieces.clear()
+            pieces.append(text)
+            last:Tags = tags
+    if pieces:
+        args += ("".join(pieces), last)
+    return args or ["", ()]
 
 
 class PtyTerminal:
-    __slots__ = "_master_pty", "_proc", "_screen", "_size", "_buffer"
-
-    def __init__(self, master:tk.Text, cmd:tuple[str], size:(int,int)=(80,24)):
-        self._screen:TerminalScreen = TerminalScreen(master, size)
-        self._buffer:str = ""
+    __slots__ = "_master_pty", "_proc", "_screen", "_size", "_parser", \
+                "_decoder"
+
+    def __init__(self, master:tk.Text, cmd:tuple[str], size:(int,int)=(80,24),
+                 *, scrollback:int=SCROLLBACK_LINES):
+        self._screen:TerminalScreen = TerminalScreen(master, size,
+                                                     scrollback=scrollback)
+        self._parser:AnsiParser = AnsiParser()
+        # Keeps utf-8 characters that are split between chunks
+        self._decoder = codecs.getincrementaldecoder("utf-8")("backslashreplace")
         master_fd, slave_fd = pty.openpty()
         self._master_pty:PtyPeekaboo = PtyPeekaboo(master_fd)
         self.resize(*size)
@@ -267,359 +927,38 @@ class PtyTerminal:
         while True:
             try:
                 raw_data:bytes = self._master_pty.read(CHUNK_SIZE)
-                data:str = raw_data.decode("utf-8", "backslashreplace")
             except OSError:
-                data:str = ""
-            if len(data) == 0:
+                raw_data:bytes = b""
+            if len(raw_data) == 0:
                 break
-            self._handle_stdout(data)
+            data:str = self._decoder.decode(raw_data)
+            if len(data) > 0:
+                self._handle_stdout(data)
         print("DEAD")
 
     def _handle_stdout(self, data:str) -> None:
         assert isinstance(data, str), "TypeError"
         assert len(data) > 0, "ValueError"
-        data:str = self._buffer + data
-        for string, is_ansi, rest in self._split_ansi_data(data):
-            if len(string) == 0:
-                continue
-            self._screen.write(string, is_ansi)
-        self._buffer:str = rest
-
-    def _split_ansi_data(self, data:str) -> Iterable[(str,str)]:
-        assert isinstance(data, str), "TypeError"
-        while len(data) > 0:
-            idx:int = PtyTerminal.find_first_in_str(data, "\x1b", "\r", "\n")
-            if idx != 0:
-                output, data = data[:idx], data[idx:]
-                yield output, False, data
-            if data[:1] == "\r":
-                data:str = data[1:]
-                yield "\r", True, data
-            if data[:1] == "\n":
-                data:str = data[1:]
-                yield "\n", True, data
-            if data.startswith("\x1b"):
-                ansi, ansi_length = self._get_ansi(data)
-                if ansi_length == 0:
-                    return
-                if ansi_length == 1:
-                    data:str = "\\x1b"+data[1:]
-                    continue
-                if ansi.startswith("\x1b"):
-                    data:str = ansi+data[ansi_length:]
-                    continue
-                data:str = data[ansi_length:]
-                yield ansi, True, data
-
-    @staticmethod
-    def find_first_in_str(string:str, *search:tuple[str]) -> int:
-        """
-        Return the idx of the first s in search that is found in string.
-        Returns len(string) on fail.
-        """
-        curr_min:int = len(string)
-        for s in search:
-            idx:int = string.find(s)
-            if idx != -1:
-                curr_min:int = min(curr_min, idx)
-        return curr_min
-
-    @staticmethod
-    def _get_ansi(data:str) -> (str, int):
-        """
-        Returns the ANSI operation and the size of the data consumed.
-        Size of 0 means: wait - ask me again after more data comes
-        Size of 1 means: can't handle this, don't send it again.
-
-        If the ANSI operation startswith("\x1b"):
-            it means that the data is split into 2 ANSI sequences and
-            the returned string is the 2 sequences
-        """
-        assert isinstance(data, str), "TypeError"
-        assert len(data) > 0, "ValueError"
-        assert data[0] == "\x1b", "ValueError"
-        if len(data) == 1:
-            return None, 0
-        if data[1:3] in (" F", " G", " L", " M", " N"):
-            return None, 1
-        if data[1:3] in ("#3", "#4", "#5", "#6", "#8", "%@", "%G"):
-            return None, 1
-        if data[1] in "()*+-./69Flmno|}~":
-            return None, 1
-        if data[1] == "c":
-            return "\x1b[m]\x1b[H\x1b[2J", 2
-        if data[1] in "DEHMNOPVWXZ_\\":
-            return None, 1
-        if data[1] in "=>":
-            return "", 2
-        if data[1] == "7":
-            return "SAVE_CURSOR", 2
-        if data[1] == "8":
-            return "RESTORE_CURSOR", 2
-        if data[1] == "\\":
-            return None, 0
-        # PM = ESC ^
-        # PM PRIVATE_MESSAGE Pt ST
-        if data[1] == "^":
-            # private message
-            idx:int = data.find(ST)
-            if idx == -1:
-                return None, 0
-            private_message:str = data[2:idx] # Ignored lke xterm
-            return None, 1
-        # OSC = ESC ]
-        # OSC Ps ; Pt (?:BEL|ST)
-        if data[1] == "]":
-            # Work out the end of the escape sequence
-            idx1:int = data.find(BEL)
-            idx2:int = data.find(ST)
-            if idx1 == idx2 == -1:
-                return None, 0
-            if idx1 == -1:
-                idx:int = idx2
-            elif idx2 == -1:
-                idx:int = idx1
-            else:
-                idx:int = min(idx1, idx2)
-            size:int = idx+1
-            ps_pt:str = data[2:idx]
-            if ";" not in ps_pt:
-                return None, 1
-            ps, pt = ps_pt.split(";", 1)
-            if ps == "0":
-                return "TITLE_ICON_CHANGE"+pt, size
-            if ps == "1":
-                return "ICON_CHANGE"+pt, size
-            if ps == "2":
-                return "TITLE_CHANGE"+pt, size
-            return None, 1
-        # CSI = ESC [
-        if data[1] == "[":
-            data:str = data[2:]
-            if len(data) == 0:
-                return None, 0
-            if data[0] in "u#>":
-                return None, 1
-            if data == "?":
-                return None, 1
-            args, size = PtyTerminal._parse_args(data)
-            size += 2
-            if args is None:
-                return None, 0
-            if len(args) == 0:
-                return None, 0
-            if args[-1] == "@":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "INSERT_BLANK_CHARS"+args[0], size
-            if args[-1] == " @":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "SHIFT_SCREEN_LEFT"+args[0], size
-            if args[-1] == "A":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_UP"+args[0], size
-            if args[-1] == " A":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "SHIFT_SCREEN_RIGHT"+args[0], size
-            if args[-1] == "B":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_DOWN"+args[0], size
-            if args[-1] == "C":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_RIGHT"+args[0], size
-            if args[-1] == "D":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_LEFT"+args[0], size
-            if args[-1] == "E":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_NEXT_LINE"+args[0], size
-            if args[-1] == "F":
-                args = tuple(filter(bool, args))
-                if len(args) == 1:
-                    args = ("1",)+args
-                if len(args) != 2:
-                    return None, 1
-                return "CURSOR_PREV_LINE"+args[0], size
-            if args[-1] in "GILMP#P#Q#RXZ^`abcdefginpqr":
-                return None, 1
-            if args[-1] == "H":
-                if len(args) == 1:
-                    args = ("1","1")+args
-                if len(args) == 2:
-                    args = (args[0], "1", args[1])
-                if args[0] == "":
-                    args = ("1", *args[1:])
-                if len(args) != 3:
-                    return None, 1
-                return "CURSOR_MOVE"+";".join(args[:2]), size
-            if args[-1] == "J":
-                if args[0] == "":
-                    args = ("0", "J")
-                if len(args) == 3:
-                    args = ("?"+args[0], None)
-                if len(args) != 2:
-                    return None, 1
-                return "ERRASEJ"+args[0], size
-            if args[-1] == "K":
-                if args[0] == "":
-                    args = ("0", "K")
-                if len(args) == 3:
-                    args = ("?"+args[0], None)
-                if len(args) != 2:
-                    return None, 1
-                return "ERRASEK"+args[0], size
-            if args[-1] == "S":
-                if len(args) == 1:
-                    args = ("1",)+args
-                elif args[0] == "?":
-                    return None, 1
-                if len(args) != 2:
-                    return None, 1
-                return "SCROLL_UP_LINES"+args[0], size
-            if args[-1] == "T":
-                if len(args) == 1:
-                    args = ("1",)+args
-                elif args[0] == ">":
-                    return None, 1
-                if len(args) != 2:
-                    return None, 1
-                return "SCROLL_DOWN_LINES"+args[0], size
-            if args[-1] == "h":
-                if (args[0] != "?") or (len(args) != 3):
-                    return None, 1
-                if args[1] == "1":
-                    # Application Cursor Keys - used by `less`
-                    return "", size
-                if args[1] == "1049":
-                    return "SAVE_SCREEN_STATE_RESET_STATE", size
-                if args[1] == "2004":
-                    return "PASTE_BREAK1", size
-            if args[-1] == "l":
-                if (args[0] != "?") or (len(args) != 3):
-                    return None, 1
-                if args[1] == "1":
-                    # Application Cursor Keys - used by `less`
-                    return "", size
-                if args[1] == "1049":
-                    return "RESTORE_SCREEN_STATE", size
-                if args[1] == "2004":
-                    return "PASTE_BREAK0", size
-            if args[-1] == "t":
-                if len(args) != 4:
-                    return None, 1
-                if args[1] == "0":
-                    if args[0] == "22":
-                        # Save icon + window title in the stack
-                        return "", size
-                    if args[0] == "23":
-                        # Pop and set icon + window title in the stack
-                        return "", size
-                elif args[1] == "4":
-                    _, width, height, _ = args
-                    return f"RESIZE_WINDOW_PIX{width};{height}", size
-                elif args[1] == "8":
-                    _, width, height, _ = args
-                    return f"RESIZE_WINDOW_CHR{width};{height}", size
-            if args[-1] == "m":
-                if len(args) == 1:
-                    return "RESET_COLOUR", size
-                if (args[0] in "0") and (len(args) == 2):
-                    return "RESET_COLOUR", size
-                if args[0].isdigit() and (len(args) == 2):
-                    digit:int = int(args[0])
-                    if digit == 1:
-                        return f"BOLD", size
-                    if digit == 2:
-                        return f"FAINT", size
-                    if digit == 3:
-                        return f"ITALIC", size
-                    if digit == 4:
-                        return f"UNDERLINED", size
-                    if 30 <= digit <= 37:
-                        return f"FG{digit-30}", size
-                    if 40 <= digit <= 47:
-                        return f"BG{digit-40}", size
-                if args == ("01", "31", "m"):
-                    return f"\x1b[1m\x1b[31m", size
-        return None, 1
-
-    @staticmethod
-    def _parse_args(data:str) -> (tuple[str], int):
-        size:int = 0
-        args:list[str] = []
-        if data[:1] == "?":
-            size += 1
-            args.append("?")
-            data:str = data[1:]
-        while True:
-            arg:str = ""
-            while len(data) > 0:
-                size += 1
-                char, data = data[:1], data[1:]
-                if char not in "0123456789":
-                    break
-                arg += char
-            if (len(args) != "") or (len(args) != 2):
-                args.append(arg)
-            if char != ";":
-                break
-        if char in "0123456789;":
-            return None, 0
-        if char in " #>":
-            if len(data) == 0:
-                return None, 0
-            char += data[0]
-            size += 1
-        args.append(char)
-        return tuple(args), size
-
+        ops:list[Op] = self._parser.feed(data)
+        if ops:
+            self._screen.write(ops)
 
-from os.path import dirname
-cmd = ["g++", f"{dirname(__file__)}/test.cpp"]
-cmd = ["echo", "-e", "abc\ndef\r\\x1b[Ax"]
-#cmd = ["python3", "/media/thelizzard/C36D-8837/pokemon/hoster.py", "--https"]
-#cmd = ["echo", "\\x1b[\\n"]
-#cmd = ["bash"]
 
+if __name__ == "__main__":
+    from os.path import dirname
+    cmd = ["g++", f"{dirname(__file__)}/test.cpp"]
+    cmd = ["echo", "-e", "abc\ndef\r\\x1b[Ax"]
+    #cmd = ["python3", "/media/thelizzard/C36D-8837/pokemon/hoster.py", "--https"]
+    #cmd = ["echo", "\\x1b[\\n"]
+    #cmd = ["bash"]
 
-root = tk.Tk()
-text = tk.Text(root, bg="black", fg="white", insertbackground="white")
-text.pack(fill="both", expand=True)
+    root = tk.Tk()
+    text = tk.Text(root, bg="black", fg="white", insertbackground="white")
+    text.pack(fill="both", expand=True)
 
-pty_terminal = PtyTerminal(text, cmd)
+    pty_terminal = PtyTerminal(text, cmd)
 
-root.mainloop()
+    root.mainloop()
 
 
 # pty_terminal.resize(width=50, height=24)
@@ -3,6 +3,8 @@
       | Bound events:                                                   |
       +-----------------------------------------------------------------+
       | run      | tuple[str] | Run a command (needs process)           |
+      | script   | list[dict] | Run steps one after the other (below)   |
+      | abort    |            | Skip the rest of the running script     |
       | pause    |            | Pause process (needs process)           |
       | unpause  |            | Unpause process (needs process)         |
       | signal   | int|Signal | Sends signal to process (needs process) |
@@ -11,10 +13,17 @@
       | ping     |            | Got a ping, respond with pong           |
       +-----------------------------------------------------------------+
       +-----------------------------------------------------------------+
+      | Registered calls (for IPC.call):                                |
+      +-----------------------------------------------------------------+
+      | ping     | object     | Returns the payload                     |
+      | reset    |            | Restores the starting cwd/env (if idle) |
+      +-----------------------------------------------------------------+
+      +-----------------------------------------------------------------+
       | Generated events:                                               |
       +-----------------------------------------------------------------+
       | ready    |            | Whenever ready for events               |
       | finished | int        | Process finished, exit code in data     |
+      | script-done | list    | Results of each step (before finished)  |
       | running  |            | Responce to "run" (not guaranteed)      |
       | exit     |            | Responce to "exit" at exit              |
       | error    | str        | An error occured, error msg in data     |
@@ -22,6 +31,28 @@
       | pong     |            | Respond to master's ping with pong      |
       +-----------------------------------------------------------------+
 
+Scripts are lists of {"cmd":tuple[str], "stop_on_failure":bool} steps. The
+commands can also be "cd", "export" or "print!" (prints the rest of the
+command). If a step with "stop_on_failure" fails, the rest are skipped. When
+the script ends, "script-done" is sent with a {"cmd", "exit_code", "time",
+"usage"} dict for each step ("exit_code" is None for skipped steps) followed
+by "finished" with the exit code of the last step that ran. "usage" has the
+"wall", "user" and "sys" times (in seconds) and the "maxrss" (in bytes) of
+the process (or None for builtins).
+Steps can also have:
+    "report": str    Print the usage after the step (eg. "Compiled in ...")
+    "stdin": str     A file to use as the process's stdin
+    "repeat": int    Run the process this many times (with its stdout
+                     hidden) and print the min/median/stddev of the times.
+                     "usage" becomes a list with the usage of each run
+    "coalesce": bool Throttle the process's output (see `Coalescer`). The
+                     process gets a pty of its own as stdout/stderr so
+                     don't use it for full screen (curses) programs
+    "child_usage": bool  The process can report the usage of the process
+                     that did the work (eg. a fork server's child) by
+                     writing it as a json dict to the fd in
+                     $TERMINALTK_USAGE_FD before it exits
+
 Notes for windows:
     for SIGINT use CTRL_C_EVENT signal
     for SIGKILL use "taskkill /f"
@@ -29,14 +60,31 @@ Notes for windows:
     for unpause use DebugActiveProcessStop
 """
 from __future__ import annotations
-from threading import Thread, Lock, Event as _Event
-from sys import stdin, stdout, stderr, argv
-from subprocess import Popen, check_output
+from threading import Thread, Lock, Condition, Event as _Event
+from sys import stdin, stdout, stderr, argv, platform
+from subprocess import Popen, check_output, DEVNULL
 import signal as _signal
-from time import sleep
+from time import sleep, perf_counter
+import statistics
 import traceback
+import json
+import select
 import os
 
+if os.name == "posix":
+    import termios, fcntl, pty
+
+
+# ru_maxrss is in bytes on macos and in KiB everywhere else
+MAXRSS_UNIT:int = 1 if platform == "darwin" else 1024
+# The env variable with the fd for "child_usage" steps ("maxrss" in bytes)
+USAGE_FD_ENV:str = "TERMINALTK_USAGE_FD"
+# Output coalescing (see `Coalescer`)
+COALESCE_INTERVAL:float = 0.016 # Seconds between writes to the terminal
+COALESCE_CHUNK:int = 64*1024 # Max bytes per write to the terminal
+MAX_BACKLOG:int = 1024*1024 # Drop the oldest output after this many bytes
+FINISH_TIMEOUT:float = 1 # Wait for the output after the process exits
+
 
 Break:type = bool
 def rm_event(func:Callable[T]) -> Callable[[object],T]:
@@ -49,24 +97,170 @@ def rm_event(func:Callable[T]) -> Callable[[object],T]:
     return inner
 
 
+class Coalescer:
+    """
+    Sits between a process and the terminal (`out`). The process writes to
+    a pty (so it still sees a terminal) and the output is written to the
+    terminal in chunks of at most COALESCE_CHUNK bytes, at most once every
+    COALESCE_INTERVAL seconds (output after a quiet period isn't delayed).
+    If the terminal falls more than MAX_BACKLOG bytes behind, the oldest
+    lines are dropped and replaced with a "[N lines skipped]" marker so a
+    process flooding output (like `yes`) can't freeze the terminal.
+    """
+    __slots__ = "master", "slave", "out", "backlog", "skipped_lines", \
+                "skipped_bytes", "cond", "eof", "closed", "last_write", \
+                "reader", "writer"
+
+    def __init__(self, out:int) -> Coalescer:
+        self.master, self.slave = pty.openpty()
+        self.backlog:bytearray = bytearray()
+        self.cond:Condition = Condition()
+        self.skipped_lines:int = 0
+        self.skipped_bytes:int = 0
+        self.last_write:float = 0
+        self.closed:bool = False
+        self.eof:bool = False
+        self.out:int = out
+        self.copy_size()
+        self.reader:Thread = Thread(target=self._read, daemon=True)
+        self.writer:Thread = Thread(target=self._write, daemon=True)
+        self.reader.start()
+        self.writer.start()
+
+    def copy_size(self) -> None:
+        try:
+            size:bytes = fcntl.ioctl(self.out, termios.TIOCGWINSZ, bytes(8))
+            fcntl.ioctl(self.master, termios.TIOCSWINSZ, size)
+        except OSError:
+            pass
+
+    def started(self) -> None:
+        # Only the process should have the pty open (so that we get EOF)
+        if self.slave is not None:
+            os.close(self.slave)
+            self.slave:int|None = None
+
+    def finish(self) -> None:
+        """
+        Writes the rest of the output and closes the pty. Waits at most
+        FINISH_TIMEOUT seconds for the process's children to close the pty
+        and FINISH_TIMEOUT seconds for the terminal to catch up (after that
+        the rest of the output is skipped). Never blocks for longer than
+        about 3*FINISH_TIMEOUT seconds even if the terminal isn't reading
+        """
+        self.started()
+        self.reader.join(FINISH_TIMEOUT)
+        with self.cond:
+            self.closed:bool = True
+            self.cond.notify()
+        # The reader checks `closed` every 0.1 seconds
+        self.reader.join(FINISH_TIMEOUT)
+        self.writer.join(FINISH_TIMEOUT)
+        if self.writer.is_alive():
+            with self.cond:
+                self._drop(len(self.backlog))
+            # A write stuck on the terminal can't be cancelled so give up
+            #   on it (it's a daemon thread with at most one chunk left)
+            self.writer.join(FINISH_TIMEOUT)
+        if not self.reader.is_alive():
+            os.close(self.master)
+
+    def _read(self) -> None:
+        while not self.closed:
+            if not select.select([self.master], [], [], 0.1)[0]:
+                continue
+            try:
+                data:bytes = os.read(self.master, COALESCE_CHUNK)
+            except OSError: # EIO once the process closed the pty
+                data:bytes = b""
+            with self.cond:
+                if not data:
+                    break
+                self.backlog += data
+                if len(self.backlog) > MAX_BACKLOG:
+                    self._drop()
+                self.cond.notify()
+        with self.cond:
+            self.eof:bool = True
+            self.cond.notify()
+
+    def _drop(self, size:int=None) -> None:
+        # Keep the newest COALESCE_CHUNK bytes (from the start of a line)
+        start:int = len(self.backlog) - COALESCE_CHUNK if size is None else size
+        cut:int = self.backlog.find(b"\n", start) + 1 or start
+        self.skipped_lines += self.backlog.count(b"\n", 0, cut)
+        self.skipped_bytes += cut
+        del self.backlog[:cut]
+
+    def _write(self) -> None:
+        while True:
+            with self.cond:
+                while not (self.backlog or self.eof):
+                    self.cond.wait()
+                # Wait for more output unless there is a full chunk
+                while (len(self.backlog) < COALESCE_CHUNK) and (not self.eof):
+                    delay:float = self.last_write+COALESCE_INTERVAL-perf_counter()
+                    if delay <= 0:
+                        break
+                    self.cond.wait(delay)
+                if not (self.backlog or self.skipped_bytes):
+                    return None
+                data:bytes = self._marker() + self.backlog[:COALESCE_CHUNK]
+                del self.backlog[:COALESCE_CHUNK]
+            try:
+                while data:
+                    data:bytes = data[os.write(self.out, data):]
+            except OSError: # The terminal is gone
+                with self.cond:
+                    self.backlog.clear()
+            self.last_write:float = perf_counter()
+
+    def _marker(self) -> bytes:
+        if not self.skipped_bytes:
+            return b""
+        if self.skipped_lines:
+            skipped:str = f"{self.skipped_lines} lines"
+        else:
+            skipped:str = format_size(self.skipped_bytes)
+        self.skipped_lines = self.skipped_bytes = 0
+        # Reset the colours in case we dropped the escape sequence for it
+        return f"\x1b[0m\x1b[7m[{skipped} skipped]\x1b[0m\r\n".encode("utf-8")
+
+
 class Slave:
-    __slots__ = "proc", "ipc", "_dead_event"
+    __slots__ = "proc", "ipc", "_dead_event", "_initial_env", "_initial_cwd", \
+                "_abort", "_script_running", "_started", "usage", "coalescer", \
+                "_usage_fd"
 
     def __init__(self, ipc:IPC) -> Slave:
+        self._script_running:bool = False
+        self.usage:dict[str:float]|None = None
+        self.coalescer:Coalescer|None = None
+        self._usage_fd:int|None = None
+        self._abort:_Event = _Event()
+        self._started:float = 0
+        self._initial_env:dict[str:str] = dict(os.environ)
+        self._initial_cwd:str = os.getcwd()
         self._dead_event:_Event = _Event()
         self.proc:Popen = None
         self.ipc:IPC = ipc
         # Set up threaded bindings:
         bind = lambda event, handler: ipc.bind(event, handler, threaded=True)
-        bind("print", self.print)
+        ipc.bind("print", self.print, threaded=True, serial=True)
         bind("exit", rm_event(self._dead_event.set))
+        bind("abort", rm_event(self._abort.set))
         bind("ping", lambda event: self.send("pong", event.data))
+        ipc.register_call("ping", lambda event: event.data)
+        ipc.register_call("reset", rm_event(self.reset))
         # Set up non-threaded bindings:
         bind = lambda event, handler: ipc.bind(event, handler, threaded=False)
         bind("pause", rm_event(self.pause))
         bind("unpause", rm_event(self.unpause))
         bind("run", lambda event: self._run(event.data))
+        bind("script", lambda event: self._run_script(event.data))
         bind("signal", lambda event: self._send_signal(event.data))
+        if hasattr(_signal, "SIGWINCH"):
+            _signal.signal(_signal.SIGWINCH, self._resized)
         # Tell master we are ready
         self.send("ready")
         # Die if master is dead
@@ -74,9 +268,9 @@ class Slave:
         Thread(target=self._forever_call_queued_events, daemon=True).start()
 
     def _forever_call_queued_events(self) -> None:
-        while True:
+        while not self.ipc.dead:
+            self.ipc.wait_queued_events()
             self.ipc.call_queued_events()
-            sleep(0.2)
 
     def _die_with_master(self) -> None:
         while self.ipc.find_where(MASTER_PID):
@@ -105,6 +299,24 @@ class Slave:
         else:
             self.send("error", "NotImplementedError")
 
+    def reset(self) -> bool:
+        """
+        Undo the effects of "cd" and "export" so that the slave can be reused
+        Returns false (and does nothing) if a process is still running.
+        """
+        if (self.proc is not None) or self._script_running:
+            return False
+        log("resetting", 1)
+        os.chdir(self._initial_cwd)
+        os.environ.clear()
+        os.environ.update(self._initial_env)
+        return True
+
+    def _resized(self, signum:int, frame:object) -> None:
+        coalescer:Coalescer|None = self.coalescer
+        if coalescer is not None:
+            coalescer.copy_size()
+
     def print(self, event:ipc.Event) -> None:
         log("printing", 1)
         print(event.data, end="", flush=True)
@@ -113,39 +325,215 @@ class Slave:
         if len(command) == 0:
             return self.send("error", "EmptyCommand")
         if command[0] == "cd":
-            return self.cd(command)
+            return self.send("finished", data=self.cd(command))
         elif command[0] == "export":
-            return self.export(command)
-        log(f"starting {command[0]}", 1)
-        if self.proc is not None:
+            return self.send("finished", data=self.export(command))
+        if (self.proc is not None) or self._script_running:
             self.send("error", "ProcAlreadyRunning")
             return None
         try:
-            self.proc:Popen = Popen(command, stdin=stdin, stdout=stdout,
-                                    stderr=stderr, shell=False, env=os.environ)
+            self._start(command)
         except FileNotFoundError:
             self.send("error", f"Invalid executable: {command[0]!r}")
-            self.proc:Popen = None
             return None
-        self.send("running")
-        def wait() -> None:
-            log("waiting proc", 1)
-            self.proc.wait()
-            exit_code:int = self.proc.poll()
-            log(f"proc exit_code = {exit_code}", 1)
-            self.proc:Popen = None
-            reset_stdin()
-            self.send("finished", data=exit_code)
+        wait = lambda: self.send("finished", data=self._wait())
         Thread(target=wait, daemon=True).start()
 
+    def _start(self, command:tuple[str], *, stdin_path:str|None=None,
+               hide_stdout:bool=False, coalesce:bool=False,
+               child_usage:bool=False) -> None:
+        log(f"starting {command[0]}", 1)
+        proc_stdin = stdin if stdin_path is None else open(stdin_path, "rb")
+        proc_stdout, proc_stderr = (DEVNULL if hide_stdout else stdout), stderr
+        if coalesce and (not hide_stdout) and (os.name == "posix"):
+            self.coalescer:Coalescer = Coalescer(stdout.fileno())
+            proc_stdout = proc_stderr = self.coalescer.slave
+        env:dict[str:str] = os.environ
+        usage_fd:int|None = None
+        pass_fds:tuple[int] = ()
+        if child_usage and (os.name == "posix"):
+            self._usage_fd, usage_fd = os.pipe()
+            os.set_blocking(self._usage_fd, False)
+            env:dict[str:str] = {**os.environ, USAGE_FD_ENV:str(usage_fd)}
+            pass_fds:tuple[int] = (usage_fd,)
+        try:
+            self.proc:Popen = Popen(command, stdin=proc_stdin, shell=False,
+                                    stdout=proc_stdout, stderr=proc_stderr,
+                                    env=env, pass_fds=pass_fds)
+        except OSError:
+            self.proc:Popen = None
+            self._finish_coalescer()
+            self._read_child_usage()
+            raise
+        finally:
+            if stdin_path is not None:
+                proc_stdin.close()
+            if usage_fd is not None:
+                os.close(usage_fd)
+            if self.coalescer is not None:
+                self.coalescer.started()
+        self._started:float = perf_counter()
+        self.send("running")
+
+    def _wait(self) -> int:
+        """
+        Waits for the process and returns its exit code. Its resource usage
+        is put in `self.usage`
+        """
+        log("waiting proc", 1)
+        if hasattr(os, "wait4"):
+            try:
+                _, status, rusage = os.wait4(self.proc.pid, 0)
+            except ChildProcessError:
+                # Already reaped somewhere else so the usage is lost
+                exit_code:int = self.proc.returncode
+                if exit_code is None:
+                    exit_code:int = 1
+                self.usage:dict[str:float] = {}
+            else:
+                exit_code:int = os.waitstatus_to_exitcode(status)
+                self.proc.returncode:int = exit_code
+                self.usage:dict[str:float] = {"user":rusage.ru_utime,
+                                              "sys":rusage.ru_stime,
+                                              "maxrss":rusage.ru_maxrss *
+                                                       MAXRSS_UNIT}
+        else:
+            exit_code:int = self.proc.wait()
+            self.usage:dict[str:float] = {}
+        self.usage["wall"] = perf_counter() - self._started
+        self.usage.update(self._read_child_usage())
+        log(f"proc exit_code = {exit_code}", 1)
+        self.proc:Popen = None
+        self._finish_coalescer()
+        reset_stdin()
+        return exit_code
+
+    def _read_child_usage(self) -> dict[str:float]:
+        """
+        Reads (and closes) the pipe from a "child_usage" step. Returns the
+        "user", "sys" and "maxrss" that the process wrote to it (if any)
+        """
+        if self._usage_fd is None:
+            return {}
+        try:
+            usage:object = json.loads(os.read(self._usage_fd, 1<<12))
+        except (OSError, ValueError):
+            usage:object = {}
+        finally:
+            os.close(self._usage_fd)
+            self._usage_fd:int|None = None
+        if not isinstance(usage, dict):
+            return {}
+        return {key:value for key, value in usage.items()
+                if (key in ("user", "sys", "maxrss")) and
+                   isinstance(value, int|float)}
+
+    def _finish_coalescer(self) -> None:
+        if self.coalescer is not None:
+            self.coalescer.finish()
+            self.coalescer:Coalescer|None = None
+
+    def _run_script(self, steps:list[dict]) -> None:
+        if (self.proc is not None) or self._script_running:
+            self.send("error", "ProcAlreadyRunning")
+            return None
+        self._script_running:bool = True
+        self._abort.clear()
+        Thread(target=self._script_thread, args=(steps,), daemon=True).start()
+
+    def _script_thread(self, steps:list[dict]) -> None:
+        results:list[dict] = []
+        exit_code:int = 0
+        skip:bool = False
+        for step in steps:
+            command:tuple[str] = step["cmd"]
+            if skip or self._abort.is_set():
+                results.append({"cmd":command, "exit_code":None, "time":0})
+                continue
+            start:float = perf_counter()
+            self.usage:dict[str:float]|None = None
+            if step.get("repeat", 1) > 1:
+                exit_code, usage = self._repeat_step(step)
+            else:
+                exit_code:int = self._run_step(command, step.get("stdin"),
+                                               coalesce=step.get("coalesce",
+                                                                 False),
+                                               child_usage=step.get(
+                                                   "child_usage", False))
+                usage:dict[str:float]|None = self.usage
+            duration:float = perf_counter() - start
+            results.append({"cmd":command, "exit_code":exit_code,
+                            "time":duration, "usage":usage})
+            if step.get("report", None):
+                if isinstance(usage, list):
+                    print(format_repeats(step["report"], exit_code, usage))
+                else:
+                    print(format_usage(step["report"], exit_code,
+                                       usage or {"wall":duration}))
+            if (exit_code != 0) and step.get("stop_on_failure", True):
+                skip:bool = True
+        self._script_running:bool = False
+        log(f"script exit_code = {exit_code}", 1)
+        self.send("script-done", data=results)
+        self.send("finished", data=exit_code)
+
+    def _repeat_step(self, step:dict) -> tuple[int,list[dict]]:
+        usages:list[dict[str:float]] = []
+        exit_code:int = 0
+        for i in range(step["repeat"]):
+            if self._abort.is_set():
+                break
+            print(f"\rRun {i+1}/{step['repeat']}", end="", flush=True)
+            exit_code:int = self._run_step(step["cmd"], step.get("stdin"),
+                                           hide_stdout=True,
+                                           child_usage=step.get("child_usage",
+                                                                False))
+            if self.usage is not None:
+                usages.append(self.usage)
+            if exit_code != 0:
+                break
+        print()
+        return exit_code, usages
+
+    def _run_step(self, command:tuple[str], stdin_path:str|None=None, *,
+                  hide_stdout:bool=False, coalesce:bool=False,
+                  child_usage:bool=False) -> int:
+        if len(command) == 0:
+            print("slave: empty command")
+            return 1
+        if command[0] == "print!":
+            print(" ".join(command[1:]), end="", flush=True)
+            return 0
+        if command[0] == "cd":
+            return self.cd(command)
+        if command[0] == "export":
+            return self.export(command)
+        try:
+            self._start(command, stdin_path=stdin_path,
+                        hide_stdout=hide_stdout, coalesce=coalesce,
+                        child_usage=child_usage)
+        except FileNotFoundError:
+            print(f"slave: {command[0]}: command not found")
+            return 127
+        except OSError as error:
+            print(f"slave: {error}")
+            return 1
+        return self._wait()
+
     def _send_signal(self, signal:_signal.Signals|int) -> None:
         if not isinstance(signal, _signal.Signals|int):
             return self.send("error", "InvalidSignal")
-        if self.proc is None: return None
+        proc:Popen|None = self.proc
+        if proc is None: return None
         log(f"sending signal {signal}", 1)
-        self.proc.send_signal(signal)
+        # Not `proc.send_signal` because it can reap the process (which
+        #   `_wait` needs to do to get its usage)
+        try:
+            os.kill(proc.pid, signal)
+        except ProcessLookupError:
+            pass
 
-    def cd(self, command:tuple[str]) -> None:
+    def cd(self, command:tuple[str]) -> int:
         assert command[0] == "cd", "InternalError"
         exit_code:int = 1
         if len(command) == 1:
@@ -158,9 +546,9 @@ class Slave:
                 print(error)
         else:
             print("slave: cd: too many arguments")
-        self.send("finished", data=exit_code)
+        return exit_code
 
-    def export(self, command:tuple[str]) -> None:
+    def export(self, command:tuple[str]) -> int:
         assert command[0] == "export", "InternalError"
         exit_code:int = 1
         if len(command) == 3:
@@ -169,7 +557,35 @@ class Slave:
             exit_code:int = 0
         else:
             print("slave: export: needs exactly 2 arguments")
-        self.send("finished", data=exit_code)
+        return exit_code
+
+
+def format_size(size:int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f}{unit}"
+
+def format_usage(name:str, exit_code:int, usage:dict[str:float]) -> str:
+    text:str = f"[{name} in {usage['wall']:.3f}s"
+    if "user" in usage:
+        text += f" | user {usage['user']:.3f}s | sys {usage['sys']:.3f}s"
+    if "maxrss" in usage:
+        text += f" | max RSS {format_size(usage['maxrss'])}"
+    return text + f" | exit code {exit_code}]"
+
+def format_repeats(name:str, exit_code:int, usages:list[dict]) -> str:
+    walls:list[float] = [usage["wall"] for usage in usages]
+    if not walls:
+        return f"[{name}: no runs | exit code {exit_code}]"
+    stdev:float = statistics.stdev(walls) if len(walls) > 1 else 0
+    text:str = f"[{name} {len(walls)} times: min {min(walls):.3f}s | " \
+               f"median {statistics.median(walls):.3f}s | stddev {stdev:.3f}s"
+    maxrss:list[int] = [usage["maxrss"] for usage in usages if "maxrss" in usage]
+    if maxrss:
+        text += f" | max RSS {format_size(max(maxrss))}"
+    return text + f" | exit code {exit_code}]"
 
 
 try:
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from concurrent.futures import Future
 from threading import Thread, Event as _Event
 from subprocess import Popen, PIPE, DEVNULL
 from time import sleep, perf_counter
@@ -131,6 +132,19 @@ class BaseTerminal:
         self.ipc.event_generate(event, where=self.slave_pid, data=data)
     send = send_event
 
+    def call(self, name:str, payload:object=None, *,
+             timeout:float|None=None) -> Future:
+        return self.ipc.call(int(self.slave_pid), name, payload,
+                             timeout=timeout)
+
+    def ping(self, timeout:float=1) -> float:
+        """
+        Returns the round-trip time (in seconds) of a call to the slave
+        """
+        start:float = perf_counter()
+        self.call("ping", timeout=timeout).result()
+        return perf_counter() - start
+
     def bind(self, event:str, handler:Callable[Event,None], **kwargs) -> None:
         # Call handler iff it's from the correct pid or event is ready
         def new_handler(event:Event) -> None:
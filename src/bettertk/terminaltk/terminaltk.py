@@ -1,5 +1,6 @@
 from __future__ import annotations
 from time import sleep, perf_counter
+from concurrent.futures import Future
 from threading import Thread, RLock
 from PIL import Image, ImageTk
 from typing import Callable
@@ -22,6 +23,11 @@ BKWARGS:dict = dict(activeforeground="white", activebackground="grey", bd=0,
                     highlightthickness=0)
 ICON:str = os.path.join(os.path.dirname(__file__), "sprites", "terminal.ico")
 if not os.path.exists(ICON): ICON:str = None
+OFFSCREEN:int = -10_000
+# How long to wait (in ms) after the pool is used before starting a new
+#   terminal. Also the max time (in seconds) to wait for a slave to reset
+POOL_REFILL_DELAY:int = 1000
+POOL_RESET_TIMEOUT:float = 1
 
 
 def tk_wait_for_map(widget:tk.Misc) -> None:
@@ -37,14 +43,52 @@ def tk_wait_for_map(widget:tk.Misc) -> None:
 Cmd:type = tuple[str]
 CmdPredicate:type = Callable[int,bool]
 METHODS_TO_COPY_TERMINAL:tuple[str] = "bind", "running", "clear", "ipc", \
-                                      "send_signal", "send_event", "sep_window"
+                                      "send_signal", "send_event", "sep_window", \
+                                      "call", "ping"
 METHODS_TO_COPY_TERMINAL_FRAME:tuple[str] = "queue", "queue_clear", "restart", \
                                             "_term_bind", "close"
 
 
+class Script:
+    """
+    A list of commands that the slave runs one after the other without
+    waiting for us in between. Queue it like any other command. When it's
+    done, `results` has a dict for each step with its "cmd", "exit_code"
+    (None if it was skipped), "time" (in seconds) and "usage". See slave.py
+    for the step options.
+    """
+    __slots__ = "steps", "results"
+
+    def __init__(self) -> Script:
+        self.results:list[dict]|None = None
+        self.steps:list[dict] = []
+
+    def add(self, cmd:Cmd, *, stop_on_failure:bool=True, report:str|None=None,
+            stdin:str|None=None, repeat:int=1, coalesce:bool=False,
+            child_usage:bool=False) -> None:
+        assert isinstance(cmd, tuple|list), "TypeError"
+        assert isinstance(repeat, int), "TypeError"
+        step:dict = {"cmd":list(cmd), "stop_on_failure":stop_on_failure}
+        if report is not None:
+            step["report"] = report
+        if stdin is not None:
+            step["stdin"] = stdin
+        if repeat != 1:
+            step["repeat"] = repeat
+        if coalesce:
+            step["coalesce"] = True
+        if child_usage:
+            step["child_usage"] = True
+        self.steps.append(step)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+
 class TerminalFrame(tk.Frame):
     def __init__(self, master:tk.Misc, **kwargs) -> TerminalFrame:
         self.curr_cmd = self._last_cmd = self.term = None
+        self._detach_ipc:Callable[[],None] = lambda: None
         self._to_call:list[Callable] = []
         self.started:bool = False
         self._ignore_exit_code:bool = False
@@ -64,18 +108,21 @@ class TerminalFrame(tk.Frame):
             setattr(self, attr_name, getattr(self.term, attr_name))
 
         self._term_bind("finished", self._queue, threaded=True)
+        self._term_bind("script-done", self._script_done, threaded=True)
         self._term_bind("error", self._raise_error, threaded=False)
         self.started:bool = True
-        self._handle_msg_loop()
+        self._detach_ipc = self.ipc.attach_tk(self, callback=self._handle_msgs)
 
-    def _handle_msg_loop(self) -> None:
-        self.ipc.call_queued_events()
+    def _handle_msgs(self) -> None:
+        # Called by the ipc (from tkinter's thread) after it handles the
+        #   queued events or whenever `self.ipc.wakeup()` is called
         while self._to_call:
             self._to_call.pop(0)()
-        if self.running():
-            super().after(100, self._handle_msg_loop)
+        if not self.running():
+            self._detach_ipc()
 
     def close(self) -> None:
+        self._detach_ipc()
         try:
             super().event_generate("<<Closing-Terminal>>")
         except tk.TclError:
@@ -93,7 +140,7 @@ class TerminalFrame(tk.Frame):
     def queue(self, cmd:Cmd, condition:CmdPredicate=lambda*x:1) -> None:
         if not self.started:
             raise RuntimeError("First call .start() after grid managering us")
-        assert callable(cmd) or isinstance(cmd, tuple|list), "TypeError"
+        assert callable(cmd) or isinstance(cmd, tuple|list|Script), "TypeError"
         assert callable(condition), "TypeError"
         with self._state_lock:
             self._cmd_queue.append((cmd, condition))
@@ -113,7 +160,11 @@ class TerminalFrame(tk.Frame):
             self.curr_cmd = self._last_cmd = cmd
             if callable(cmd):
                 self._to_call.append(cmd)
+                self.ipc.wakeup()
                 self.queue()
+            elif isinstance(cmd, Script):
+                cmd.results:list[dict]|None = None
+                self.send_event("script", data=cmd.steps)
             else:
                 if (cmd[0] == "print!") and (len(cmd) > 1):
                     self.send_event("print", data=" ".join(cmd[1:]))
@@ -128,6 +179,11 @@ class TerminalFrame(tk.Frame):
             self._cmd_queue.insert(0, (self._last_cmd, lambda*x:1))
             self._queue()
 
+    def _script_done(self, event:Event) -> None:
+        with self._state_lock:
+            if isinstance(self.curr_cmd, Script):
+                self.curr_cmd.results:list[dict] = event.data
+
     def _raise_error(self, event:Event) -> None:
         raise RuntimeError(f"Slave reported error: {event.data!r}")
 
@@ -136,11 +192,14 @@ class TerminalFrame(tk.Frame):
             self._cmd_queue.clear()
             if stop_cur_proc and (self.curr_cmd is not None):
                 self._ignore_exit_code:bool = True
+                if isinstance(self.curr_cmd, Script):
+                    self.send_event("abort")
                 kill_proc(self.send_signal, lambda: self.curr_cmd)
 
 
 class TerminalTk(BetterTk):
-    def __init__(self, master:tk.Misc=None, **kwargs) -> TerminalTk:
+    def __init__(self, master:tk.Misc=None, *, hidden:bool=False,
+                 **kwargs) -> TerminalTk:
         super().__init__(master, **kwargs)
         if ICON is not None:
             super().iconphoto(False, ICON)
@@ -148,7 +207,12 @@ class TerminalTk(BetterTk):
         self.setup_buttons()
         self.term:TerminalFrame = TerminalFrame(self, width=815, height=460)
         self.term.pack(side="bottom", fill="both", expand=True)
+        if hidden:
+            # The terminal must be mapped to start so start it off-screen
+            super().geometry(f"+{OFFSCREEN}+{OFFSCREEN}")
         self.term.start()
+        if hidden:
+            super().withdraw()
         if self.term.sep_window:
             self.term.config(width=1, height=1)
             self.sep.destroy()
@@ -166,7 +230,7 @@ class TerminalTk(BetterTk):
 
     def _die_with_slave(self) -> None:
         if self.running():
-            super().after(1, self.term._to_call.append, self._die_with_slave)
+            super().after(100, self._die_with_slave)
         else:
             self.destroy()
 
@@ -242,6 +306,104 @@ class TerminalTk(BetterTk):
         self.close_button.config(image=self.sprites["restart"], text="Restart")
 
 
+class TerminalPool:
+    """
+    Keeps up to `size` started (but withdrawn) `TerminalTk`s so that
+    `acquire` doesn't have to wait for the terminal and its slave to start.
+    New terminals are started from the Tk loop a bit after the pool is used
+    (or after the first `prewarm`). Terminals given back with `release` are
+    reset in the background and reused unless they are still busy, in which
+    case they are closed.
+    """
+    __slots__ = "size", "_idle", "_resetting", "_refill_scheduled", \
+                "_prewarmed"
+
+    def __init__(self, size:int=1) -> TerminalPool:
+        assert isinstance(size, int), "TypeError"
+        self._resetting:list[TerminalTk] = []
+        self._refill_scheduled:bool = False
+        self._idle:list[TerminalTk] = []
+        self._prewarmed:bool = False
+        self.size:int = size
+
+    def prewarm(self, master:tk.Misc) -> None:
+        if self._prewarmed:
+            return None
+        self._prewarmed:bool = True
+        self._schedule_refill(master.winfo_toplevel())
+
+    def acquire(self, master:tk.Misc) -> TerminalTk:
+        root:tk.Misc = master.winfo_toplevel()
+        term:TerminalTk|None = None
+        while self._idle:
+            term:TerminalTk = self._idle.pop(0)
+            if term.running(): break
+            term:TerminalTk|None = None
+        if term is None:
+            term:TerminalTk = TerminalTk(root)
+        else:
+            x:int = root.winfo_rootx() + 40
+            y:int = root.winfo_rooty() + 40
+            term.geometry(f"+{x}+{y}")
+            term.deiconify()
+        self._schedule_refill(root)
+        return term
+
+    def release(self, term:TerminalTk) -> None:
+        if len(self._idle)+len(self._resetting) >= self.size:
+            term.destroy()
+        elif not term.running():
+            term.destroy()
+        elif (term.term.curr_cmd is not None) or term.term._cmd_queue:
+            term.destroy() # The terminal is still busy
+        else:
+            term.withdraw()
+            self._resetting.append(term)
+            future:Future = term.call("reset", timeout=POOL_RESET_TIMEOUT)
+            future.add_done_callback(lambda f: self._reset_replied(term, f))
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().destroy()
+        while self._resetting:
+            self._resetting.pop().destroy()
+
+    def _reset_replied(self, term:TerminalTk, future:Future) -> None:
+        # Called from the ipc's threads so hand it over to tkinter's thread
+        term.term._to_call.append(lambda: self._reset_done(term, future))
+        term.ipc.wakeup()
+
+    def _reset_done(self, term:TerminalTk, future:Future) -> None:
+        if term not in self._resetting:
+            return None # The pool was closed
+        self._resetting.remove(term)
+        try:
+            reset:bool = (not future.cancelled()) and future.result()
+        except Exception:
+            reset:bool = False
+        if reset and term.running() and (len(self._idle) < self.size):
+            term.clear()
+            self._idle.append(term)
+        else:
+            term.destroy()
+
+    def _schedule_refill(self, root:tk.Misc) -> None:
+        if self._refill_scheduled or (len(self._idle) >= self.size):
+            return None
+        self._refill_scheduled:bool = True
+        root.after(POOL_REFILL_DELAY, self._refill, root)
+
+    def _refill(self, root:tk.Misc) -> None:
+        self._refill_scheduled:bool = False
+        self._idle:list[TerminalTk] = [t for t in self._idle if t.running()]
+        # A terminal whose slave died never gets its reset reply
+        self._resetting:list[TerminalTk] = [t for t in self._resetting
+                                            if t.running()]
+        if len(self._idle)+len(self._resetting) < self.size:
+            self._idle.append(TerminalTk(root, hidden=True))
+            self._schedule_refill(root)
+
+
 if __name__ == "__main__":
     term = TerminalTk()
     term.queue(("python3",))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from itertools import repeat, filterfalse
 from random import shuffle, seed, randint
+from bisect import bisect_left, bisect_right, insort
 import shutil
 import stat
 import os
@@ -8,8 +9,10 @@ seed(42)
 
 try:
     from .idxgiver import Idx, IdxGiver
+    from .dircache import dircache
 except ImportError:
     from idxgiver import Idx, IdxGiver
+    from dircache import dircache
 
 
 KNOWN_EXT:tuple[str] = ("cpp", "file", "py", "txt", "h", "c++", "java")
@@ -51,6 +54,9 @@ def isfile(item:Item) -> bool:
 def first(iterable:Iterable[T]) -> T:
     return next(iter(iterable))
 
+# (isfile, is placeholder, is MAX_ITEMS_ITENT, name)
+SortKey:type = tuple[bool,bool,bool,str]
+
 
 class Error:
     __slots__ = ("error",)
@@ -162,29 +168,27 @@ class FileSystem:
     def listdir(self, path:str) -> tuple[tuple[str,str], Error]:
         if self.is_untouchable(path):
             return (), Error("Path is untouchable")
+        # Like os.walk, folders that can't be listed are empty
         try:
-            islink = lambda x: os.path.islink(os.path.join(path, x))
-            try:
-                root, folders, files = next(os.walk(path))
-            except StopIteration:
-                root, folders, files = path, (), ()
-            # Bound the number of files/folders:
-            if len(files) > MAX_ITEMS_IN_DIR:
-                files:tuple[str] = self.bound_listdir(files)
-            if len(folders) > MAX_ITEMS_IN_DIR:
-                folders:tuple[str] = self.bound_listdir(folders)
-            # Skip links:
-            files:tuple[str] = filterfalse(islink, files)
-            folders:tuple[str] = filterfalse(islink, folders)
-            # Other filters:
-            for filterer in FILTER_FALSE_FILES:
-                files:tuple[str] = filterfalse(filterer, files)
-            for filterer in FILTER_FALSE_FOLDERS:
-                folders:tuple[str] = filterfalse(filterer, folders)
-            return tuple(zip(sorted(folders), repeat("folder"))) + \
-                   tuple(zip(sorted(files), repeat("file"))), Error()
-        except PermissionError:
-            return (), Error("PermissionError")
+            entries:tuple[tuple[str,str]] = dircache.listdir(path)
+        except OSError:
+            entries:tuple[tuple[str,str]] = ()
+        # Links are skipped
+        files:list[str] = [name for name, type in entries if type == "file"]
+        folders:list[str] = [name for name, type in entries
+                             if type == "folder"]
+        # Bound the number of files/folders:
+        if len(files) > MAX_ITEMS_IN_DIR:
+            files:tuple[str] = self.bound_listdir(files)
+        if len(folders) > MAX_ITEMS_IN_DIR:
+            folders:tuple[str] = self.bound_listdir(folders)
+        # Other filters:
+        for filterer in FILTER_FALSE_FILES:
+            files:tuple[str] = filterfalse(filterer, files)
+        for filterer in FILTER_FALSE_FOLDERS:
+            folders:tuple[str] = filterfalse(filterer, folders)
+        return tuple(zip(sorted(folders), repeat("folder"))) + \
+               tuple(zip(sorted(files), repeat("file"))), Error()
 
     @staticmethod
     def bound_listdir(data:tuple[str]) -> tuple[str]:
@@ -316,7 +320,7 @@ class Item:
             if only_shown and (not shown):
                 continue
             if isfolder(item, followsym=False):
-                stack.extend(zip(reversed(self.sorted(item.children)),
+                stack.extend(zip(reversed(item.ordered_children()),
                                  repeat(item.expanded & shown)))
             if (item is self) and (not withself):
                 continue
@@ -351,13 +355,14 @@ class Item:
                 if WARNINGS: print(f"[WARNING]: Handled error in move: {error}")
                 return error
 
-        assert self in self.master.children, "SanityCheck"
-        assert self not in target.children, "SanityCheck"
-        self.master.children.remove(self)
-        target.children.append(self)
+        assert self.master.names.get(self.name, None) is self, "SanityCheck"
+        assert self.name not in target.names, "SanityCheck"
+        self.master._unlink(self)
         self.master:Item = target
+        target._link(self)
         self.fix_indentation() # Fix indentation
         self.correct_idx() # Fix idxs
+        self.correct_hidden() # The new master might be collapsed
         assert self.fullpath == newpath, "SanityCheck" # fullpath is correct
         if DEBUG: print(f"[DEBUG]: Moved {self} => {target}")
         return Error()
@@ -378,7 +383,7 @@ class Item:
             new_name:str = self.root.filesystem.join(parent_name, newname)
         # Now new_name is just a name with no "/"s
         is_new:bool = (self.name == NEW_ITEM_NAME)
-        if newname in tuple(item.name for item in self.master.children):
+        if newname in self.master.names:
             return Error("Name already exists")
         if is_new:
             if DEBUG: print(f"[DEBUG]: Touching {self}")
@@ -392,7 +397,7 @@ class Item:
                 if WARNINGS: print(f"[WARNING]: Handled error in rename: {error}")
                 return error
             if DEBUG: print(f'[DEBUG]: Renamed "{self.name}" => "{newname}"')
-            self.name:str = newname
+            self._set_name(newname)
         self.correct_idx() # Fix idxs
         return Error()
 
@@ -410,7 +415,7 @@ class Item:
             if error:
                 if WARNINGS: print(f"[WARNING]: Handled error in delete: {error}")
                 return error
-        self.master.children.remove(self)
+        self.master._unlink(self)
         for item, shown in self.recurse_children(withself=True):
             self.root.igiver.remove_item(item)
             if DEBUG: print(f"[DEBUG]: Mark deleted {item}")
@@ -418,7 +423,7 @@ class Item:
 
     def touch(self, name:str) -> Error:
         assert self.name == NEW_ITEM_NAME, "Please don't rename me first."
-        self.name:str = name
+        self._set_name(name)
         if isfile(self):
             error:Error = self.root.filesystem.newfile(self.fullpath)
         elif isfolder(self):
@@ -426,13 +431,19 @@ class Item:
         else:
             raise NotImplementedError("self not file nor folder.")
         if error:
-            # Undo the `self.name:str = name`
-            self.name:str = NEW_ITEM_NAME
+            # Undo the `self._set_name(name)`
+            self._set_name(NEW_ITEM_NAME)
             return error
         self.update_perms()
         self.correct_idx() # Fix idxs
         return Error()
 
+    def _set_name(self, name:str) -> None:
+        # The master's name index must be updated as well
+        self.master._unlink(self)
+        self.name:str = name
+        self.master._link(self)
+
     def correct_idx(self) -> None:
         assert self.master is not None, "Root(None) has no idx"
         # Even if self.idx hasn't changed, indentation might have changed
@@ -441,25 +452,44 @@ class Item:
         if self.master.master is None:
             return None
         _newidx:int = self.master.get_idx_insert(self)
-        if self.idx.value == _newidx:
+        _idx:int = self.idx.value
+        if _idx == _newidx:
             return None
-        if self.idx.value < _newidx:
-            correction:int = self.get_idx_size()
-            _newidx -= correction
-            if DEBUG: print(f"[DEBUG]: {self.idx}-[{correction=}]")
+        size:int = self.get_idx_size()
+        if _idx < _newidx:
+            _newidx -= size
+            if DEBUG: print(f"[DEBUG]: {self.idx}-[correction={size}]")
         # Calculate delta
-        delta:int = self.idx.value - _newidx
+        delta:int = _idx - _newidx
         if delta == 0:
             return
-        # Apply delta to all objects
-        children = list(self.recurse_children(withself=True))
-        if delta < 0:
-            children:list[tuple[Item,bool]] = reversed(children)
-        for subitem, shown in children:
-            self.root.igiver.moveup(subitem, delta)
-            if DEBUG: print(f"[DEBUG]: Moving {subitem} {delta=}")
+        # Self and all of its children are next to each other so move them
+        #   all at once
+        self.root.igiver.moveup_block(self, size, delta)
+        if DEBUG: print(f"[DEBUG]: Moving {self} ({size=}) {delta=}")
         assert self.idx.value == _newidx, "SanityCheck"
 
+    def get_hidden(self) -> int:
+        """
+        Returns the number of collapsed folders above self
+        """
+        hidden:int = 0
+        master:Item|None = self.master
+        while master is not None:
+            hidden += not master.expanded
+            master:Item|None = master.master
+        return hidden
+
+    def correct_hidden(self) -> None:
+        """
+        Set the `hidden` count of self (and its children) in `igiver` to
+          the number of collapsed folders above self
+        """
+        delta:int = self.get_hidden() - self.root.igiver.get_hidden(self)
+        if delta != 0:
+            self.root.igiver.add_hidden(self.idx.value, self.get_idx_size(),
+                                        delta)
+
     def get_idx_size(self) -> int:
         """
         Returns the size of self. Must be 1 if isfile. Must be >=1 if isfolder.
@@ -474,18 +504,22 @@ class Item:
 
 
 class Folder(Item):
-    __slots__ = "_expanded", "children"
+    __slots__ = "_expanded", "names", "keys"
 
     def __init__(self, name, root:Root, master:Item):
         super().__init__(name, root=root, master=master)
         self._expanded:bool = root.autoexpand
-        self.children:list[Item] = []
+        # The children by name and their (sorted) `sort_key`s
+        self.names:dict[str:Item] = dict()
+        self.keys:list[SortKey] = []
         if self.master is None:
             self.fix_indentation()
 
-    def update(self, fullsync:bool=False) -> None:
+    def update(self, fullsync:bool=False, *, recursive:bool=True) -> None:
         """
         Updates `self.children` with a new list with the new files/folders.
+        If `recursive` is false, the children that were already there
+          aren't updated.
         """
         assert not fullsync, "Don't use this"
         # If we don't have the perms:
@@ -494,35 +528,37 @@ class Folder(Item):
         # If we haven't expanded, don't update
         if not self.expanded:
             return None
-        current_children = tuple(self.children)
         files_folders, error = self.root.filesystem.listdir(self.fullpath)
         assert not error, "InternalError" # "Perms changed for some reason"
-        for itemname, type in files_folders:
-            assert itemname != NEW_ITEM_NAME, "An item is using a reserved name"
-            item:Item|None = self.get_item_from_name(itemname)
-            if item is not None:
-                not_unchanged:bool = (isfile(item)   and (type == "file")) or \
-                                     (isfolder(item) and (type == "folder"))
-                if not_unchanged:
+        listed:dict[str:str] = dict(files_folders)
+        assert NEW_ITEM_NAME not in listed, "An item is using a reserved name"
+        # Removed
+        for name in self.names.keys() - listed.keys():
+            if (name == NEW_ITEM_NAME) and (not fullsync):
+                continue
+            self.names[name].delete(apply_filesystem=False)
+        # Still there (but maybe a file became a folder or vice versa)
+        for name in self.names.keys() & listed.keys():
+            item:Item = self.names[name]
+            if listed[name] == ("folder" if isfolder(item) else "file"):
+                if recursive:
                     item.update(fullsync)
-                    continue
+            else:
                 item.delete(apply_filesystem=False)
-            if type == "file":
-                item:File = File(itemname, master=self, root=self.root)
-            elif type == "folder":
-                item:Folder = Folder(itemname, master=self, root=self.root)
+        # Added (in order so that they are appended to the end)
+        added:list[Item] = []
+        for name in listed.keys() - self.names.keys():
+            if listed[name] == "file":
+                added.append(File(name, master=self, root=self.root))
+            elif listed[name] == "folder":
+                added.append(Folder(name, master=self, root=self.root))
             else:
                 raise NotImplementedError("Invalid filesystem object type")
+        for item in sorted(added, key=self.sort_key):
             self.add_item(item)
             if isfolder(item):
                 item.update(fullsync)
 
-        for child in self.children.copy():
-            if child.name not in map(first, files_folders):
-                if (child.name == NEW_ITEM_NAME) and (not fullsync):
-                    continue
-                child.delete(apply_filesystem=False)
-
     @property
     def expanded(self) -> bool:
         return self._expanded
@@ -531,6 +567,10 @@ class Folder(Item):
     def expanded(self, value:bool) -> None:
         assert isinstance(value, bool), "TypeError"
         self._expanded, old_expanded = value, self._expanded
+        if (old_expanded != value) and (self.idx is not None):
+            # Show/hide the children that we already have
+            self.root.igiver.add_hidden(self.idx.value+1, self.get_idx_size()-1,
+                                        old_expanded-value)
         if (not old_expanded) and self._expanded:
             self.update()
 
@@ -538,10 +578,31 @@ class Folder(Item):
         """
         Gets the item from self.children given a name.
         """
-        for item in self.children:
-            if item.name == name:
-                return item
-        return None
+        return self.names.get(name, None)
+
+    @property
+    def children(self) -> Iterable[Item]:
+        return self.names.values()
+
+    def ordered_children(self) -> list[Item]:
+        """
+        Same as `self.sorted(self.children)` but without looking at the idxs
+        """
+        # Root's children are never reordered
+        if self.master is None:
+            return list(self.names.values())
+        return [self.names[key[-1]] for key in self.keys]
+
+    def _link(self, item:Item) -> None:
+        assert item.name not in self.names, "Name already taken"
+        self.names[item.name] = item
+        insort(self.keys, self.sort_key(item))
+
+    def _unlink(self, item:Item) -> None:
+        assert self.names.get(item.name, None) is item, "Item not in self"
+        del self.names[item.name]
+        key:SortKey = self.sort_key(item)
+        self.keys.pop(bisect_left(self.keys, key))
 
     def to_string(self) -> str:
         assert TEST, "This can only be used in TEST mode."
@@ -578,62 +639,48 @@ class Folder(Item):
                 print(m.to_string() + "\n" + "="*80)
             print(f"[DEBUG]: Trying to add {item} to {self}")
         assert isinstance(item, Item), "TypeError"
-        item.idx:Idx = self.root.igiver.push_item(item)
+        hidden:int = self.get_hidden() + (not self.expanded)
+        item.idx:Idx = self.root.igiver.push_item(item, hidden)
         if DEBUG: print(f"[DEBUG]: Current idx for {item} is {item.idx}")
         # item.idx:Idx = self.root.igiver[item]
-        self.children.append(item)
         item.master:Item = self
+        self._link(item)
         item.fix_indentation()
         item.correct_idx() # Fix idxs
         if DEBUG: print(f"[DEBUG]: Added {item} to {self} at {item.idx}")
         return item
 
-    def get_idx_insert(self, item:Item, ignore_item:bool=False) -> int:
-        children:list[Item] = self.sorted(self.children.copy())
-        if item in children:
-        #if ignore_item:
-        #    assert item in children, "ignore_item=True when item isn't in self"
-            children.remove(item)
-        assert item not in children, "InternalError"
-        for loc, child in enumerate(children):
-            if self._get_idx_insert_compare(child, item): # child > item
-                return child.idx.value
+    def get_idx_insert(self, item:Item) -> int:
+        """
+        Returns the idx that `item` should have as a child of self (it
+          doesn't matter if `item` is already a child).
+        """
+        key:SortKey = self.sort_key(item)
+        # The first child after item
+        loc:int = bisect_right(self.keys, key)
+        if loc < len(self.keys):
+            return self.names[self.keys[loc][-1]].idx.value
+        # If item should be at the end:
+        loc:int = len(self.keys) - 1
+        if (loc >= 0) and (self.keys[loc] == key):
+            loc -= 1 # Skip item
         # Base base, empty folder
-        if len(children) == 0:
+        if loc < 0:
             if DEBUG: print(self, self.idx)
             return self.idx.value+1
-        # If item should be at the end:
-        child:Item = children[-1]
-        while isfolder(child):
-            if len(child.children) == 0:
-                break
-            child:Item = self.sorted(child.children)[-1]
+        child:Item = self.names[self.keys[loc][-1]]
+        while isfolder(child) and (len(child.keys) > 0):
+            child:Item = child.names[child.keys[-1][-1]]
         return child.idx.value+1
 
     @staticmethod
-    def _get_idx_insert_compare(itema:Item, itemb:Item) -> bool:
-        if DEBUG: print(f"[DEBUG]: Compare {itema}>?{itemb}", end="")
-        # returns True iff itema > itemb
-        if isfile(itema) and isfolder(itemb):
-            if DEBUG: print(" => True")
-            return True
-        if isfolder(itema) and isfile(itemb):
-            if DEBUG: print(" => False")
-            return False
-        if itemb.name == NEW_ITEM_NAME:
-            if DEBUG: print(" => False")
-            return False
-        if itema.name == NEW_ITEM_NAME:
-            if DEBUG: print(" => True")
-            return True
-        if itemb.name == MAX_ITEMS_ITENT:
-            if DEBUG: print(" => False")
-            return False
-        if itema.name == MAX_ITEMS_ITENT:
-            if DEBUG: print(" => True")
-            return True
-        if DEBUG: print(f" => t{itema.name > itemb.name}")
-        return itema.name >= itemb.name
+    def sort_key(item:Item) -> SortKey:
+        """
+        Folders then files sorted by name but placeholders (new items) and
+          MAX_ITEMS_ITENT are last.
+        """
+        return (isfile(item), item.name == NEW_ITEM_NAME,
+                item.name == MAX_ITEMS_ITENT, item.name)
 
     @staticmethod
     def sorted(children:list[Item]) -> list[Item]:
@@ -641,16 +688,14 @@ class Folder(Item):
 
     def newfolder(self, name:str=NEW_ITEM_NAME) -> Folder:
         assert self.master is not None, "Master can't be None"
-        names:Iterator[str] = map(lambda i: i.name, self.children)
-        assert NEW_ITEM_NAME not in tuple(names), "Name already taken"
+        assert NEW_ITEM_NAME not in self.names, "Name already taken"
         folder:Folder = Folder(name=NEW_ITEM_NAME, master=self, root=self.root)
         self.add_item(folder)
         return folder
 
     def newfile(self) -> File:
         assert self.master is not None, "Master can't be None"
-        names:Iterator[str] = map(lambda i: i.name, self.children)
-        assert NEW_ITEM_NAME not in tuple(names), "Name already taken"
+        assert NEW_ITEM_NAME not in self.names, "Name already taken"
         file:File = File(name=NEW_ITEM_NAME, master=self, root=self.root)
         self.add_item(file)
         return file
@@ -687,7 +732,7 @@ class Root(Folder):
         self.igiver:IdxGiver = IdxGiver(Item)
         self.filesystem:FileSystem = filesystem
         super().__init__(name=None, root=self, master=None)
-        self.idx:Idx = self.igiver.push_item(self)
+        self.idx:Idx = self.igiver.push_item(self, hidden=1) # Never shown
         self._expanded:bool = True
 
     @property
@@ -704,6 +749,8 @@ class Root(Folder):
             return None
         if not os.path.isdir(fullpath):
             return None
+        if fullpath in self.names:
+            return self.names[fullpath]
         folder:Folder = Folder(fullpath, root=self.root, master=self)
         super().add_item(folder)
         folder.update()
@@ -715,14 +762,13 @@ class Root(Folder):
         Raises `ValueError`, if the folder isn't in `self.children`
         """
         if isinstance(item_or_path, Item):
-            assert item_or_path in self.children, "Item not in Root"
+            assert item_or_path.master is self, "Item not in Root"
             item_or_path.delete(apply_filesystem=False)
         else:
             fullpath:str = self.filesystem.abspath(item_or_path)
-            for child in self.children:
-                if child.name == fullpath:
-                    child.delete(apply_filesystem=False)
-                    return None
+            if fullpath in self.names:
+                self.names[fullpath].delete(apply_filesystem=False)
+                return None
             raise ValueError("Can't remove that folder because it " \
                              "wasn't added.")
 
@@ -750,9 +796,7 @@ class Root(Folder):
         return child
 
     def idx_to_item(self, idx:Idx|int) -> Item:
-        if isinstance(idx, int):
-            idx:Idx = Idx(idx)
-        assert isinstance(idx, Idx), "TypeError"
+        assert isinstance(idx, Idx|int), "TypeError"
         return self.igiver[idx]
 
 
@@ -0,0 +1,101 @@
+"""
+A benchmark for the explorer's tree that doesn't need Tk. It uses a
+`ProvidedFileSystem` with one folder that has N entries (2% of them
+folders, which aren't expanded) and measures:
+    * build:    the first `Folder.update` (every entry is new)
+    * refresh:  an update when nothing changed
+    * churn:    an update after 1% of the entries were removed and 1% added
+                (with names that sort everywhere in the folder)
+    * expand:   expanding a folder at the top of the tree that has N/10
+                entries (everything below it has to be renumbered)
+The results (in seconds, best of --repeat) are printed as JSON so that
+runs can be compared.
+
+Usage:
+    python3 benchmark.py [--sizes 1000 10000 50000] [--repeat 3] [--out file]
+"""
+from __future__ import annotations
+from time import perf_counter
+from random import Random
+import argparse
+import json
+import sys
+
+from base_explorer import Root, Folder, ProvidedFileSystem
+
+
+FOLDER:str = "/bench"
+FOLDERS_EVERY:int = 50 # 1 in every this many entries is a folder
+CHURN:float = 0.01
+
+
+def entries(n:int, prefix:str, rng:Random) -> list[tuple[str,str]]:
+    output:list[tuple[str,str]] = []
+    for i in range(n):
+        name:str = f"{prefix}/{rng.getrandbits(32):08x}-{i}"
+        output.append((name, "folder" if i%FOLDERS_EVERY == 0 else "file"))
+    return output
+
+def timed(function:Callable[[],None]) -> float:
+    start:float = perf_counter()
+    function()
+    return perf_counter() - start
+
+def run_once(n:int) -> dict[str:float]:
+    rng:Random = Random(n)
+    files_folders:list[tuple[str,str]] = [(FOLDER, "folder")]
+    # The first folder (so it's at the top of the tree)
+    big:str = f"{FOLDER}/0"
+    files_folders.append((big, "folder"))
+    files_folders.extend(entries(n//10, big, rng))
+    files_folders.extend(entries(n, FOLDER, rng))
+    filesystem:ProvidedFileSystem = ProvidedFileSystem(files_folders)
+    root:Root = Root(filesystem, autoexpand=False)
+    folder:Folder = Folder(FOLDER, root=root, master=root)
+    root.add_item(folder)
+    results:dict[str:float] = {}
+    results["build"] = timed(lambda: setattr(folder, "expanded", True))
+    results["refresh"] = timed(folder.update)
+    # Churn
+    listed:list[tuple[str,str]] = sorted(filesystem.files_folders)
+    removed:set[str] = {name for name, _ in
+                        rng.sample(listed[2+n//10:], int(n*CHURN))}
+    filesystem.files_folders = [(name, type) for name, type in listed
+                                if name not in removed]
+    filesystem.files_folders.extend(entries(int(n*CHURN), FOLDER, rng))
+    results["churn"] = timed(folder.update)
+    # Expand the top folder
+    top:Folder = folder.get_item_from_name("0")
+    results["expand"] = timed(lambda: setattr(top, "expanded", True))
+    results["rows"] = len(root.igiver)
+    return results
+
+def run(args:argparse.Namespace) -> dict:
+    results:dict = {"repeat":args.repeat, "python":sys.version.split()[0],
+                    "sizes":{}}
+    for n in args.sizes:
+        print(f"[BENCH]: {n}", file=sys.stderr)
+        runs:list[dict[str:float]] = [run_once(n) for _ in range(args.repeat)]
+        best:dict[str:float] = {}
+        for key in runs[0]:
+            best[key] = min(run[key] for run in runs)
+        results["sizes"][n] = best
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="explorer tree benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 50000],
+                        help="number of entries in the folder")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="run every size this many times (best wins)")
+    parser.add_argument("--out", default=None, help="write the JSON here")
+    args:argparse.Namespace = parser.parse_args()
+
+    output:str = json.dumps(run(args), indent=2)
+    if args.out is None:
+        print(output)
+    else:
+        with open(args.out, "w") as file:
+            file.write(output)
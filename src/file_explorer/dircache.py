@@ -0,0 +1,98 @@
+"""
+A cache of folder listings that is shared by everything that lists
+folders (the explorer, the icon resolver, ...). A listing is a single
+`os.scandir` pass that uses the `DirEntry`'s type (which doesn't need a
+`stat` on most filesystems). It's kept until the folder's mtime (or inode)
+changes so listing an unchanged folder only costs 1 `stat`.
+
+Listings whose folder was modified less than RACY_NS ago aren't cached
+because filesystems with coarse mtimes could change the folder again
+without changing its mtime.
+"""
+from __future__ import annotations
+from threading import Lock
+from time import time_ns
+import os
+
+
+MAX_CACHED:int = 4096 # Max number of listings to keep
+RACY_NS:int = 2_000_000_000
+# (name, type) where type is "folder", "file" or "link"
+Entry:type = tuple[str,str]
+
+
+class _Listing:
+    __slots__ = "key", "entries", "names"
+
+    def __init__(self, key:tuple[int,int], entries:tuple[Entry]) -> _Listing:
+        self.entries:tuple[Entry] = entries
+        self.key:tuple[int,int] = key
+        self.names:frozenset[str]|None = None
+
+
+class DirCache:
+    __slots__ = "listings", "lock", "hits", "misses"
+
+    def __init__(self) -> DirCache:
+        self.listings:dict[str:_Listing] = {}
+        self.lock:Lock = Lock()
+        self.misses:int = 0
+        self.hits:int = 0
+
+    def _get(self, path:str) -> _Listing:
+        st:os.stat_result = os.stat(path)
+        key:tuple[int,int] = (st.st_ino, st.st_mtime_ns)
+        with self.lock:
+            listing:_Listing|None = self.listings.get(path, None)
+            if (listing is not None) and (listing.key == key):
+                self.hits += 1
+                return listing
+            self.misses += 1
+        entries:list[Entry] = []
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.is_symlink():
+                    entries.append((entry.name, "link"))
+                elif entry.is_dir(follow_symlinks=False):
+                    entries.append((entry.name, "folder"))
+                else:
+                    entries.append((entry.name, "file"))
+        listing:_Listing = _Listing(key, tuple(entries))
+        if time_ns()-st.st_mtime_ns > RACY_NS:
+            with self.lock:
+                self.listings.pop(path, None) # Move it to the end
+                self.listings[path] = listing
+                if len(self.listings) > MAX_CACHED:
+                    self.listings.pop(next(iter(self.listings)))
+        return listing
+
+    def listdir(self, path:str) -> tuple[Entry]:
+        """
+        Returns the (name, type) of everything in the folder (unsorted).
+        Raises OSError if the folder can't be listed.
+        """
+        return self._get(path).entries
+
+    def contains(self, path:str, name:str) -> bool:
+        """
+        Like `os.path.exists(os.path.join(path, name))` but uses the cached
+        listing of `path`. Returns false if `path` can't be listed.
+        """
+        try:
+            listing:_Listing = self._get(path)
+        except OSError:
+            return False
+        if listing.names is None:
+            listing.names:frozenset[str] = frozenset(map(lambda e: e[0],
+                                                         listing.entries))
+        return name in listing.names
+
+    def invalidate(self, path:str|None=None) -> None:
+        with self.lock:
+            if path is None:
+                self.listings.clear()
+            else:
+                self.listings.pop(path, None)
+
+
+dircache:DirCache = DirCache()
@@ -6,10 +6,10 @@ import tkinter as tk
 import os
 
 try:
-    from .explorer import Explorer, isfile, isfolder, SELECTED_COLOUR
+    from .explorer import Explorer, isfile, isfolder, ICON_PADX
     from .base_explorer import NEW_ITEM_NAME, MAX_ITEMS_ITENT, Item
 except ImportError:
-    from explorer import Explorer, isfile, isfolder, SELECTED_COLOUR
+    from explorer import Explorer, isfile, isfolder, ICON_PADX
     from base_explorer import NEW_ITEM_NAME, MAX_ITEMS_ITENT, Item
 from bettertk import BetterTk, IS_UNIX, IS_WINDOWS
 from bettertk.messagebox import askyesno, tell
@@ -200,20 +200,21 @@ class Menu:
 
 class ExpandedExplorer(Explorer):
     __slots__ = "cwd", "menu", "set_cwd_id", "bin_folder", "renaming", \
-                "creating", "font", "git_in_menu", \
-                "set_cwd_id", "open_term_id"
+                "creating", "font", "git_in_menu", "open_term_id", \
+                "focused_widget", "entry", "cwd_dot"
 
     def __init__(self, master:tk.Misc, font:str="TkDefaultFont",
                  monofont:str="TkFixedFont") -> None:
-        self.cwd:tk.Frame = None
+        self.cwd:Folder|None = None
+        self.cwd_dot:int|None = None
         self.font:str = font
         super().__init__(master, font=font, monofont=monofont)
-        self.ggiver.right_click:Function[tk.Frame,str] = self.right_click
         self.bin_folder:str|None = self._find_empty_bin()
         self._create_menu(font=font)
         self.renaming:bool = False
         self.creating:bool = False
-        self.cwd:tk.Frame = None
+        self.entry:tk.Entry|None = None
+        self.focused_widget:tk.Misc|None = None
         self.master.bind_all("<Escape>", self.finish_rename, add=True)
         self.master.bind_all("<Button-1>", self.maybe_cancel_rename, add=True)
         self.master.bind_all("<<CancelAll>>", self.maybe_cancel_rename, add=1)
@@ -255,33 +256,33 @@ class ExpandedExplorer(Explorer):
         self.menu.on_cancel:Function[None] = self.menu_cancel
         self.git_in_menu:bool = False
 
-    def right_click(self, frame:tk.Frame) -> str:
+    def right_click(self, item:Item|None) -> str:
         if self.changing and (not self.menu.shown):
             return None
-        if frame is None:
+        if item is None:
             return None
-        if frame.item.name == MAX_ITEMS_ITENT:
+        if item.name == MAX_ITEMS_ITENT:
             self.changing = self.selected = None
             return None
-        self.changing = self.selected = frame
-        self.changing.focused_widget:tk.Misc = self.changing.focus_get()
+        self.changing = self.selected = item
+        self.focused_widget:tk.Misc = self.canvas.focus_get()
         # Set up exec path
-        if super()._get_closest_folder(frame) == self.cwd:
+        if super()._get_closest_folder(item) == self.cwd:
             self.menu.config(self.set_cwd_id, text="Remove exec path (cwd)",
                              command=self.remove_cwd)
         else:
             self.menu.config(self.set_cwd_id, text="Set exec path (cwd)",
                              command=self.set_cwd)
         # Open in terminal/open in in explorer
-        if isfolder(self.changing.item):
+        if isfolder(item):
             self.menu.config(self.open_term_id, text="Open in terminal",
                              command=self.open_in_terminal)
         else:
             self.menu.config(self.open_term_id, text="Open externally",
                              command=self.open_item)
         # Set up git
-        fs:FileSystem = frame.item.root.filesystem
-        git_path:str = fs.join(frame.item.fullpath, ".git")
+        fs:FileSystem = item.root.filesystem
+        git_path:str = fs.join(item.fullpath, ".git")
         if fs.exists(git_path) and fs.isfolder(git_path):
             if not self.git_in_menu:
                 self.menu.add_separator()
@@ -296,106 +297,124 @@ class ExpandedExplorer(Explorer):
         self.menu.popup(self.master)
 
     def menu_cancel(self) -> None:
-        self.changing:tk.Frame = None
+        self.changing:Item|None = None
 
     # Cwd stuff
     def set_cwd(self) -> None:
-        self.master.update_idletasks()
         if self.cwd:
             self.remove_cwd()
-        self.cwd:tk.Frame = super()._get_closest_folder(super().get_selected())
-        data:tuple[str] = (self.cwd.item.fullpath,)
+        self.cwd:Folder = super()._get_closest_folder(super().get_selected())
+        data:tuple[str] = (self.cwd.fullpath,)
         self.master.event_generate("<<Explorer-Set-CWD>>", data=data)
-        height:int = self.cwd.winfo_height()
-        self.cwd.cwd_dot = tk.Canvas(self.cwd, bd=0, bg="black",
-                                     highlightthickness=0,
-                                     width=CIRCLE_RADIUS*2+CIRCLE_PADX,
-                                     height=height)
-        self.cwd.cwd_dot.grid(row=1, column=5-2*CIRCLE_PRE_NAME)
-        centrex = CIRCLE_RADIUS/2+CIRCLE_PADX
-        self.cwd.cwd_dot.create_circle(centrex, int(height/2), CIRCLE_RADIUS,
-                                       fill=CIRCLE_FILL, outline=CIRCLE_FILL,
-                                       width=0)
-        if super().get_selected() == self.cwd:
-            self.cwd.cwd_dot.config(bg=SELECTED_COLOUR)
-        self.changing:tk.Frame = None
-
-    def recolour_frame(self, frame:tk.Frame, bg:str) -> None:
-        super().recolour_frame(frame, bg)
-        if (frame == self.cwd) and frame:
-            frame.cwd_dot.config(bg=bg)
+        self.cwd_dot:int = self.canvas.create_circle(0, 0, CIRCLE_RADIUS,
+                                                     fill=CIRCLE_FILL,
+                                                     outline=CIRCLE_FILL,
+                                                     width=0, state="hidden")
+        self.changing:Item|None = None
+        self._redraw()
+
+    def _redraw(self, event:tk.Event=None) -> None:
+        super()._redraw(event)
+        if self.cwd_dot is None:
+            return None
+        for row in self.rows:
+            if row.item is self.cwd:
+                break
+        else:
+            self.canvas.itemconfig(self.cwd_dot, state="hidden")
+            return None
+        if CIRCLE_PRE_NAME:
+            x:int = self._name_x(self.cwd) - ICON_PADX
+            x -= CIRCLE_PADX + CIRCLE_RADIUS
+            self.canvas.move(row.name, CIRCLE_PADX+2*CIRCLE_RADIUS, 0)
+        else:
+            x:int = self.canvas.bbox(row.name)[2] + CIRCLE_PADX + CIRCLE_RADIUS
+        y:int = self.canvas.coords(row.name)[1]
+        self.canvas.coords(self.cwd_dot, x-CIRCLE_RADIUS, y-CIRCLE_RADIUS,
+                           x+CIRCLE_RADIUS, y+CIRCLE_RADIUS)
+        self.canvas.itemconfig(self.cwd_dot, state="normal")
+        self.canvas.tag_raise(self.cwd_dot)
 
     def remove_cwd(self) -> None:
         self.master.event_generate("<<Explorer-Unset-CWD>>")
-        self.cwd.cwd_dot.destroy()
-        self.cwd:tk.Frame = None
-        self.changing:tk.Frame = None
+        self.canvas.delete(self.cwd_dot)
+        self.cwd_dot:int|None = None
+        self.cwd:Folder|None = None
+        self.changing:Item|None = None
 
     def report_cwd(self, event:tk.Event=None) -> str:
         if self.cwd is None:
             self.master.event_generate("<<Explorer-Unset-CWD>>")
         else:
             self.master.event_generate("<<Explorer-Set-CWD>>",
-                                       data=(self.cwd.item.fullpath,))
+                                       data=(self.cwd.fullpath,))
         return "break"
 
     # Rename
     def rename(self) -> None:
         self.renaming:bool = True
-        self.changing.entry = tk.Entry(self.changing, bg="black", fg="white",
-                                       insertbackground="white", font=self.font)
-        self.changing.entry.grid(row=1, column=4, sticky="news")
-        self.changing.entry.bind("<Return>", self._rename)
-        self.changing.entry.bind("<KP_Enter>", self._rename)
-        self.changing.entry.insert(0, self.changing.item.purename)
-        self.changing.entry.select_range(0, "end")
-        self.changing.entry.icursor("end")
-        self.changing.entry.focus_force()
+        self.see(self.changing)
+        self.entry:tk.Entry = tk.Entry(self.canvas, bg="black", fg="white",
+                                       insertbackground="white", font=self.font,
+                                       bd=0, highlightthickness=0)
+        row:int = self._row_of(self.changing)
+        x:int = self._name_x(self.changing)
+        width:int = max(self.width, self.canvas.winfo_width()) - x
+        self.canvas.create_window(x, row*self.row_height, anchor="nw",
+                                  window=self.entry, tags="entry",
+                                  height=self.row_height, width=width)
+        self.entry.bind("<Return>", self._rename)
+        self.entry.bind("<KP_Enter>", self._rename)
+        self.entry.insert(0, self.changing.purename)
+        self.entry.select_range(0, "end")
+        self.entry.icursor("end")
+        self.entry.focus_force()
 
     def maybe_cancel_rename(self, event:tk.Event) -> None:
         if not self.renaming:
             return None
-        if event.widget != self.changing.entry:
+        if event.widget != self.entry:
             self.finish_rename()
 
     def _rename(self, _:tk.Event=None) -> None:
         assert self.renaming, "InternalError"
-        new_name:str = self.changing.entry.get()
-        if self.changing.item.rename(new_name):
+        new_name:str = self.entry.get()
+        if self.changing.rename(new_name):
             if self.creating:
                 action:tuple[str,str] = ("create", "creation")
             else:
                 action:tuple[str,str] = ("rename", "rename")
-            type:str = "file" if isfile(self.changing.item) else "folder"
+            type:str = "file" if isfile(self.changing) else "folder"
             msg:str = f"Couldn't {action[0]} {type}."
             title:str = f"{type.title()} {action[1]} failure"
-            tell(self.changing, title=title, message=msg, icon="info",
+            tell(self.canvas, title=title, message=msg, icon="info",
                  center=True)
-        else:
-            self.changing.name.config(text=new_name)
-            if isfile(self.changing.item):
-                super().fix_icon(self.changing)
+        elif isfile(self.changing):
+            super().fix_icon(self.changing)
         self.finish_rename()
 
     def finish_rename(self, _:tk.Event=None) -> None:
         if not self.renaming:
             return None
-        if self.changing.item.name == NEW_ITEM_NAME:
-            super().delete_item(self.changing.item, apply_filesystem=False)
-        self.changing.entry.destroy()
-        self.changing.focused_widget.focus_set()
-        self.changing:tk.Frame = None
+        if self.changing.name == NEW_ITEM_NAME:
+            super().delete_item(self.changing, apply_filesystem=False)
+        self.canvas.delete("entry")
+        self.entry.destroy()
+        self.entry:tk.Entry|None = None
+        if self.focused_widget is not None:
+            self.focused_widget.focus_set()
+        self.changing:Item|None = None
         self.renaming:bool = False
         self.creating:bool = False
         super().update(soft=True)
 
     # Delete
     def delete(self) -> None:
-        item:Item = self.changing.item
+        item:Item = self.changing
         msg:str = f'Are you sure you want to delete "{item.purename}"?'
-        result:bool = askyesno(self.changing, title="Delete file?", message=msg,
+        result:bool = askyesno(self.canvas, title="Delete file?", message=msg,
                                icon="warning", center=True)
-        self.changing:tk.Frame = None
+        self.changing:Item|None = None
         if result and (self.bin_folder is not None):
             # Move item to bin
             target:str = self.root.filesystem.join(self.bin_folder,
@@ -407,21 +426,17 @@ class ExpandedExplorer(Explorer):
 
     # New file/folder
     def newfile(self) -> None:
-        parent:tk.Frame = super()._get_closest_folder(self.changing)
-        newfile:File = parent.item.newfile()
-        self._newitem(newfile, parent)
+        parent:Folder = super()._get_closest_folder(self.changing)
+        self._newitem(parent.newfile(), parent)
 
     def newfolder(self) -> None:
-        parent:tk.Frame = super()._get_closest_folder(self.changing)
-        newfolder:Folder = parent.item.newfolder()
-        self._newitem(newfolder, parent)
+        parent:Folder = super()._get_closest_folder(self.changing)
+        self._newitem(parent.newfolder(), parent)
 
-    def _newitem(self, newitem:Item, parent:tk.Frame) -> None:
+    def _newitem(self, newitem:Item, parent:Folder) -> None:
         super()._expand(parent)
-        newframe:tk.Frame = super().create_frame(newitem)
-        newframe.focused_widget:tk.Misc = self.changing.focused_widget
         super().update(soft=True)
-        self.selected = self.changing = newframe
+        self.selected = self.changing = newitem
         self.creating:bool = True
         self.rename()
 
@@ -440,33 +455,33 @@ class ExpandedExplorer(Explorer):
 
     def open_in_explorer(self) -> None:
         if OPEN_IN_EXPLORER:
-            self._start_proc(OPEN_IN_EXPLORER, path=self.selected.item.fullpath)
-        self.changing:tk.Frame = None
+            self._start_proc(OPEN_IN_EXPLORER, path=self.selected.fullpath)
+        self.changing:Item|None = None
 
     def open_in_terminal(self) -> None:
         if OPEN_IN_TERMINAL:
-            self._start_proc(OPEN_IN_TERMINAL, path=self.selected.item.fullpath)
-        self.changing:tk.Frame = None
+            self._start_proc(OPEN_IN_TERMINAL, path=self.selected.fullpath)
+        self.changing:Item|None = None
 
     def open_item(self) -> None:
         if OPEN_DEFAULT:
-            self._start_proc(OPEN_DEFAULT, path=self.selected.item.fullpath)
-        self.changing:tk.Frame = None
+            self._start_proc(OPEN_DEFAULT, path=self.selected.fullpath)
+        self.changing:Item|None = None
 
     def open_in_git(self) -> None:
         if OPEN_GIT:
-            fs:FileSystem = self.changing.item.root.filesystem
-            git_path:str = fs.join(self.changing.item.fullpath, ".git")
+            fs:FileSystem = self.changing.root.filesystem
+            git_path:str = fs.join(self.changing.fullpath, ".git")
             if fs.exists(git_path) and fs.isfolder(git_path):
-                path:str = self.changing.item.fullpath
+                path:str = self.changing.fullpath
                 self._start_proc(OPEN_GIT, _cwd=path, path=path)
-        self.changing:tk.Frame = None
+        self.changing:Item|None = None
 
     # Copy path
     def copy_path(self) -> None:
         self.master.clipboard_clear()
-        self.master.clipboard_append(self.selected.item.fullpath)
-        self.changing:tk.Frame = None
+        self.master.clipboard_append(self.selected.fullpath)
+        self.changing:Item|None = None
 
 
 if __name__ == "__main__":
@@ -484,16 +499,13 @@ if __name__ == "__main__":
     raise SystemExit
     # """
     from bettertk.betterframe import BindFrame
-    import gridgiver
     import base_explorer
     import explorer
-    #gridgiver.DEBUG = True
     #base_explorer.WARNINGS = True
     #base_explorer.DEBUG = True
     #base_explorer.TEST = True
     #explorer.DEBUG = True
-    #explorer.HIGHLIGHT_UPDATES = True
-    explorer.UPDATE_DELAY = 200000
+    #explorer.AUTO_UPDATE = False
 
     root = tk.Tk()
     root.geometry("320x180+0+0")
@@ -1,29 +1,20 @@
 from __future__ import annotations
 from time import perf_counter
+import tkinter.font as tkfont
 import tkinter as tk
 import os
 
 try:
     from .base_explorer import Item, Root, isfile, isfolder, FileSystem, \
                                MAX_ITEMS_ITENT
-    from .idxgiver import IdxGiver, Idx
-    from .gridgiver import GridGiver
+    from .watcher import Watcher, PollingWatcher, get_watcher
     from . import images
 except ImportError:
     from base_explorer import Item, Root, isfile, isfolder, FileSystem, \
                               MAX_ITEMS_ITENT
-    from idxgiver import IdxGiver, Idx
-    from gridgiver import GridGiver
+    from watcher import Watcher, PollingWatcher, get_watcher
     import images
 
-def iter_skip(iterator:Iterator[T], *, n:int) -> Iterator[T]:
-    for i in range(n):
-        next(iterator)
-    yield from iterator
-
-def generator_len(iterator:Iterator[T]) -> int:
-    return sum(1 for element in iterator)
-
 def create_circle(self, x:int, y:int, r:int, **kwargs):
     return self.create_oval(x-r, y-r, x+r, y+r, **kwargs)
 tk.Canvas.create_circle = create_circle
@@ -31,50 +22,112 @@ tk.Canvas.create_circle = create_circle
 
 INDENTATION:int = 15
 PADX:int = 10
-PADY:int = 5
+ROW_PADY:int = 2 # Above and below every row
+ICON_PADX:int = 4 # Between the icon/expander and the name
 DEBUG:bool = False
-UPDATE_DELAY:int = 5000
-HIGHLIGHT_UPDATES:bool = False
+# Only used if the watcher can't wake us up or for the folders that it
+#   couldn't watch (eg. after running out of inotify watches)
+POLL_DELAY:int = 1000
+WATCH_DELAY:int = 100 # Coalesce the changes made in this many milliseconds
 COLLAPSE_BEFORE_MOVE:bool = True
-REDRAW_HIGHLIGHT_DELAY:int = 1000
 SELECTED_COLOUR:str = "dark orange"
+DRAG_COLOUR:str = "grey"
+BG:str = "black"
+FG:str = "white"
+SCROLL_SPEED:int = 30 # In pixels
+NOT_DRAG_DIST:float = 30   # max pixels distance to not count as dragging
+BUTTON1_TK_STATE:int = 256 # Taken from tkinter.Event.__repr__'s code
 
 AUTO_UPDATE:bool = True
 
 PATH:str = os.path.abspath(os.path.dirname(__file__))
 _shown_sprite_error:bool = False
+_shown_watch_error:bool = False
+
+
+class Row:
+    """
+    The canvas items of one row. There are only enough rows to fill the
+      view and they are reused for different items when scrolling.
+    """
+    __slots__ = "bg", "expander", "icon", "name", "item"
+
+    def __init__(self, canvas:tk.Canvas, font:str, monofont:str) -> Row:
+        kwargs:dict = dict(state="hidden", tags="row")
+        self.bg:int = canvas.create_rectangle(0, 0, 0, 0, width=0, fill="",
+                                              **kwargs)
+        self.expander:int = canvas.create_text(0, 0, anchor="w", fill=FG,
+                                               font=monofont, **kwargs)
+        self.icon:int = canvas.create_image(0, 0, anchor="w", **kwargs)
+        self.name:int = canvas.create_text(0, 0, anchor="w", fill=FG,
+                                           font=font, state="hidden",
+                                           tags=("row", "name"))
+        self.item:Item|None = None
 
 
 class Explorer:
-    __slots__ = "master", "changing", "ggiver", "root", "item_to_frame", \
-                "expanded_before", "font", "monofont"
+    __slots__ = "master", "canvas", "changing", "root", "expanded_before", \
+                "font", "monofont", "watcher", "watched", "changed", \
+                "_apply_id", "rows", "row_height", "icons", \
+                "_selected", "b1pressed", "dragging", "dragx", "dragy", \
+                "width", "xscrollcommand", "yscrollcommand", "fallback", \
+                "_fallback_id"
 
     def __init__(self, master:tk.Misc, font:str="TkDefaultFont",
                  monofont:str="TkFixedFont") -> Explorer:
         self.font:str = font
         self.monofont:str = monofont
         self.master:tk.Misc = master
-        self.changing:tk.Frame = None
+        self.changing:Item|None = None
         self.master.grid_columnconfigure(1, weight=1)
+        self.master.grid_rowconfigure(1, weight=1)
+        self.canvas:tk.Canvas = tk.Canvas(master, bg=BG, bd=0,
+                                          highlightthickness=0,
+                                          xscrollincrement=1,
+                                          yscrollincrement=1)
+        self.canvas.grid(row=1, column=1, sticky="news")
         self.root:Root = Root(FileSystem(), autoexpand=False)
-        self.item_to_frame:dict[Item:tk.Frame] = dict()
-        self.ggiver:GridGiver = GridGiver(self.master)
-        self.ggiver.select:Function[tk.Frame,tk.Frame] = self._selected
-        self.ggiver.move_frame:Function[tk.Frame,tk.Frame,None] = self.move
-        self.ggiver.start_move:Function[tk.Frame,list[tk.Frame]] = self.start_move
-        self.ggiver.cancel_move:Function[None] = self.cancel_move
-        self.ggiver.double_click:Function[tk.Frame,str] = self.double_click
-        self.update_loop()
+        linespace:int = tkfont.Font(root=master, font=font).metrics("linespace")
+        self.row_height:int = max(linespace, images.HEIGHT) + 2*ROW_PADY
+        # The rows that draw the shown items (`root.igiver` gives the rows)
+        self.rows:list[Row] = []
+        self.icons:dict[Item:tk.PhotoImage] = dict()
+        self._selected:Item|None = None
+        self.width:int = 0
+        # Set these to connect scrollbars
+        self.xscrollcommand:Function[str,str,None] = lambda low, high: None
+        self.yscrollcommand:Function[str,str,None] = lambda low, high: None
+        self.canvas.config(xscrollcommand=self._xscrolled,
+                           yscrollcommand=self._yscrolled)
+        # Mouse
+        self.b1pressed:bool = False
+        self.dragging:bool = False
+        self.dragx:int = 0
+        self.dragy:int = 0
+        self.canvas.bind("<Motion>", self._mouse_moved, add=True)
+        self.canvas.bind("<B1-Motion>", self._mouse_moved, add=True)
+        self.canvas.bind("<ButtonPress-1>", self._mouse_pressed, add=True)
+        self.canvas.bind("<ButtonRelease-1>", self._mouse_released, add=True)
+        self.canvas.bind("<Double-Button-1>", self._double_click, add=True)
+        self.canvas.bind("<Button-3>", self._right_click, add=True)
+        self.canvas.bind("<MouseWheel>", self._scroll_windows, add=True)
+        self.canvas.bind("<Button-4>", self._scroll_linux, add=True)
+        self.canvas.bind("<Button-5>", self._scroll_linux, add=True)
+        self.canvas.bind("<Configure>", self._redraw, add=True)
+        self.master.bind_all("<<CancelAll>>", lambda e: self._select(None),
+                             add=True)
+        self.master.bind("<<FocusOutExplorer>>", lambda e: self._select(None),
+                         add=True)
+        self._start_watching()
 
     # Helpers
-    def _get_closest_folder(self, frame:tk.Frame) -> tk.Frame:
-        if isfile(frame.item):
-            item:Folder = frame.item.master
-            assert isfolder(item), "SanityCheck"
-            return self.item_to_frame[item]
-        elif isfolder(frame.item):
-            return frame
-        raise NotImplementedError(f"What is {frame.item}?")
+    def _get_closest_folder(self, item:Item) -> Folder:
+        if isfile(item):
+            assert isfolder(item.master), "SanityCheck"
+            return item.master
+        elif isfolder(item):
+            return item
+        raise NotImplementedError(f"What is {item}?")
 
     def _get_sprite(self, path:str) -> tk.PhotoImage:
         try:
@@ -87,229 +140,425 @@ class Explorer:
                     self.master.report_full_exception(error)
             return images.get_sprite(self.master, "")
 
-    def _get_shown_children(self, frame:tk.Frame, *, withself:bool):
-        iterator = frame.item.recurse_children(withself=withself,
-                                               only_shown=True)
-        if DEBUG:
-            for item, shown in iterator:
-                assert shown, "SanityCheck"
-                yield self.item_to_frame[item]
-        else:
-            yield from map(lambda x: self.item_to_frame[x[0]], iterator)
+    def _get_icon(self, item:Item) -> tk.PhotoImage:
+        icon:tk.PhotoImage|None = self.icons.get(item, None)
+        if icon is None:
+            icon = self.icons[item] = self._get_sprite(item.fullpath)
+        return icon
 
-    def fix_indentation(self, frame:tk.Frame) -> None:
-        if frame.indent == frame.item.indentation:
+    def fix_icon(self, item:Item) -> None:
+        self.icons.pop(item, None)
+        self._redraw()
+
+    def _row_of(self, item:Item) -> int|None:
+        if (item.idx is None) or item.idx.deleted:
+            return None
+        return self.root.igiver.shown_row(item)
+
+    def _item_at(self, y:int) -> Item|None:
+        """
+        Returns the item shown at `y` (in pixels from the top of the view)
+        """
+        row:int = int(self.canvas.canvasy(y)) // self.row_height
+        if 0 <= row < self.root.igiver.shown:
+            return self.root.igiver.shown_item_at(row)
+        return None
+
+    def _name_x(self, item:Item) -> int:
+        return (item.indentation-1)*INDENTATION + PADX + images.WIDTH + \
+               ICON_PADX
+
+    def see(self, item:Item) -> None:
+        """
+        Scroll so that `item` is in view (if it's shown)
+        """
+        row:int|None = self._row_of(item)
+        if row is None:
             return None
-        frame.indent:int = frame.item.indentation
-        frame.indentation.config(width=(frame.indent-1)*INDENTATION + PADX)
+        top, bottom = row*self.row_height, (row+1)*self.row_height
+        view_top:int = int(self.canvas.canvasy(0))
+        view_bottom:int = view_top + self.canvas.winfo_height()
+        if (top < view_top) or (bottom > view_bottom):
+            total:int = max(self.root.igiver.shown*self.row_height, 1)
+            self.canvas.yview_moveto(top/total)
 
     @property
-    def selected(self) -> tk.Frame:
-        return self.ggiver.get_selected()
+    def selected(self) -> Item|None:
+        return self._selected
 
     @selected.setter
-    def selected(self, frame:tk.Frame|None) -> None:
-        assert isinstance(frame, tk.Frame|None), "TypeError"
-        self.ggiver._select(frame)
-        self.master.event_generate("<<Explorer-Selected>>", data=(frame,))
+    def selected(self, item:Item|None) -> None:
+        assert isinstance(item, Item|None), "TypeError"
+        self._select(item)
+        self.master.event_generate("<<Explorer-Selected>>", data=(item,))
 
-    def get_selected(self) -> tk.Frame:
+    def get_selected(self) -> Item|None:
         return self.selected
 
-    def fix_icon(self, frame:tk.Frame) -> None:
-        image:tk.PhotoImage = self._get_sprite(frame.item.fullpath)
-        frame.icon.itemconfig(frame.icon.id, image=image)
+    def _select(self, item:Item|None) -> None:
+        if self._selected is item:
+            return None
+        if DEBUG: print(f"[DEBUG]: Select {item}")
+        self._selected:Item|None = item
+        self._redraw()
+
+    # Scrolling
+    def xview(self, *args:tuple) -> object:
+        return self.canvas.xview(*args)
+
+    def yview(self, *args:tuple) -> object:
+        return self.canvas.yview(*args)
 
-    def recolour_frame(self, frame:tk.Frame, bg:str) -> None:
-        if frame is None:
+    def _xscrolled(self, low:str, high:str) -> None:
+        self.xscrollcommand(low, high)
+
+    def _yscrolled(self, low:str, high:str) -> None:
+        self._redraw()
+        self.yscrollcommand(low, high)
+
+    def _scroll_windows(self, event:tk.Event) -> None:
+        if event.delta == 0:
             return None
-        if frame.item.name == MAX_ITEMS_ITENT:
+        steps:int = int(-event.delta/abs(event.delta)*SCROLL_SPEED)
+        self._scroll(steps, horizontal=event.state&1)
+
+    def _scroll_linux(self, event:tk.Event) -> None:
+        steps:int = SCROLL_SPEED
+        if event.num == 4:
+            steps *= -1
+        self._scroll(steps, horizontal=event.state&1)
+
+    def _scroll(self, steps:int, *, horizontal:bool) -> None:
+        if horizontal:
+            self.canvas.xview_scroll(steps, "units")
+        else:
+            self.canvas.yview_scroll(steps, "units")
+
+    # Drawing
+    def _set_scrollregion(self) -> None:
+        height:int = self.root.igiver.shown * self.row_height
+        self.canvas.config(scrollregion=(0, 0, self.width, height))
+
+    def _redraw(self, event:tk.Event=None) -> None:
+        """
+        Draw the shown items that are in view reusing the rows.
+        """
+        height:int = self.canvas.winfo_height()
+        first:int = max(0, int(self.canvas.canvasy(0)) // self.row_height)
+        count:int = height//self.row_height + 2
+        count:int = max(0, min(count, self.root.igiver.shown-first))
+        while len(self.rows) < count:
+            self.rows.append(Row(self.canvas, self.font, self.monofont))
+        for i, row in enumerate(self.rows):
+            if i < count:
+                self._draw_row(row, first+i)
+            elif row.item is not None:
+                row.item:Item|None = None
+                for id in (row.bg, row.expander, row.icon, row.name):
+                    self.canvas.itemconfig(id, state="hidden")
+        # Only the rows in view are measured so the width can only grow
+        #   until the next update
+        bbox:tuple[int]|None = self.canvas.bbox("name")
+        if (bbox is not None) and (bbox[2]+PADX > self.width):
+            self.width:int = bbox[2] + PADX
+            self._set_scrollregion()
+        right:int = max(self.width, self.canvas.winfo_width())
+        for i, row in enumerate(self.rows[:count]):
+            y:int = (first+i) * self.row_height
+            self.canvas.coords(row.bg, 0, y, right, y+self.row_height)
+
+    def _draw_row(self, row:Row, i:int) -> None:
+        item:Item = self.root.igiver.shown_item_at(i)
+        row.item:Item = item
+        middle:int = i*self.row_height + self.row_height//2
+        x:int = (item.indentation-1)*INDENTATION + PADX
+        selected:bool = (item is self._selected) and \
+                        (item.name != MAX_ITEMS_ITENT)
+        self.canvas.itemconfig(row.bg, state="normal",
+                               fill=SELECTED_COLOUR if selected else "")
+        if isfolder(item):
+            self.canvas.coords(row.expander, x, middle)
+            self.canvas.itemconfig(row.expander, state="normal",
+                                   text="-" if item.expanded else "+")
+            self.canvas.itemconfig(row.icon, state="hidden")
+        else:
+            self.canvas.coords(row.icon, x, middle)
+            self.canvas.itemconfig(row.icon, state="normal",
+                                   image=self._get_icon(item))
+            self.canvas.itemconfig(row.expander, state="hidden")
+        self.canvas.coords(row.name, self._name_x(item), middle)
+        self.canvas.itemconfig(row.name, state="normal", text=item.purename)
+
+    # Watch the shown folders
+    def _start_watching(self) -> None:
+        self.watched:dict[str:Folder] = dict()
+        self.changed:set[str] = set()
+        self._apply_id:str|None = None
+        self._fallback_id:str|None = None
+        self.watcher:Watcher|None = None
+        # Polls the folders that `watcher` failed to watch
+        self.fallback:PollingWatcher = PollingWatcher()
+        if not AUTO_UPDATE:
             return None
-        frame.config(bg=bg)
-        frame.indentation.config(bg=bg)
-        frame.name.config(bg=bg)
-        if isfile(frame.item):
-            frame.icon.config(bg=bg)
+        self.watcher:Watcher = get_watcher()
+        fd:int|None = self.watcher.fileno()
+        if fd is None:
+            self.master.after(POLL_DELAY, self._poll_watcher)
         else:
-            frame.expandeder.config(bg=bg)
+            self.master.tk.createfilehandler(fd, tk.READABLE,
+                                             self._read_watcher)
+        self.master.bind("<Destroy>", self._stop_watching, add=True)
 
-    # Update/loop
-    def update_loop(self) -> None:
-        if (self.changing is None) and AUTO_UPDATE:
-            self.update(soft=False)
-        elif AUTO_UPDATE and DEBUG:
-            print(f"[DEBUG]: Skipping update")
-        self.master.after(UPDATE_DELAY, self.update_loop)
+    def _stop_watching(self, event:tk.Event) -> None:
+        if (event.widget != self.master) or (self.watcher is None):
+            return None
+        fd:int|None = self.watcher.fileno()
+        if fd is not None:
+            self.master.tk.deletefilehandler(fd)
+        self.watcher.close()
+        self.watcher:Watcher|None = None
+        self.fallback.close()
+
+    def _poll_watcher(self) -> None:
+        if self.watcher is None:
+            return None
+        self._read_watcher()
+        self.master.after(POLL_DELAY, self._poll_watcher)
 
+    def _poll_fallback(self) -> None:
+        self._fallback_id:str|None = None
+        if self.watcher is None:
+            return None
+        self._got_changes(self.fallback.read())
+        if self.fallback.watched:
+            self._fallback_id:str = self.master.after(POLL_DELAY,
+                                                      self._poll_fallback)
+
+    def _read_watcher(self, *args:tuple) -> None:
+        self._got_changes(self.watcher.read())
+
+    def _got_changes(self, changed:set[str]) -> None:
+        self.changed.update(changed)
+        if self.changed and (self._apply_id is None):
+            self._apply_id:str = self.master.after(WATCH_DELAY,
+                                                   self._apply_changes)
+
+    def _apply_changes(self) -> None:
+        """
+        Re-list only the folders that changed (not their subfolders)
+        """
+        self._apply_id:str|None = None
+        if self.changing is not None:
+            if DEBUG: print(f"[DEBUG]: Delaying update")
+            self._apply_id:str = self.master.after(WATCH_DELAY,
+                                                   self._apply_changes)
+            return None
+        changed, self.changed = self.changed, set()
+        for path in changed:
+            folder:Folder|None = self.watched.get(path, None)
+            # The folder might have been removed by its parent's update
+            if (folder is None) or folder.idx.deleted:
+                continue
+            if DEBUG: print(f"[DEBUG]: Changed {folder}")
+            folder.update(recursive=False)
+        self.update(soft=True)
+
+    def _sync_watches(self, watch:dict[str:Folder]) -> None:
+        if self.watcher is None:
+            return None
+        watching:set[str] = self.watcher.watched
+        polling:set[str] = self.fallback.watched
+        for path in watching - watch.keys():
+            self.watcher.unwatch(path)
+        for path in polling - watch.keys():
+            self.fallback.unwatch(path)
+        for path in watch.keys() - watching - polling:
+            if not self.watcher.watch(path):
+                self._watch_failed(path)
+        self.watched:dict[str:Folder] = watch
+        if self.fallback.watched and (self._fallback_id is None):
+            self._fallback_id:str = self.master.after(POLL_DELAY,
+                                                      self._poll_fallback)
+
+    def _watch_failed(self, path:str) -> None:
+        """
+        Poll the folders that the watcher can't watch (and warn once)
+        """
+        global _shown_watch_error
+        if not _shown_watch_error:
+            _shown_watch_error = True
+            print(f"[WARNING]: Can't watch {path!r} for changes (maybe " \
+                  f"fs.inotify.max_user_watches is too low) so it (and " \
+                  f"others like it) will be polled instead")
+        self.fallback.watch(path)
+
+    # Update
     def update(self, *, soft:bool=False):
         if DEBUG:
             start:float = perf_counter()
             print("[DEBUG]: Updating")
         if not soft:
             self.root.update() # Don't remove (root is BaseExplorer)
+        # Only the folders are walked (the rows come from `root.igiver`)
+        watch:dict[str:Folder] = dict()
+        folders:list[Folder] = list(self.root.children)
+        while len(folders) > 0:
+            folder:Folder = folders.pop()
+            if folder.expanded:
+                watch[folder.fullpath] = folder
+                folders.extend(filter(isfolder, folder.children))
+        self.width:int = 0
+        self._sync_watches(watch)
         self._update_remove_dead()
-        for item, show in self.root.recurse_children(withself=False):
-            assert not item.idx.deleted, "SanityCheck"
-            # create_frame must check if the frame already exists
-            frame:tk.Frame = self.create_frame(item)
-            if show and (item.idx.dirty or (not frame.shown)):
-                self._update_show(frame)
-            if (not show) and frame.shown:
-                self._update_hide(frame)
+        self._set_scrollregion()
+        self._redraw()
         if DEBUG:
             print(f"[DEBUG]: Updated in {perf_counter()-start} seconds")
 
     def _update_remove_dead(self) -> None:
-        for item in tuple(self.item_to_frame):
+        for item in tuple(self.icons):
             if item.idx.deleted:
-                self.delete_item(item, apply_filesystem=False)
-
-    def _update_show(self, frame:tk.Frame) -> None:
-        frame.shown:bool = True
-        self.fix_indentation(frame)
-        frame.item.idx.dirty:bool = False
-        self.ggiver.add_frame(frame, frame.item.idx.value)
-        if DEBUG:
-            print(f"[DEBUG]: {frame.item} moved to to={frame.item.idx}")
-        if HIGHLIGHT_UPDATES:
-            frame.after(REDRAW_HIGHLIGHT_DELAY, self.recolour_frame, frame, frame.cget("bg"))
-            self.recolour_frame(frame, "red")
-
-    def _update_hide(self, frame:tk.Frame) -> None:
-        if DEBUG: print(f"[DEBUG]: Hiding: {frame.item}")
-        self.ggiver.remove_frame(frame)
-        frame.shown:bool = False
+                self.icons.pop(item)
+        if (self._selected is not None) and self._selected.idx.deleted:
+            self._selected:Item|None = None
 
     def delete_item(self, item:Item, *, apply_filesystem:bool=True) -> None:
-        frame:tk.Frame = self.item_to_frame.pop(item)
         if not item.idx.deleted: # Check item still in tree
-            frame.item.delete(apply_filesystem=apply_filesystem)
-        self.ggiver.remove_frame(frame, grid_forget=False)
-        frame.destroy()
-
-    # Create frame
-    def create_frame(self, item:Item) -> tk.Frame:
-        frame:tk.Frame = self.item_to_frame.get(item, None)
-        if frame is not None:
-            return frame
-        if DEBUG: print(f"[DEBUG]: Creating frame for {item}")
-        frame = tk.Frame(self.master, bg="black", highlightthickness=0, bd=0)
-        self.item_to_frame[item] = frame
-        frame.shown:bool = False
-        frame.item:Item = item
-
-        indentation = tk.Canvas(frame, width=1, bd=0, bg="black",
-                                height=1, highlightthickness=0)
-        indentation.grid(row=1, column=1, sticky="ns")
-        frame.indentation = indentation
-        frame.indent:int = None
-        self.fix_indentation(frame)
+            item.delete(apply_filesystem=apply_filesystem)
+        self._update_remove_dead()
 
-        if isfile(item):
-            tk_icon = self._get_sprite(item.fullpath)
-            icon = tk.Canvas(frame, bg="black", bd=0, highlightthickness=0,
-                             width=tk_icon.width(), height=tk_icon.height())
-            icon.id:int = icon.create_image(0, 0, anchor="nw", image=tk_icon)
-            icon.grid(row=1, column=2)
-            frame.icon = icon
-        elif isfolder(item):
-            if item.expanded:
-                text = "-"
-            else:
-                text = "+"
-            expandeder = tk.Label(frame, text=text, bg="black", fg="white",
-                                  font=self.monofont)
-            expandeder.grid(row=1, column=2, sticky="news")
-            frame.expandeder = expandeder
+    # Mouse
+    def _mouse_pressed(self, event:tk.Event) -> None:
+        self.b1pressed:bool = True
+        self.dragx, self.dragy = event.x, event.y
+        self._select(self._item_at(event.y))
+
+    def _mouse_moved(self, event:tk.Event) -> None:
+        if not self.b1pressed:
+            return None
+        # Mouse released outside of the window
+        if not (event.state & BUTTON1_TK_STATE):
+            self._mouse_released(event, cancelled=True)
+            return None
+        if not self.dragging:
+            if self._selected is None:
+                return None
+            dist:int = (event.x-self.dragx)**2 + (event.y-self.dragy)**2
+            if dist < NOT_DRAG_DIST:
+                return None
+            if not self.start_move(self._selected):
+                return None
+            self.dragging:bool = True
+            text:int = self.canvas.create_text(0, 0, anchor="nw", fill=FG,
+                                               font=self.font, tags="drag",
+                                               text=self._selected.purename)
+            x1, y1, x2, y2 = self.canvas.bbox(text)
+            rect:int = self.canvas.create_rectangle(x1-ICON_PADX, y1,
+                                                    x2+ICON_PADX, y2, width=0,
+                                                    fill=DRAG_COLOUR,
+                                                    tags="drag")
+            self.canvas.tag_lower(rect, text)
+        # If we are already dragging (or we are starting to drag):
+        self.canvas.moveto("drag", self.canvas.canvasx(event.x),
+                           self.canvas.canvasy(event.y)-self.row_height//2)
+
+    def _mouse_released(self, event:tk.Event, *, cancelled:bool=False) -> None:
+        self.b1pressed:bool = False # Don't move this line down!
+        if not self.dragging:
+            return None
+        self.dragging:bool = False
+        self.canvas.delete("drag")
+        if cancelled or not (0 <= event.y < self.canvas.winfo_height()):
+            if DEBUG: print(f"[DEBUG]: Cancel move")
+            self.cancel_move()
+            return None
+        destination:Item|None = self._item_at(event.y)
+        if destination is None:
+            if DEBUG: print(f"[DEBUG]: Cancel move")
+            self.cancel_move()
         else:
-            raise NotImplementedError(f"Don't have a clue to what {item} is")
+            if DEBUG: print(f"[DEBUG]: Move {destination=}")
+            self.move(self._selected, destination)
 
-        name = tk.Label(frame, text=item.purename, bg="black", fg="white",
-                        anchor="w", font=self.font)
-        name.grid(row=1, column=4, sticky="news")
-        frame.grid_columnconfigure(4, weight=1)
-        frame.name = name
-        return frame
+    def _double_click(self, event:tk.Event) -> str:
+        return self.double_click(self._item_at(event.y))
 
-    # Event handlers
-    def _selected(self, old:tk.Frame, new:tk.Frame) -> None:
-        self.recolour_frame(old, "black")
-        self.recolour_frame(new, SELECTED_COLOUR)
+    def _right_click(self, event:tk.Event) -> str:
+        return self.right_click(self._item_at(event.y))
 
-    def start_move(self, frame:tk.Frame) -> list[tk.Frame]:
-        if frame.item.indentation == 1:
-            return []
+    # Event handlers
+    def start_move(self, item:Item) -> bool:
+        if item.indentation == 1:
+            return False
         if self.changing is not None:
-            return []
-        if frame.item.name == MAX_ITEMS_ITENT:
-            return []
-        self.changing:tk.Frame = frame
+            return False
+        if item.name == MAX_ITEMS_ITENT:
+            return False
+        self.changing:Item = item
         if COLLAPSE_BEFORE_MOVE:
-            if isfolder(frame.item):
-                self.expanded_before:bool = frame.item.expanded
-                self._collapse(frame)
+            if isfolder(item):
+                self.expanded_before:bool = item.expanded
+                self._collapse(item)
             else:
                 self.expanded_before:bool = False
-            return [frame]
-        else:
-            children = list(self._get_shown_children(frame, withself=True))
-            return children
+        return True
 
     def cancel_move(self) -> None:
         if COLLAPSE_BEFORE_MOVE:
-            if isfolder(self.changing.item) and self.expanded_before:
+            if isfolder(self.changing) and self.expanded_before:
                 self._expand(self.changing)
-        self.changing:tk.Frame = None
+        self.changing:Item|None = None
 
-    def move(self, src:tk.Frame, dis:tk.Frame) -> None:
-        dis:tk.Frame = self._get_closest_folder(dis)
-        self.changing:tk.Frame = None
-        src.item.move(dis.item)
+    def move(self, src:Item, dis:Item) -> None:
+        dis:Folder = self._get_closest_folder(dis)
+        self.changing:Item|None = None
+        src.move(dis)
         if COLLAPSE_BEFORE_MOVE:
-            if isfolder(src.item) and self.expanded_before:
+            if isfolder(src) and self.expanded_before:
                 self._expand(src)
-        if isfolder(dis.item):
+        if isfolder(dis):
             self._expand(dis)
         self.update(soft=True)
 
-    def double_click(self, frame:tk.Frame|None) -> str:
-        if frame is None:
+    def double_click(self, item:Item|None) -> str:
+        if item is None:
             return None
-        if isfolder(frame.item):
-            return self._toggle_expand(frame)
+        if isfolder(item):
+            return self._toggle_expand(item)
         else:
-            self.master.event_generate("<<Explorer-Open>>", data=(frame.item,))
+            self.master.event_generate("<<Explorer-Open>>", data=(item,))
 
-    def _toggle_expand(self, frame:tk.Frame) -> str:
-        assert isfolder(frame.item), "TypeError"
-        if frame.item.expanded:
-            self._collapse(frame)
+    def right_click(self, item:Item|None) -> str:
+        return None
+
+    def _toggle_expand(self, item:Item) -> str:
+        assert isfolder(item), "TypeError"
+        if item.expanded:
+            self._collapse(item)
         else:
-            self._expand(frame)
+            self._expand(item)
 
-    def _expand(self, frame:tk.Frame) -> None:
-        if frame.item.expanded:
+    def _expand(self, item:Item) -> None:
+        if item.expanded:
             return None
-        if frame.item.name == MAX_ITEMS_ITENT:
+        if item.name == MAX_ITEMS_ITENT:
             return None
-        if DEBUG: print(f"[DEBUG]: Expanding {frame.item}")
-        frame.expandeder.config(text="-")
-        frame.item.expanded:bool = True
+        if DEBUG: print(f"[DEBUG]: Expanding {item}")
+        item.expanded:bool = True
         self.update(soft=True)
         self.master.event_generate("<<Explorer-Expanded>>")
 
-    def _collapse(self, frame:tk.Frame) -> None:
-        if not frame.item.expanded:
+    def _collapse(self, item:Item) -> None:
+        if not item.expanded:
             return None
-        if frame.item.name == MAX_ITEMS_ITENT:
+        if item.name == MAX_ITEMS_ITENT:
             return None
-        frame.expandeder.config(text="+")
-        frame.item.expanded:bool = False
+        item.expanded:bool = False
         self.update(soft=True)
 
     def expand(self, item:Item) -> None:
         assert isfolder(item), "TypeError"
-        self._expand(self.item_to_frame[item])
+        self._expand(item)
 
     # Functions you can call:
     def add(self, path:str, expand:bool=False) -> Success:
@@ -322,8 +571,8 @@ class Explorer:
             return True
         return False
 
-    def remove(self, path:str) -> None:
-        self.root.remove(path)
+    def remove(self, item_or_path:Item|str) -> None:
+        self.root.remove(item_or_path)
         self.update(soft=False)
 
 
@@ -1,10 +1,25 @@
+"""
+Gives every item in the explorer its row (`Idx.value`). The rows are kept
+in an implicit treap (a balanced tree ordered by position where a node's
+row is the number of nodes before it) so pushing, removing and moving
+items (or blocks of consecutive items) and finding the row of an item or
+the item at a row are all O(log n). Nothing is renumbered: `Idx.value`
+is calculated from the tree when needed.
+Every node also has a `hidden` count (the number of collapsed folders
+above the item) that can be changed for a block of rows at once. The
+items with `hidden == 0` are the ones that are shown so the same tree
+gives the shown row of an item and the item at a shown row in O(log n).
+"""
 from __future__ import annotations
+from random import Random
 
 
 TEST:bool = False
 LOG:bool = False
 log:list = []
 
+_random:Random = Random(42)
+
 
 def sign(x:int) -> int:
     if x < 0:
@@ -16,82 +31,71 @@ def sign(x:int) -> int:
 
 
 class Idx:
-    __slots__ = "value", "dirty", "deleted"
-    singletons:dict[int:Idx] = dict()
-
-    def __new__(Cls:type, new_value:int) -> Idx:
-        if new_value in Idx.singletons:
-            if LOG:
-                log.append(("Idx.__new__", new_value, "cache"))
-            return Idx.singletons[new_value]
-        self:Idx = super().__new__(Cls)
-        Idx.singletons[new_value] = self
+    """
+    A node of the treap. `dirty` is true if `value` changed since `dirty`
+      was last set to False (or if it was set to True).
+    `hidden` and `min_hidden` (the smallest `hidden` in the subtree, which
+      `min_count` nodes have) already include this node's `lazy` which
+      hasn't been added to the children yet.
+    """
+    __slots__ = "left", "right", "parent", "priority", "size", "item", \
+                "deleted", "_dirty", "_clean_value", "hidden", "lazy", \
+                "min_hidden", "min_count"
+
+    def __init__(self, item:object=None, hidden:int=0) -> Idx:
+        self.priority:float = _random.random()
+        self.parent:Idx|None = None
+        self.right:Idx|None = None
+        self.left:Idx|None = None
+        self.item:object = item
         self.deleted:bool = False
-        self.dirty:bool = True
-        if LOG:
-            log.append(("Idx.__new__", new_value))
-        return self
+        self._clean_value:int = -1
+        self._dirty:bool = True
+        self.size:int = 1
+        self.hidden:int = hidden
+        self.lazy:int = 0
+        self.min_hidden:int = hidden
+        self.min_count:int = 1
 
     def __repr__(self) -> str:
+        if self.deleted:
+            return f"Idx[deleted]"
         dirty:str = "|d" if self.dirty else ""
         return f"Idx[{self.get()}{dirty}]"
 
+    @property
+    def value(self) -> int:
+        assert not self.deleted, "Idx already destroyed"
+        value:int = _size(self.left)
+        node:Idx = self
+        while node.parent is not None:
+            if node is node.parent.right:
+                value += _size(node.parent.left) + 1
+            node:Idx = node.parent
+        return value
+
     def get(self) -> int:
         return self.value
 
-    def set(self, new_value:int) -> None:
-        if LOG:
-            log.append(("Idx.set", self.value, new_value))
-        assert not self.deleted, "Don't destroy and call this function"
-        assert new_value not in Idx.singletons, "KeyAlreadyExists"
-        Idx.singletons[new_value] = Idx.singletons.pop(self.value)
-        self._set(new_value)
-        self.dirty:int = True
-
-    def _set(self, new_value:int) -> None:
-        if LOG:
-            log.append(("Idx._set", self.value, new_value))
-        self.value:int = new_value
-
-    def destroy(self) -> None:
-        if LOG:
-            log.append(("Idx.destroy", self.value))
-        assert not self.deleted, "Idx already destroyed"
-        self.deleted:bool = True
-        sself:Idx = self.singletons.pop(self.value)
-
-    def undestroy(self) -> None:
-        if LOG:
-            log.append(("Idx.undestroy", self.value))
-        assert self.deleted, "Idx not destroyed"
-        assert self.value not in self.singletons, "Idx in singletons"
-        self.deleted:bool = False
-        self.singletons[self.value] = self
+    @property
+    def dirty(self) -> bool:
+        return self._dirty or (self._clean_value != self.value)
 
-    def moveup(self, delta:int) -> None:
-        if LOG:
-            log.append(("Idx.moveup", self.value, delta))
-        self.destroy()
-        if delta < 0:
-            iterator:Iterator[int] = range(self.value+1, self.value-delta+1)
-        else:
-            iterator:Iterator[int] = range(self.value-1, self.value-delta-1, -1)
-        # iterator=tuple(iterator);print(iterator, delta)
-        for i in iterator:
-            Idx.singletons[i].set(i+1*sign(delta))
-        self._set(self.value-delta)
-        self.dirty:bool = True
-        self.undestroy()
+    @dirty.setter
+    def dirty(self, value:bool) -> None:
+        self._dirty:bool = value
+        if not value:
+            self._clean_value:int = self.value
 
     def __eq__(self, other:Idx) -> bool:
         assert isinstance(other, Idx), "TypeError"
         return self.value == other.value
 
-    def __leq__(self, other:Idx) -> bool:
+    def __le__(self, other:Idx) -> bool:
         assert isinstance(other, Idx), "TypeError"
         return self.value <= other.value
 
-    def __geq__(self, other:Idx) -> bool:
+    def __ge__(self, other:Idx) -> bool:
         assert isinstance(other, Idx), "TypeError"
         return self.value >= other.value
 
@@ -103,40 +107,230 @@ class Idx:
         assert isinstance(other, Idx), "TypeError"
         return self.value > other.value
 
-    __init__ = _set
-    __hash__ = get
+    __hash__ = object.__hash__
+
+
+def _size(node:Idx|None) -> int:
+    return 0 if node is None else node.size
+
+def _shown(node:Idx|None, lazy:int) -> int:
+    """
+    The number of shown nodes in the subtree given the `lazy` that its
+      ancestors haven't added to it yet
+    """
+    if (node is None) or (node.min_hidden+lazy != 0):
+        return 0
+    return node.min_count
+
+def _add_hidden(node:Idx|None, delta:int) -> None:
+    if node is None:
+        return None
+    node.hidden += delta
+    node.min_hidden += delta
+    node.lazy += delta
+
+def _push(node:Idx) -> None:
+    """
+    Add `node.lazy` to its children
+    """
+    if node.lazy != 0:
+        _add_hidden(node.left, node.lazy)
+        _add_hidden(node.right, node.lazy)
+        node.lazy:int = 0
+
+def _fix(node:Idx) -> None:
+    """
+    Fix `node.size`, `node.min_hidden`, `node.min_count` and its
+      children's `parent`s
+    """
+    size:int = 1
+    min_hidden:int = node.hidden
+    min_count:int = 1
+    left, right = node.left, node.right
+    if left is not None:
+        size += left.size
+        left.parent:Idx = node
+        if left.min_hidden+node.lazy < min_hidden:
+            min_hidden, min_count = left.min_hidden+node.lazy, left.min_count
+        elif left.min_hidden+node.lazy == min_hidden:
+            min_count += left.min_count
+    if right is not None:
+        size += right.size
+        right.parent:Idx = node
+        if right.min_hidden+node.lazy < min_hidden:
+            min_hidden, min_count = right.min_hidden+node.lazy, right.min_count
+        elif right.min_hidden+node.lazy == min_hidden:
+            min_count += right.min_count
+    node.size, node.min_hidden, node.min_count = size, min_hidden, min_count
+
+def _lazies(node:Idx) -> list[tuple[Idx,int]]:
+    """
+    The path from the root to `node` with the `lazy` that each node's
+      ancestors haven't added to it yet
+    """
+    path:list[Idx] = [node]
+    while path[-1].parent is not None:
+        path.append(path[-1].parent)
+    output:list[tuple[Idx,int]] = []
+    lazy:int = 0
+    for ancestor in reversed(path):
+        output.append((ancestor, lazy))
+        lazy += ancestor.lazy
+    return output
+
+def _split(node:Idx|None, k:int) -> tuple[Idx|None,Idx|None]:
+    """
+    Splits the tree into the first `k` nodes and the rest. The roots'
+      parents aren't fixed.
+    """
+    if node is None:
+        return None, None
+    _push(node)
+    if _size(node.left) >= k:
+        first, node.left = _split(node.left, k)
+        _fix(node)
+        return first, node
+    node.right, second = _split(node.right, k-_size(node.left)-1)
+    _fix(node)
+    return node, second
+
+def _merge(first:Idx|None, second:Idx|None) -> Idx|None:
+    """
+    Joins 2 trees (all of `first`'s nodes go before `second`'s). The
+      root's parent isn't fixed.
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    if first.priority > second.priority:
+        _push(first)
+        first.right = _merge(first.right, second)
+        _fix(first)
+        return first
+    _push(second)
+    second.left = _merge(first, second.left)
+    _fix(second)
+    return second
 
 
 class IdxGiver:
-    __slots__ = "items", "item2idx", "max_idx", "Item"
+    __slots__ = "root", "item2idx", "Item"
 
     def __init__(self, Item:type) -> IdxGiver:
         self.item2idx:dict[Item:Idx] = dict()
-        self.items:list[Item] = []
+        self.root:Idx|None = None
         self.Item:type = Item
-        self.max_idx:int = 0
 
     def __repr__(self) -> str:
-        inners:tuple[Item,Idx] = self.item2idx.items()
-        second = lambda x: x[1]
-        inners:tuple[Item,Idx] = sorted(inners, key=second)
-        inner:str = " ".join(f"{item}:{idx}" for item,idx in inners)
+        inner:str = " ".join(f"{idx.item}:{idx}" for idx in self.idxs)
         return f"IdxGiver({inner})"
 
-    def __getitem__(self, key:Item|Idx) -> Idx|Item:
-        assert isinstance(key, self.Item|Idx), "TypeError"
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def __getitem__(self, key:Item|Idx|int) -> Idx|Item:
+        assert isinstance(key, self.Item|Idx|int), "TypeError"
         if isinstance(key, self.Item):
             return self.item2idx[key]
         elif isinstance(key, Idx):
-            return self.items[key.value]
+            assert not key.deleted, "Idx already destroyed"
+            return key.item
+        elif isinstance(key, int):
+            return self.item_at(key)
         else:
             raise NotImplementedError("Unreachable code")
 
-    def push_item(self, item:Item) -> Idx:
+    @property
+    def max_idx(self) -> int:
+        return len(self)
+
+    @property
+    def items(self) -> list[Item]:
+        return [idx.item for idx in self.idxs]
+
+    def _set_root(self, root:Idx|None) -> None:
+        if root is not None:
+            root.parent:Idx = None
+        self.root:Idx|None = root
+
+    def item_at(self, row:int) -> Item:
+        assert 0 <= row < len(self), "IndexError"
+        node:Idx = self.root
+        while True:
+            left:int = _size(node.left)
+            if row < left:
+                node:Idx = node.left
+            elif row == left:
+                return node.item
+            else:
+                row -= left + 1
+                node:Idx = node.right
+
+    @property
+    def shown(self) -> int:
+        """
+        The number of items with `hidden == 0`
+        """
+        return _shown(self.root, 0)
+
+    def shown_item_at(self, row:int) -> Item:
+        assert 0 <= row < self.shown, "IndexError"
+        node:Idx = self.root
+        lazy:int = 0
+        while True:
+            left:int = _shown(node.left, lazy+node.lazy)
+            if row < left:
+                lazy += node.lazy
+                node:Idx = node.left
+                continue
+            row -= left
+            if node.hidden+lazy == 0:
+                if row == 0:
+                    return node.item
+                row -= 1
+            lazy += node.lazy
+            node:Idx = node.right
+
+    def shown_row(self, item:Item) -> int|None:
+        """
+        The row of `item` counting only the shown items (`None` if it's
+          hidden)
+        """
+        path:list[tuple[Idx,int]] = _lazies(self.item2idx[item])
+        node, lazy = path[-1]
+        if node.hidden+lazy != 0:
+            return None
+        row:int = _shown(node.left, lazy+node.lazy)
+        for (parent, lazy), (child, _) in zip(path[-2::-1], path[:0:-1]):
+            if child is parent.right:
+                row += _shown(parent.left, lazy+parent.lazy)
+                row += (parent.hidden+lazy == 0)
+        return row
+
+    def get_hidden(self, item:Item) -> int:
+        node, lazy = _lazies(self.item2idx[item])[-1]
+        return node.hidden + lazy
+
+    def add_hidden(self, row:int, size:int, delta:int) -> None:
+        """
+        Add `delta` to the `hidden` of the `size` items starting at `row`
+        """
+        if (delta == 0) or (size == 0): return None
+        assert 0 <= row <= len(self)-size, "IndexError"
+        before, rest = _split(self.root, row)
+        block, after = _split(rest, size)
+        _add_hidden(block, delta)
+        self._set_root(_merge(_merge(before, block), after))
+        if LOG:
+            log.append(("IGiver.add_hidden", row, size, delta))
+        if TEST: self.sanity_check()
+
+    def push_item(self, item:Item, hidden:int=0) -> Idx:
         assert isinstance(item, self.Item), "TypeError"
         assert item not in self.item2idx, "Item already added"
-        idx, self.max_idx = Idx(self.max_idx), self.max_idx+1
-        self.items.append(item)
+        idx:Idx = Idx(item, hidden)
+        self._set_root(_merge(self.root, idx))
         self.item2idx[item] = idx
         if LOG:
             log.append(("IGiver.push_item", item, idx))
@@ -147,37 +341,65 @@ class IdxGiver:
         assert isinstance(item, self.Item), "TypeError"
         assert item in self.item2idx, "Item doesn't exist"
         idx:Idx = self.item2idx.pop(item)
-        idx.destroy()
-        _idx:int = idx.value
-        if TEST: assert 0 <= _idx < len(self.items), "Idx out of range"
-        # Fix items
-        self.items.pop(_idx)
-        # Fix idx2item
-        for _i in range(_idx+1, self.max_idx):
-            Idx(_i).set(_i-1)
-        self.max_idx -= 1
+        value:int = idx.value
+        before, rest = _split(self.root, value)
+        removed, after = _split(rest, 1)
+        assert removed is idx, "SanityCheck"
+        self._set_root(_merge(before, after))
+        idx.parent = idx.left = idx.right = None
+        idx.deleted:bool = True
         if LOG:
-            log.append(("IGiver.remove_item", item, idx))
+            log.append(("IGiver.remove_item", item, value))
         if TEST: self.sanity_check()
 
     def moveup(self, item:Item, delta:int) -> None:
+        """
+        Move item up by `delta` rows (down if `delta` is negative)
+        """
+        self.moveup_block(item, 1, delta)
+
+    def moveup_block(self, item:Item, size:int, delta:int) -> None:
+        """
+        Move item and the `size-1` items after it up by `delta` rows (down
+          if `delta` is negative)
+        """
         if delta == 0: return None
         idx:Idx = self.item2idx[item]
-        assert 0 <= idx.value-delta < len(self.items), "Illegal move"
-        # Fix items
-        self.items.insert(idx.value-delta, self.items.pop(idx.value))
-        # Fix idx2item
-        idx.moveup(delta)
+        value:int = idx.value
+        assert 0 <= value-delta <= len(self)-size, "Illegal move"
+        before, rest = _split(self.root, value)
+        block, after = _split(rest, size)
+        before, after = _split(_merge(before, after), value-delta)
+        self._set_root(_merge(_merge(before, block), after))
         if LOG:
-            log.append(("IGiver.moveup", item, idx, delta))
+            log.append(("IGiver.moveup", item, idx, size, delta))
         if TEST: self.sanity_check()
 
     def sanity_check(self) -> None:
-        assert len(self.item2idx) == len(self.items), "SanityCheck"
-        for idx in self.idxs:
-            item:Item = self.items[idx.value]
-            assert idx == self.item2idx[item], "SanityCheck"
+        assert len(self.item2idx) == len(self), "SanityCheck"
+        assert (self.root is None) or (self.root.parent is None), "SanityCheck"
+        for value, idx in enumerate(self.idxs):
+            assert idx.value == value, "SanityCheck"
+            assert self.item2idx[idx.item] is idx, "SanityCheck"
+            assert idx.size == 1+_size(idx.left)+_size(idx.right), "SanityCheck"
+        shown:list[Item] = [idx.item for idx in self.idxs
+                            if self.get_hidden(idx.item) == 0]
+        assert self.shown == len(shown), "SanityCheck"
+        for row, item in enumerate(shown):
+            assert self.shown_row(item) == row, "SanityCheck"
+            assert self.shown_item_at(row) is item, "SanityCheck"
 
     @property
     def idxs(self) -> Iterable[Idx]:
-        yield from map(Idx, range(len(self.items)))
+        """
+        All of the `Idx`s in order
+        """
+        stack:list[Idx] = []
+        node:Idx|None = self.root
+        while stack or (node is not None):
+            while node is not None:
+                stack.append(node)
+                node:Idx|None = node.left
+            node:Idx = stack.pop()
+            yield node
+            node:Idx|None = node.right
@@ -6,6 +6,11 @@ from glob import glob
 import tkinter as tk
 from os import path
 
+try:
+    from .dircache import dircache
+except ImportError:
+    from dircache import dircache
+
 SELF_DIR:str = path.dirname(__file__)
 UNKNOWN_MIMETYPE:str = "application-x-zerosize"
 SYMLINK_FOLLOWS:int = 16 # max levels of symlink to follow (can be 0)
@@ -44,9 +49,8 @@ def _spritepath_from_mimetype(mimetype:MimeType) -> str:
     imagename:str = mimetype.replace("/", "-") + ".png"
     if mimetype not in _MIMETYPE_CACHE:
         for imagepath in _ICON_PATHS:
-            spritepath:str = path.join(imagepath, imagename)
-            if not path.exists(spritepath): continue
-            _MIMETYPE_CACHE[mimetype] = spritepath
+            if not dircache.contains(imagepath, imagename): continue
+            _MIMETYPE_CACHE[mimetype] = path.join(imagepath, imagename)
             break
         else:
             _MIMETYPE_CACHE[mimetype] = _BLANK_SPRITEPATH
@@ -0,0 +1,220 @@
+"""
+Tells the explorer which of the folders that it shows have changed so
+that it only has to re-list those. On linux it uses inotify (through
+ctypes) and the explorer waits on `Watcher.fileno()`. Everywhere else
+(or if inotify can't be used) `PollingWatcher` compares the folders'
+mtimes (one `stat` per folder) whenever `read` is called.
+
+Usage:
+    watcher:Watcher = get_watcher()
+    watcher.watch("/path/to/folder")
+    ...
+    changed:set[str] = watcher.read() # The watched folders that changed
+"""
+from __future__ import annotations
+import ctypes.util
+import ctypes
+import struct
+import sys
+import os
+
+
+# inotify flags from <sys/inotify.h>
+IN_MOVED_FROM:int = 0x00000040
+IN_MOVED_TO:int = 0x00000080
+IN_CREATE:int = 0x00000100
+IN_DELETE:int = 0x00000200
+IN_DELETE_SELF:int = 0x00000400
+IN_MOVE_SELF:int = 0x00000800
+IN_Q_OVERFLOW:int = 0x00004000
+IN_IGNORED:int = 0x00008000
+IN_ONLYDIR:int = 0x01000000
+IN_EXCL_UNLINK:int = 0x04000000
+IN_NONBLOCK:int = os.O_NONBLOCK
+IN_CLOEXEC:int = 0o2000000
+
+# Only changes to the list of children matter to the explorer
+WATCH_MASK:int = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | \
+                 IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK
+EVENT_HEADER:struct.Struct = struct.Struct("iIII") # wd, mask, cookie, len
+READ_SIZE:int = 64*1024
+
+
+class Watcher:
+    __slots__ = ()
+
+    def watch(self, path:str) -> bool:
+        """
+        Start watching a folder. Returns false if it can't be watched.
+        """
+        raise NotImplementedError("Override this method")
+
+    def unwatch(self, path:str) -> None:
+        raise NotImplementedError("Override this method")
+
+    @property
+    def watched(self) -> set[str]:
+        raise NotImplementedError("Override this method")
+
+    def fileno(self) -> int|None:
+        """
+        A file descriptor that becomes readable when `read` has something
+        to return or None if `read` has to be polled.
+        """
+        return None
+
+    def read(self) -> set[str]:
+        """
+        Returns the watched folders that changed since the last call.
+        Never blocks.
+        """
+        raise NotImplementedError("Override this method")
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(Watcher):
+    __slots__ = "fd", "libc", "wd2path", "path2wd"
+
+    def __init__(self) -> InotifyWatcher:
+        assert sys.platform.startswith("linux"), "OSError"
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                                use_errno=True)
+        self.libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p,
+                                                ctypes.c_uint32)
+        self.fd:int = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno:int = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.wd2path:dict[int:str] = {}
+        self.path2wd:dict[str:int] = {}
+
+    def watch(self, path:str) -> bool:
+        if path in self.path2wd:
+            return True
+        wd:int = self.libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                             WATCH_MASK)
+        if wd < 0:
+            return False
+        # The same folder through 2 paths (or after a rename) gets the same wd
+        old_path:str|None = self.wd2path.get(wd, None)
+        if old_path is not None:
+            self.path2wd.pop(old_path)
+        self.wd2path[wd] = path
+        self.path2wd[path] = wd
+        return True
+
+    def unwatch(self, path:str) -> None:
+        wd:int|None = self.path2wd.pop(path, None)
+        if wd is not None:
+            self.wd2path.pop(wd, None)
+            # Fails if the folder is already gone which is fine
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    @property
+    def watched(self) -> set[str]:
+        return set(self.path2wd)
+
+    def fileno(self) -> int|None:
+        return self.fd
+
+    def read(self) -> set[str]:
+        changed:set[str] = set()
+        while True:
+            try:
+                data:bytes = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            i:int = 0
+            while i < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, i)
+                i += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed.update(self.path2wd)
+                    continue
+                path:str|None = self.wd2path.get(wd, None)
+                if path is None:
+                    continue
+                changed.add(path)
+                if mask & IN_IGNORED: # The kernel removed the watch
+                    self.wd2path.pop(wd)
+                    self.path2wd.pop(path)
+        return changed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd:int = -1
+        self.wd2path.clear()
+        self.path2wd.clear()
+
+
+class PollingWatcher(Watcher):
+    __slots__ = "mtimes"
+
+    def __init__(self) -> PollingWatcher:
+        self.mtimes:dict[str:int|None] = {}
+
+    @staticmethod
+    def _mtime(path:str) -> int|None:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def watch(self, path:str) -> bool:
+        if path not in self.mtimes:
+            self.mtimes[path] = self._mtime(path)
+        return True
+
+    def unwatch(self, path:str) -> None:
+        self.mtimes.pop(path, None)
+
+    @property
+    def watched(self) -> set[str]:
+        return set(self.mtimes)
+
+    def read(self) -> set[str]:
+        changed:set[str] = set()
+        for path, old_mtime in self.mtimes.items():
+            mtime:int|None = self._mtime(path)
+            if mtime != old_mtime:
+                self.mtimes[path] = mtime
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        self.mtimes.clear()
+
+
+def get_watcher() -> Watcher:
+    """
+    Returns an `InotifyWatcher` if possible, otherwise a `PollingWatcher`
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher()
+
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+
+    for watcher in (get_watcher(), PollingWatcher()):
+        with TemporaryDirectory() as folder:
+            sub:str = os.path.join(folder, "sub")
+            os.mkdir(sub)
+            watcher.watch(folder)
+            watcher.watch(sub)
+            print(watcher.__class__.__name__, watcher.read())
+            os.utime(sub, ns=(0, 0)) # mtime resolution for PollingWatcher
+            open(os.path.join(sub, "file"), "w").close()
+            print(watcher.__class__.__name__, watcher.read() == {sub})
+            os.rename(os.path.join(sub, "file"), os.path.join(folder, "file"))
+            print(watcher.__class__.__name__, watcher.read() == {sub, folder})
+        watcher.close()
@@ -12,7 +12,6 @@ os.chdir(os.path.dirname(os.path.abspath(os.path.realpath(__file__))))
 
 from file_explorer.expanded_explorer import ExpandedExplorer, isfolder, Item
 from bettertk.betterframe import make_bind_frame
-from bettertk.betterframe import BetterFrame
 from bettertk.betterscrollbar import BetterScrollBarVertical, \
                                      BetterScrollBarHorizontal
 from bettertk.messagebox import askyesno, tell as telluser
@@ -73,7 +72,7 @@ class App:
         if ipc:
             ipc.bind("focus", lambda e: self.focus_force(), threaded=False)
             ipc.bind("open", lambda e: self.open(e.data), threaded=False)
-            self.root.after(100, self._check_ipc_queue, ipc)
+            ipc.attach_tk(self.root)
         pannedwindow = tk.PanedWindow(self.root, orient="horizontal", bd=0,
                                       height=settings.window.height,
                                       sashwidth=4, bg="grey")
@@ -109,18 +108,24 @@ class App:
         rem.grid(row=1, column=3, sticky="news")
         left_frame.grid_rowconfigure(3, weight=1)
         left_frame.grid_columnconfigure((1, 3), weight=1)
-        self.explorer_frame = BetterFrame(left_frame, bg="black",
-                                     HScrollBarClass=BetterScrollBarHorizontal,
-                                     VScrollBarClass=BetterScrollBarVertical,
-                                     hscroll=True, vscroll=True)
+        self.explorer_frame = tk.Frame(left_frame, bg="black", bd=0,
+                                       highlightthickness=0)
         self.explorer_frame.grid(row=3, column=1, columnspan=3, sticky="news")
-        self.explorer_frame.config(hide_hscroll=settings.explorer.hide_h_scroll,
-                                   hide_vscroll=settings.explorer.hide_v_scroll)
         VirtualEvents(self.explorer_frame) # Must be before the BindFrame
         make_bind_frame(self.explorer_frame)
         self.explorer = ExpandedExplorer(self.explorer_frame,
                                          font=settings.explorer.font,
                                          monofont=settings.explorer.monofont)
+        vscroll = BetterScrollBarVertical(self.explorer_frame,
+                                          command=self.explorer.yview)
+        vscroll.grid(row=1, column=2, sticky="news")
+        vscroll.hide:bool = settings.explorer.hide_v_scroll
+        hscroll = BetterScrollBarHorizontal(self.explorer_frame,
+                                            command=self.explorer.xview)
+        hscroll.grid(row=2, column=1, sticky="news")
+        hscroll.hide:bool = settings.explorer.hide_h_scroll
+        self.explorer.yscrollcommand = vscroll.set
+        self.explorer.xscrollcommand = hscroll.set
         self.explorer_frame.bind("<<Explorer-Open>>", self.open_tab_explorer)
         self.explorer_frame.bind("<<Explorer-Expanded>>",
                                  lambda _: self._explorer_expand())
@@ -235,7 +240,7 @@ class App:
         return False
 
     def open_tab_explorer(self, _:tk.Event) -> None:
-        path:str = self.explorer.selected.item.fullpath
+        path:str = self.explorer.selected.fullpath
         self.open_tab(path)
 
     def open_tab(self, filepath:str) -> None:
@@ -267,15 +272,10 @@ class App:
         self.root.update_idletasks()
 
         added, expanded = self._get_explorer_state()
-        if hasattr(self.explorer_frame, "outter"):
-            true_explorer_frame:tk.Frame = self.explorer_frame.outter
-        else:
-            # Unimplemented - depricated
-            true_explorer_frame:tk.Frame = self.explorer_frame.master_frame
         curr_text:tk.Text = self.page_to_text(self.notebook.curr_page)
         curr_text_path:str = None if curr_text is None else curr_text.filepath
         # Update settings.explorer
-        settings.explorer.width = true_explorer_frame.winfo_width()
+        settings.explorer.width = self.explorer_frame.winfo_width()
         # Update settings.notebook
         settings.notebook.width = self.notebook.winfo_width()
         settings.notebook.open = self._get_notebook_state()
@@ -305,7 +305,7 @@ class App:
     def explorer_remove_folder(self) -> None:
         if self.explorer.selected is None:
             return None
-        selected:Item = self.explorer.selected.item
+        selected:Item = self.explorer.selected
         if selected not in self.explorer.root.children:
             return None
         self.explorer.remove(selected)
@@ -389,12 +389,6 @@ class App:
         self.root.mainloop()
 
     # IPC Messages
-    def _check_ipc_queue(self, ipc:IPC) -> None:
-        try:
-            ipc.call_queued_events()
-        finally:
-            self.root.after(200, self._check_ipc_queue, ipc)
-
     def focus_force(self) -> None:
         # Bring to current workspace
         self.root.move_to_current_workspace()
@@ -1,8 +1,13 @@
 from __future__ import annotations
 from shutil import which
+from sys import executable
+import json
+import os
 
 from ..runmanager import RunManager as BaseRunManager
-from ..helpers.compiler import Compiler
+from ..helpers.compiler import Compiler, BUILDER_PATH, build_cache_folder, \
+                               user_cache_folder, get_leading_system_includes
+from settings.settings import curr as settings
 
 
 EXE:str = which("g++")
@@ -58,23 +63,43 @@ class RunManager(BaseRunManager):
             if self.text.filepath.endswith(ext): break
         else:
             return False
-        self.term.queue(["print!", self.center("Pre-Compiling", "-")],
-                        condition=(0).__eq__)
+        self.queue(["print!", self.center("Pre-Compiling", "-")])
         compiler:Compiler = Compiler(self.effective_cwd, DEFAULT_FLAGS, EXE,
                                      GET_INCLUDES_CMD, HEADER_EXTS, SRC_EXTS)
         compiler.add_root(self.text.filepath)
-        command:list[str] = compiler.get_cmd()
+        if settings.build.incremental:
+            command:list[str] = self.get_build_cmd(compiler)
+        else:
+            command:list[str] = compiler.get_cmd()
         if compiler.links:
             super().set_env_var("LIBRARY_PATH", set(compiler.links))
             super().set_env_var("LD_LIBRARY_PATH", set(compiler.links))
         cmd:str = " ".join(command) + "\n"
-        self.term.queue(["print!", cmd], condition=(0).__eq__)
+        self.queue(["print!", cmd])
         if compiler.error:
             msg:str = compiler.error + "\n"
-            self.term.queue(["print!", msg], condition=(0).__eq__)
+            self.queue(["print!", msg])
             return False
         return super().compile(command=command,
                                print_str=self.center("Compiling", "-"))
 
+    def get_build_cmd(self, compiler:Compiler) -> list[str]:
+        pch:dict|None = None
+        if settings.build.precompiled_headers:
+            filepath:str = os.path.abspath(self.text.filepath)
+            headers:list[str] = get_leading_system_includes(filepath)
+            if headers:
+                pch:dict = {"headers":headers, "files":[filepath],
+                            "cache":user_cache_folder("pch")}
+        plan:dict = compiler.get_build_plan(
+                                 os.path.join(self.tmp.name, "executable"),
+                                 build_cache_folder(self.effective_cwd),
+                                 profile=settings.build.profile,
+                                 jobs=settings.build.jobs, pch=pch)
+        plan_path:str = os.path.join(self.tmp.name, "build.json")
+        with open(plan_path, "w") as file:
+            file.write(json.dumps(plan))
+        return [executable, BUILDER_PATH, plan_path]
+
     def execute(self, args:Iterable[str]) -> None:
         super().execute(args, print_str=self.center("Running", "-"))
@@ -0,0 +1,275 @@
+"""
+An incremental build driver for C/C++. The run managers write a build plan
+(see `Compiler.get_build_plan`) as json and run this file on it inside the
+terminal:
+    python3 builder.py plan.json
+
+Every translation unit is compiled to its own object file in the plan's
+cache folder (only the newest object of each translation unit is kept).
+An object is reused if the compiler, the compile flags, the source and all
+of the headers it included (found using -MMD) are the same as when it was
+built. The translation units are compiled in parallel and the program is
+only relinked if one of the objects (or the link flags) changed.
+
+Plan:
+    compiler: str         The compiler executable
+    compile_flags: list   Flags used to compile each translation unit
+    link_flags: list      Flags used for linking (including -L and -l)
+    files: list[str]      The translation units
+    output: str           Where to put the executable
+    cache: str            The folder for the objects and manifests
+    jobs: int             Max number of parallel compiles (0 for all cores)
+    cwd: str              The folder to run the compiler in
+    pch: dict|None        Optional precompiled header (see below)
+
+If "pch" is given, it's a dict with "headers" (like "<vector>"), "files" (the
+translation units to use it for) and "cache" (a folder shared between
+projects). The headers are precompiled (once per compiler, flags and
+headers) and force-included in those files using -include. If it fails to
+build, the files are compiled without it.
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import run, PIPE, STDOUT
+from hashlib import sha256
+import shutil
+import shlex
+import json
+import sys
+import os
+
+
+MANIFEST_VERSION:int = 1
+HASH_CHUNK:int = 1<<16
+# How many precompiled headers to keep in the pch cache
+PCH_CACHE_SIZE:int = 8
+
+
+def hash_file(filepath:str) -> str|None:
+    hasher = sha256()
+    try:
+        with open(filepath, "rb") as file:
+            while (chunk:=file.read(HASH_CHUNK)):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+def hash_strings(*strings:str) -> str:
+    hasher = sha256()
+    for string in strings:
+        hasher.update(string.encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+def parse_depfile(filepath:str) -> list[str]:
+    """
+    Returns all of the prerequisites in a make-style depfile (from -MMD)
+    """
+    with open(filepath, "r") as file:
+        data:str = file.read().replace("\\\n", " ")
+    _, _, deps = data.partition(": ")
+    return [dep for dep in shlex.split(deps.split("\n", 1)[0]) if dep]
+
+
+class Builder:
+    __slots__ = "compiler", "compile_flags", "link_flags", "files", "output", \
+                "cache", "jobs", "cwd", "_compiler_id", "pch", "_pch_flags"
+
+    def __init__(self, plan:dict) -> Builder:
+        self.compile_flags:list[str] = list(plan["compile_flags"])
+        self.link_flags:list[str] = list(plan["link_flags"])
+        self.jobs:int = plan.get("jobs", 0) or os.cpu_count() or 1
+        self.cwd:str = plan.get("cwd", None) or os.getcwd()
+        self.files:list[str] = list(plan["files"])
+        self.compiler:str = plan["compiler"]
+        self.output:str = plan["output"]
+        self.cache:str = plan["cache"]
+        self.pch:dict|None = plan.get("pch", None)
+        self._pch_flags:list[str] = []
+        self._compiler_id:str = self._get_compiler_id()
+
+    def _get_compiler_id(self) -> str:
+        # A compiler upgrade must invalidate all of the objects
+        exe:str = shutil.which(self.compiler) or self.compiler
+        try:
+            stat:os.stat_result = os.stat(exe)
+            return f"{os.path.realpath(exe)}:{stat.st_size}:{stat.st_mtime_ns}"
+        except OSError:
+            return exe
+
+    def build(self) -> int:
+        os.makedirs(self.cache, exist_ok=True)
+        if self.pch:
+            header:str|None = self._build_pch()
+            if header is not None:
+                self._pch_flags:list[str] = ["-include", header]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            results:list = list(pool.map(self._object, self.files))
+        objects:list[str] = []
+        failed:bool = False
+        cached:int = 0
+        for object, was_cached, output in results:
+            if output:
+                print(output, end="" if output.endswith("\n") else "\n")
+            if object is None:
+                failed:bool = True
+            objects.append(object)
+            cached += was_cached
+        print(f"builder: {cached}/{len(self.files)} objects from the cache",
+              flush=True)
+        if failed:
+            return 1
+        return self._link(objects)
+
+    def _object(self, source:str) -> tuple[str|None,bool,str]:
+        """
+        Returns the object file for `source` (None on error), if it came
+        from the cache and the compiler's output
+        """
+        source:str = os.path.abspath(os.path.join(self.cwd, source))
+        flags:list[str] = self.compile_flags
+        if self._pch_flags and (source in self.pch["files"]):
+            flags:list[str] = self._pch_flags + flags
+        key:str = hash_strings(str(MANIFEST_VERSION), self._compiler_id,
+                               source, *flags)
+        manifest_path:str = os.path.join(self.cache, key+".json")
+        object:str|None = self._cached_object(key, manifest_path)
+        if object is not None:
+            return object, True, ""
+
+        tmp_object:str = os.path.join(self.cache, f"{key}.{os.getpid()}.o")
+        depfile:str = tmp_object.removesuffix(".o") + ".d"
+        command:list[str] = [self.compiler, *flags, "-c", source,
+                             "-o", tmp_object, "-MMD", "-MF", depfile]
+        proc = run(command, cwd=self.cwd, stdout=PIPE, stderr=STDOUT)
+        output:str = proc.stdout.decode("utf-8", errors="replace")
+        if proc.returncode != 0:
+            for filepath in (tmp_object, depfile):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            return None, False, output
+
+        try:
+            deps:dict[str:str] = {}
+            for dep in parse_depfile(depfile):
+                dep:str = os.path.abspath(os.path.join(self.cwd, dep))
+                deps[dep] = hash_file(dep)
+            os.remove(depfile)
+            old_object:str|None = self._manifest_object(key, manifest_path)
+            object:str = os.path.join(self.cache,
+                                      self._deps_key(key, deps)+".o")
+            os.replace(tmp_object, object)
+            with open(manifest_path+".tmp", "w") as file:
+                file.write(json.dumps({"deps":deps}))
+            os.replace(manifest_path+".tmp", manifest_path)
+            # Only the newest object of each source is kept
+            if (old_object is not None) and (old_object != object) and \
+               os.path.exists(old_object):
+                os.remove(old_object)
+        except OSError as error:
+            for filepath in (tmp_object, depfile):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            return None, False, f"{output}builder: {source}: {error}\n"
+        return object, False, output
+
+    def _build_pch(self) -> str|None:
+        """
+        Returns the header to force-include (its .gch is next to it) or None
+        if the precompiled header couldn't be built
+        """
+        headers:list[str] = list(self.pch["headers"])
+        key:str = hash_strings(str(MANIFEST_VERSION), self._compiler_id,
+                               *self.compile_flags, *headers)
+        folder:str = os.path.join(self.pch["cache"], key[:32])
+        header:str = os.path.join(folder, "pch.hpp")
+        if os.path.exists(header+".gch"):
+            os.utime(folder) # Used for picking which ones to delete
+            return header
+
+        print(f"builder: precompiling {' '.join(headers)}", flush=True)
+        os.makedirs(folder, exist_ok=True)
+        with open(header, "w") as file:
+            file.write("".join(f"#include {name}\n" for name in headers))
+        tmp_gch:str = f"{header}.{os.getpid()}.gch"
+        command:list[str] = [self.compiler, *self.compile_flags,
+                             "-x", "c++-header", header, "-o", tmp_gch]
+        proc = run(command, cwd=self.cwd, stdout=PIPE, stderr=STDOUT)
+        if proc.returncode != 0:
+            print("builder: couldn't precompile the headers:")
+            print(proc.stdout.decode("utf-8", errors="replace"), flush=True)
+            shutil.rmtree(folder, ignore_errors=True)
+            return None
+        os.replace(tmp_gch, header+".gch")
+        self._prune_pch_cache()
+        return header
+
+    def _prune_pch_cache(self) -> None:
+        root:str = self.pch["cache"]
+        folders:list[str] = [os.path.join(root, name)
+                             for name in os.listdir(root)]
+        folders.sort(key=os.path.getmtime, reverse=True)
+        for folder in folders[PCH_CACHE_SIZE:]:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _read_manifest(self, manifest_path:str) -> dict[str:str]|None:
+        try:
+            with open(manifest_path, "r") as file:
+                return json.loads(file.read())["deps"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _manifest_object(self, key:str, manifest_path:str) -> str|None:
+        """
+        The object that the manifest currently points to (even if stale)
+        """
+        deps:dict[str:str]|None = self._read_manifest(manifest_path)
+        if deps is None:
+            return None
+        return os.path.join(self.cache, self._deps_key(key, deps)+".o")
+
+    def _cached_object(self, key:str, manifest_path:str) -> str|None:
+        deps:dict[str:str]|None = self._read_manifest(manifest_path)
+        if deps is None:
+            return None
+        for dep, digest in deps.items():
+            if hash_file(dep) != digest:
+                return None
+        object:str = os.path.join(self.cache, self._deps_key(key, deps)+".o")
+        if not os.path.exists(object):
+            return None
+        return object
+
+    @staticmethod
+    def _deps_key(key:str, deps:dict[str:str]) -> str:
+        return hash_strings(key, *(f"{k}={v}" for k,v in sorted(deps.items())))
+
+    def _link(self, objects:list[str]) -> int:
+        key:str = hash_strings(self._compiler_id, self.output, *objects,
+                               *self.link_flags)
+        stamp_path:str = os.path.join(self.cache, "link.stamp")
+        try:
+            with open(stamp_path, "r") as file:
+                up_to_date:bool = (file.read() == key)
+        except OSError:
+            up_to_date:bool = False
+        if up_to_date and os.path.exists(self.output):
+            print("builder: nothing changed, not linking", flush=True)
+            return 0
+        command:list[str] = [self.compiler, "-o", self.output, *objects,
+                             *self.link_flags]
+        exit_code:int = run(command, cwd=self.cwd).returncode
+        if exit_code == 0:
+            with open(stamp_path, "w") as file:
+                file.write(key)
+        return exit_code
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <plan.json>", file=sys.stderr)
+        sys.exit(2)
+    with open(sys.argv[1], "r") as file:
+        plan:dict = json.loads(file.read())
+    sys.exit(Builder(plan).build())
@@ -1,11 +1,86 @@
 from __future__ import annotations
-from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+from subprocess import run, PIPE, DEVNULL, TimeoutExpired
+from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
-from os import path, listdir
-from os import environ
+from itertools import repeat
+from os import path, listdir, stat
+from os import environ, cpu_count
+from hashlib import sha256
 import shlex
 
 
+BUILDER_PATH:str = path.join(path.dirname(__file__), "builder.py")
+# Flags that only make sense when linking
+LINK_ONLY_PREFIXES:tuple[str] = ("-l", "-L", "-rdynamic")
+# Flags dropped for the debug build profile (everything that makes the
+#   compiler slow to run but the program fast)
+SLOW_FLAG_PREFIXES:tuple[str] = ("-flto", "-O", "-funroll")
+DEBUG_PROFILE_FLAGS:tuple[str] = ("-O0", "-g")
+# How many `gcc -MM`s to run at the same time and for how long (in seconds)
+SCAN_JOBS:int = cpu_count() or 1
+SCAN_TIMEOUT:float = 3
+# The results of `gcc -MM` for (filepath, cwd, command, include path). Each
+#   entry stores the (mtime, size) of every file in the result when it was
+#   scanned so it is only reused if none of them changed. The include path
+#   has the stamps of its folders so adding/removing a header in one of
+#   them (which can change what an #include resolves to) invalidates it
+Stamp:type = tuple[int,int]|None
+IncludePath:type = tuple[tuple[str,Stamp]]
+ScanKey:type = tuple[str,str,tuple[str],IncludePath]
+# Flags that add a folder to the include path
+INCLUDE_PATH_FLAGS:tuple[str] = ("-I", "-iquote", "-isystem", "-idirafter")
+SCAN_CACHE:dict[ScanKey:tuple[dict[str:Stamp],list[str]]] = {}
+SCAN_CACHE_SIZE:int = 10_000
+
+
+def get_stamp(filepath:str) -> Stamp:
+    try:
+        result = stat(filepath)
+    except OSError:
+        return None
+    return (result.st_mtime_ns, result.st_size)
+
+
+def user_cache_folder(*names:str) -> str:
+    root:str = environ.get("XDG_CACHE_HOME", "") or \
+               path.join(path.expanduser("~"), ".cache")
+    return path.join(root, "bismuth-184", *names)
+
+def build_cache_folder(project:str) -> str:
+    """
+    Returns the folder where the incremental builds of `project` keep their
+    object files. It's inside $XDG_CACHE_HOME (or ~/.cache)
+    """
+    key:str = sha256(path.realpath(project).encode("utf-8")).hexdigest()
+    return user_cache_folder("build", key[:16])
+
+def get_leading_system_includes(filepath:str) -> list[str]:
+    """
+    Returns the `#include <...>`s at the start of a file (before any code),
+    for example ["<bits/stdc++.h>"]. Blank lines and comments are skipped.
+    """
+    includes:list[str] = []
+    try:
+        with open(filepath, "r", errors="ignore") as file:
+            for line in file:
+                line:str = line.strip()
+                if (not line) or line.startswith("//"):
+                    continue
+                if not line.startswith("#"):
+                    break
+                directive:str = line.removeprefix("#").strip()
+                if not directive.startswith("include"):
+                    break
+                header:str = directive.removeprefix("include").strip()
+                header:str = header.split("//", 1)[0].strip()
+                if not (header.startswith("<") and header.endswith(">")):
+                    break
+                includes.append(header)
+    except OSError:
+        return []
+    return includes
+
+
 class Compiler:
     """
     % Comment
@@ -30,7 +105,8 @@ class Compiler:
 
     __slots__ = "includes", "files", "links", "_visited", "_symlinks", \
                 "flags", "error", "effective_cwd", "default_flags", \
-                "compile_exe", "get_includes_cmd", "header_exts", "src_exts"
+                "compile_exe", "get_includes_cmd", "header_exts", "src_exts", \
+                "_listdirs"
 
     def __init__(self, effective_cwd:str, default_flags:set[str],
                  compile_exe:list[str], get_includes_cmd:list[str],
@@ -46,6 +122,7 @@ class Compiler:
 
         self.error:str = ""
         self._visited:set[str] = set()
+        self._listdirs:dict[str:set[str]] = {}
         self.files:set[str] = set()
         self.includes:set[str] = set()
         self.links:dict[str:set[str]] = defaultdict(set)
@@ -62,13 +139,43 @@ class Compiler:
         command += sorted(self.files, key=len, reverse=True)
         command += self._get_flags()
         # Linked libraries
+        command += self._get_link_args()
+        return command
+
+    def get_build_plan(self, output:str, cache:str, *, profile:str="release",
+                       jobs:int=0, pch:dict|None=None) -> dict:
+        """
+        Returns a plan for `builder.py` that builds the same program as
+        `get_cmd` but one translation unit at a time (with an object cache).
+        The "debug" profile drops optimisation flags (and LTO) so that the
+        program compiles faster. `pch` is passed to the builder as is.
+        """
+        assert profile in ("release", "debug"), "ValueError"
+        flags:list[str] = self._get_flags()
+        if profile == "debug":
+            flags:list[str] = [flag for flag in flags
+                               if not flag.startswith(SLOW_FLAG_PREFIXES)]
+            flags += [flag for flag in DEBUG_PROFILE_FLAGS if flag not in flags]
+        compile_flags:list[str] = [f"-I{include}"
+                                   for include in sorted(self.includes)]
+        compile_flags += [flag for flag in flags
+                          if not flag.startswith(LINK_ONLY_PREFIXES)]
+        # The compiler ignores compile-only flags when linking but it needs
+        #   flags like -flto and -fsanitize=...
+        link_flags:list[str] = flags + self._get_link_args()
+        return {"compiler":self.compile_exe, "compile_flags":compile_flags,
+                "link_flags":link_flags, "files":sorted(self.files),
+                "output":output, "cache":cache, "jobs":jobs,
+                "cwd":self.effective_cwd, "pch":pch}
+
+    def _get_link_args(self) -> list[str]:
+        args:list[str] = []
         for folder, libs in sorted(self.links.items()):
             if folder:
-                command += [f"-L{path.realpath(folder)}"]
+                args += [f"-L{path.realpath(folder)}"]
             for lib in libs:
-                command += [f"-l{lib}"]
-
-        return command
+                args += [f"-l{lib}"]
+        return args
 
     def add_root(self, filepath:str) -> Compiler:
         filepath:str = path.abspath(filepath)
@@ -83,26 +190,94 @@ class Compiler:
         return self
 
     def _add(self, filepath:str) -> None:
-        filepath:str = path.abspath(filepath)
-        if (not path.exists(filepath)) or (filepath in self.files):
-            return None
+        """
+        Add a source file and (recursively) the source files next to the
+        headers that it includes. Each level of the include graph is
+        scanned in parallel.
+        """
+        todo:list[str] = [path.abspath(filepath)]
+        todo:list[str] = [filepath for filepath in todo if self._new(filepath)]
+        with ThreadPoolExecutor(max_workers=SCAN_JOBS) as pool:
+            while todo:
+                self.files.update(todo)
+                next_todo:list[str] = []
+                # `self.includes` can grow while this level is scanned
+                folders:tuple[str] = tuple(sorted(self.includes))
+                include_path:IncludePath = self._get_include_path(folders)
+                results = pool.map(self._scan, todo, repeat(folders),
+                                   repeat(include_path))
+                for filepath, includes in zip(todo, results):
+                    if includes is None:
+                        continue
+                    for source in self._get_sources(filepath, includes):
+                        if self._new(source) and (source not in next_todo):
+                            next_todo.append(source)
+                todo:list[str] = next_todo
+
+    def _new(self, filepath:str) -> bool:
+        if (not self._exists(filepath)) or (filepath in self.files):
+            return False
         for ext in self.src_exts:
-            if filepath.endswith(ext): break
-        else:
-            return None
-        self.files.add(filepath)
-        # print(f"[DEBUG]: Adding {filepath!r}")
+            if filepath.endswith(ext):
+                return True
+        return False
+
+    def _exists(self, filepath:str) -> bool:
+        """
+        `path.exists` that caches the folder listings (for this build)
+        """
+        folder, name = path.split(filepath)
+        if folder not in self._listdirs:
+            try:
+                self._listdirs[folder] = set(listdir(folder))
+            except OSError:
+                self._listdirs[folder] = set()
+        return name in self._listdirs[folder]
+
+    def _get_include_path(self, extra:tuple[str]) -> IncludePath:
+        """
+        The folders (in order) that `gcc -MM` searches for includes: the
+        ones in `get_includes_cmd` and then `extra`, with their stamps
+        """
+        folders:list[str] = []
+        cmd:list[str] = self.get_includes_cmd
+        for i, arg in enumerate(cmd):
+            for flag in INCLUDE_PATH_FLAGS:
+                if arg == flag:
+                    if i+1 < len(cmd):
+                        folders.append(cmd[i+1])
+                elif arg.startswith(flag):
+                    folders.append(arg.removeprefix(flag))
+        folders.extend(extra)
+        return tuple((folder, get_stamp(path.join(self.effective_cwd, folder)))
+                     for folder in folders)
+
+    def _scan(self, filepath:str, folders:tuple[str],
+              include_path:IncludePath) -> list[str]|None:
+        """
+        Returns the includes of `filepath` using `gcc -MM` (or the cache)
+        with the extra include `folders` (`include_path` has their stamps).
+        On error, sets `self.error` and returns None. Called from a thread.
+        """
+        key:ScanKey = (filepath, self.effective_cwd,
+                       tuple(self.get_includes_cmd), include_path)
+        stamps, includes = SCAN_CACHE.get(key, (None, None))
+        if stamps is not None:
+            if all(get_stamp(dep) == stamp for dep, stamp in stamps.items()):
+                return includes
+        stamp:Stamp = get_stamp(filepath)
+        # Scan with the same include folders that the compiler will use
+        command:list[str] = self.get_includes_cmd + \
+                            [f"-I{folder}" for folder in folders]
 
-        proc:Popen = Popen(self.get_includes_cmd+[filepath], shell=False,
-                           stdout=PIPE, stderr=PIPE, stdin=DEVNULL,
-                           env=environ, cwd=self.effective_cwd)
         try:
-            proc.wait(3)
+            proc = run(command+[filepath], shell=False,
+                       stdout=PIPE, stderr=PIPE, stdin=DEVNULL, env=environ,
+                       cwd=self.effective_cwd, timeout=SCAN_TIMEOUT)
         except TimeoutExpired:
-            proc.kill()
             self.error:str = "gcc -MM took too long"
             return None
-        includes:str = proc.stdout.read().decode("utf-8", errors="ignore")
+        includes:str = proc.stdout.decode("utf-8", errors="ignore")
         if not includes.startswith(":"):
             self.error:str = f"gcc -MM unexpected output: {includes!r}"
             return None
@@ -110,22 +285,38 @@ class Compiler:
                                       .replace("\\\n", "") \
                                       .replace("\n", " ") \
                                       .strip(" ")
+        includes:list[str] = [inc for inc in shlex.split(parsed_includes) if inc]
 
-        base:str = path.dirname(path.abspath(filepath))
-        for include in shlex.split(parsed_includes):
-            if not include: continue
+        # gcc prints the paths that it opened (relative to its cwd)
+        stamps:dict[str:Stamp] = {filepath: stamp}
+        for include in includes:
+            full_include:str = path.join(self.effective_cwd, include)
+            stamps.setdefault(full_include, get_stamp(full_include))
+        if len(SCAN_CACHE) > SCAN_CACHE_SIZE:
+            SCAN_CACHE.clear()
+        SCAN_CACHE[key] = (stamps, includes)
+        return includes
+
+    def _get_sources(self, filepath:str, includes:list[str]) -> list[str]:
+        sources:list[str] = []
+        base:str = path.dirname(filepath)
+        for include in includes:
             full_include:str = path.join(base, include)
             for inc_ext in self.header_exts:
                 if full_include.endswith(inc_ext):
                     pure_full_include:str = full_include.removesuffix(inc_ext)
                     for c_ext in self.src_exts:
                         full_c:str = pure_full_include + c_ext
-                        if path.exists(full_c):
-                            self._add(full_c)
-            self._add_superlib_folder(path.dirname(full_include))
+                        if self._exists(full_c):
+                            sources.append(full_c)
+            folder:str = path.dirname(full_include)
+            if folder not in self._visited:
+                self._visited.add(folder)
+                self._add_superlib_folder(folder)
+        return sources
 
     def _get_flags(self) -> list[str]:
-        flags:set[str] = self.default_flags
+        flags:set[str] = self.default_flags.copy()
         for flag in self.flags:
             if flag.startswith("+"):
                 flags.discard("-" + flag.removeprefix("+"))
@@ -176,3 +367,57 @@ class Compiler:
                 if path.isfile(fullfolder):
                     fullfolder:str = ""
                 self.links[fullfolder].add(lib)
+
+
+def make_synthetic_project(folder:str, n:int=500) -> str:
+    """
+    Writes a project with n/2 sources and n/2 headers into `folder` where
+    source i includes the headers of 2i+1 and 2i+2 (so the include graph
+    is a binary tree). Returns the path to the root source file.
+    """
+    assert n % 2 == 0, "ValueError"
+    for i in range(n//2):
+        children:list[int] = [j for j in (2*i+1, 2*i+2) if j < n//2]
+        with open(path.join(folder, f"file{i}.h"), "w") as file:
+            file.write(f"#pragma once\nint f{i}();\n")
+        with open(path.join(folder, f"file{i}.cpp"), "w") as file:
+            file.write(f'#include "file{i}.h"\n')
+            for j in children:
+                file.write(f'#include "file{j}.h"\n')
+            calls:str = "".join(f"+f{j}()" for j in children)
+            file.write(f"int f{i}() {{ return 1{calls}; }}\n")
+    with open(path.join(folder, "file0.cpp"), "a") as file:
+        file.write("int main() { return f0() == 0; }\n")
+    return path.join(folder, "file0.cpp")
+
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+    from shutil import which
+    from time import perf_counter
+
+    def scan(folder:str, root:str) -> tuple[Compiler,float]:
+        compiler:Compiler = Compiler(folder, [], exe, [exe, "-MT", "", "-MM",
+                                     "-MG"], {".h"}, {".cpp"})
+        start:float = perf_counter()
+        compiler.add_root(root)
+        return compiler, perf_counter()-start
+
+    exe:str = which("g++")
+    with TemporaryDirectory() as folder:
+        root:str = make_synthetic_project(folder, 500)
+        SCAN_JOBS:int = 1
+        compiler, serial = scan(folder, root)
+        assert not compiler.error, compiler.error
+        assert len(compiler.files) == 250, len(compiler.files)
+        SCAN_CACHE.clear()
+        SCAN_JOBS:int = cpu_count() or 1
+        _, parallel = scan(folder, root)
+        _, cached = scan(folder, root)
+        with open(path.join(folder, "file7.h"), "a") as file:
+            file.write("#include \"file8.h\"\n")
+        compiler, changed = scan(folder, root)
+        assert not compiler.error, compiler.error
+        assert len(compiler.files) == 250, len(compiler.files)
+        print(f"Scanning 500 files: {serial=:.3f}s {parallel=:.3f}s "
+              f"({SCAN_JOBS} jobs) {cached=:.3f}s {changed=:.3f}s")
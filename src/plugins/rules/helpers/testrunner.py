@@ -0,0 +1,211 @@
+"""
+Runs the test cases of a program in parallel. The run managers write a
+plan as json and run this file on it inside the terminal (after building
+the program once):
+    python3 testrunner.py plan.json
+
+Cases are found next to the source file:
+    * stdin/expected pairs: "<name>.in" or "<name>.stdin" with a matching
+      "<name>.out", "<name>.ans" or "<name>.expected". They are looked for in
+      the source's folder (only names that start with the source's name)
+      and in its "tests" folder. The program passes if its stdout matches
+      (ignoring trailing whitespace).
+    * test files: "test_<source name>*" or "<source name>_test*" files with
+      the same extension as the source. They are run using the plan's
+      "test" command and pass if they exit with 0.
+
+Every case gets its own timeout. The results are streamed as they finish,
+followed by a summary and the diffs of the failing cases (which are also
+saved in "<state>.diffs"). A case is PASS, SKIP (it couldn't be run, eg. no
+test command) or one of `FAILED_STATUSES`. Skipped cases aren't failures.
+With "only_failed", only the cases that failed last time (according to the
+state file) are run.
+
+Plan:
+    source: str           The source file
+    run: list[str]        The command to run the program
+    test: list[str]|None  The command to run a test file ("{test}" is
+                          replaced with its path)
+    timeout: float        Per case timeout (in seconds)
+    jobs: int             Max number of cases at once (0 for all cores)
+    state: str            Where to keep the results between runs
+    only_failed: bool     Only rerun the cases that failed last time
+    cwd: str              The folder to run the cases in
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from subprocess import run, PIPE, TimeoutExpired
+from time import perf_counter
+import difflib
+import json
+import sys
+import os
+
+
+STDIN_EXTS:tuple[str] = (".in", ".stdin")
+EXPECTED_EXTS:tuple[str] = (".out", ".ans", ".expected")
+TESTS_FOLDER:str = "tests"
+MAX_DIFF_LINES:int = 40
+MAX_STDERR:int = 2000
+FAILED_STATUSES:tuple[str] = ("FAIL", "ERROR", "TIME")
+# (name, stdin path, expected path) or (name, test file, None)
+Case:type = tuple[str,str,str|None]
+
+
+def find_cases(source:str) -> list[Case]:
+    folder, filename = os.path.split(os.path.abspath(source))
+    stem, ext = os.path.splitext(filename)
+    cases:list[Case] = []
+    folders:list[tuple[str,str]] = [(folder, stem),
+                                    (os.path.join(folder, TESTS_FOLDER), "")]
+    for case_folder, prefix in folders:
+        try:
+            names:list[str] = sorted(entry.name for entry in
+                                     os.scandir(case_folder) if entry.is_file())
+        except OSError:
+            continue
+        existing:set[str] = set(names)
+        for name in names:
+            case_stem, case_ext = os.path.splitext(name)
+            if (case_ext in STDIN_EXTS) and name.startswith(prefix):
+                for expected_ext in EXPECTED_EXTS:
+                    if case_stem+expected_ext in existing:
+                        cases.append((os.path.relpath(os.path.join(case_folder,
+                                      case_stem), folder),
+                                      os.path.join(case_folder, name),
+                                      os.path.join(case_folder,
+                                                   case_stem+expected_ext)))
+                        break
+            elif (case_ext == ext) and (case_folder == folder) and \
+                 (case_stem.startswith(f"test_{stem}") or
+                  case_stem.startswith(f"{stem}_test")):
+                cases.append((name, os.path.join(case_folder, name), None))
+    return cases
+
+def normalise(output:str) -> list[str]:
+    lines:list[str] = [line.rstrip() for line in output.splitlines()]
+    while lines and (not lines[-1]):
+        lines.pop()
+    return lines
+
+
+class TestRunner:
+    __slots__ = "plan", "results"
+
+    def __init__(self, plan:dict) -> TestRunner:
+        self.results:dict[str:dict] = {}
+        self.plan:dict = plan
+
+    def run(self) -> int:
+        cases:list[Case] = find_cases(self.plan["source"])
+        if self.plan.get("only_failed", False):
+            failed:set[str] = self.last_failed()
+            if failed is not None:
+                cases:list[Case] = [case for case in cases if case[0] in failed]
+        if not cases:
+            print("testrunner: no test cases found")
+            return 0
+        jobs:int = self.plan.get("jobs", 0) or os.cpu_count() or 1
+        start:float = perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures:list = [pool.submit(self.run_case, case) for case in cases]
+            for future in as_completed(futures):
+                result:dict = future.result()
+                self.results[result["name"]] = result
+                print(f"{result['status']:<5} {result['time']:7.3f}s " \
+                      f"{result['name']}", flush=True)
+        duration:float = perf_counter() - start
+        failed:list[dict] = [result for result in self.results.values()
+                             if result["status"] in FAILED_STATUSES]
+        skipped:int = sum(result["status"] == "SKIP"
+                          for result in self.results.values())
+        passed:int = len(cases) - len(failed) - skipped
+        print(f"\n{passed} passed, {len(failed)} failed, {skipped} skipped " \
+              f"in {duration:.3f}s")
+        self.save_state()
+        self.show_failures(sorted(failed, key=lambda result: result["name"]))
+        return 1 if failed else 0
+
+    def run_case(self, case:Case) -> dict:
+        name, path, expected_path = case
+        if expected_path is None:
+            command:list[str] = [path if arg == "{test}" else arg
+                                 for arg in (self.plan.get("test") or [])]
+            if not command:
+                return {"name":name, "status":"SKIP", "time":0, "diff":"",
+                        "stderr":"No test command for test files"}
+        else:
+            command:list[str] = self.plan["run"]
+        start:float = perf_counter()
+        try:
+            with open(path if expected_path else os.devnull, "rb") as stdin:
+                proc = run(command, stdin=stdin, stdout=PIPE, stderr=PIPE,
+                           cwd=self.plan.get("cwd", None),
+                           timeout=self.plan.get("timeout", None))
+        except TimeoutExpired:
+            return {"name":name, "status":"TIME", "time":perf_counter()-start,
+                    "diff":"", "stderr":f"Timed out after " \
+                                        f"{self.plan['timeout']}s"}
+        except OSError as error:
+            return {"name":name, "status":"ERROR", "time":0, "diff":"",
+                    "stderr":str(error)}
+        result:dict = {"name":name, "time":perf_counter()-start, "diff":"",
+                       "stderr":proc.stderr.decode("utf-8", errors="replace")}
+        if proc.returncode != 0:
+            result["status"] = "ERROR"
+            result["stderr"] += f"\nexit code {proc.returncode}"
+            return result
+        if expected_path is None:
+            result["status"] = "PASS"
+            return result
+        with open(expected_path, "r", errors="replace") as file:
+            expected:list[str] = normalise(file.read())
+        got:list[str] = normalise(proc.stdout.decode("utf-8", errors="replace"))
+        result["status"] = "PASS" if expected == got else "FAIL"
+        if expected != got:
+            result["diff"] = "\n".join(difflib.unified_diff(expected, got,
+                                                            "expected", "got",
+                                                            lineterm=""))
+        return result
+
+    def last_failed(self) -> set[str]|None:
+        try:
+            with open(self.plan["state"], "r") as file:
+                return set(json.loads(file.read())["failed"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_state(self) -> None:
+        # Cases that weren't run keep their old state
+        failed:set[str] = (self.last_failed() or set()) - set(self.results)
+        failed |= {name for name, result in self.results.items()
+                   if result["status"] in FAILED_STATUSES}
+        with open(self.plan["state"], "w") as file:
+            file.write(json.dumps({"failed":sorted(failed)}))
+
+    def show_failures(self, failed:list[dict]) -> None:
+        if not failed:
+            return None
+        with open(self.plan["state"]+".diffs", "w") as file:
+            for result in failed:
+                file.write(f"=== {result['name']} ({result['status']})\n")
+                file.write(result["diff"] + "\n" + result["stderr"] + "\n")
+        for result in failed:
+            print(f"\n=== {result['name']} ({result['status']})")
+            lines:list[str] = result["diff"].splitlines()
+            if lines:
+                print("\n".join(lines[:MAX_DIFF_LINES]))
+            if len(lines) > MAX_DIFF_LINES:
+                print(f"... ({len(lines)-MAX_DIFF_LINES} more lines)")
+            if result["stderr"].strip():
+                print(result["stderr"][-MAX_STDERR:].strip())
+        print(f"\nAll diffs: {self.plan['state']}.diffs", flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <plan.json>", file=sys.stderr)
+        sys.exit(2)
+    with open(sys.argv[1], "r") as file:
+        plan:dict = json.loads(file.read())
+    sys.exit(TestRunner(plan).run())
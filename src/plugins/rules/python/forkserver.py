@@ -0,0 +1,396 @@
+"""
+Warm starts for python runs. Used by the python run manager instead of
+`python3 -i file.py`:
+    python3 forkserver.py [--modules a,b] [-i] file.py [args...]
+
+There is one fork server per (project folder, python executable). It has
+already imported the (heavy) modules that the project uses so running a
+file is just a fork. The client sends the server its stdin/stdout/stderr,
+cwd, argv and environment over a unix socket. The server forks a child that
+runs the file in a clean `__main__` and reports the exit code and resource
+usage back. The usage is written to the fd in $TERMINALTK_USAGE_FD (if set)
+so that the terminal reports the child's usage instead of the client's
+(which did none of the work). The client forwards the signals it gets
+(from the terminal) to the child and exits with the child's exit code.
+SIGSTOP can't be forwarded so pausing the run only pauses the client.
+
+The modules come from --modules and from the modules that previous runs
+imported from site-packages (they are learned). If the server doesn't have
+all of them imported (or isn't running), the file is run cold (using exec)
+and a new server is started in the background for the next run.
+"""
+from __future__ import annotations
+from importlib import import_module
+from hashlib import sha256
+from time import monotonic
+import selectors
+import traceback
+import socket
+import signal
+import json
+import sys
+import os
+
+
+ROOT:str = os.path.join(os.environ.get("XDG_CACHE_HOME", "") or \
+                        os.path.join(os.path.expanduser("~"), ".cache"),
+                        "bismuth-184", "forkserver")
+# The server exits if it's unused for this long (in seconds)
+IDLE_TIMEOUT:float = 30*60
+MAX_MESSAGE:int = 1<<20
+FORWARDED_SIGNALS:tuple[str] = ("SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT",
+                                "SIGUSR1", "SIGUSR2", "SIGWINCH", "SIGCONT")
+LEARN_FROM:tuple[str] = ("site-packages", "dist-packages")
+USAGE_FD_ENV:str = "TERMINALTK_USAGE_FD"
+# ru_maxrss is in bytes on macos and in KiB everywhere else
+MAXRSS_UNIT:int = 1 if sys.platform == "darwin" else 1024
+
+
+def state_folder(project:str) -> str:
+    key:bytes = f"{os.path.realpath(project)}\x00{sys.executable}".encode()
+    return os.path.join(ROOT, sha256(key).hexdigest()[:16])
+
+def read_learned(folder:str) -> set[str]:
+    try:
+        with open(os.path.join(folder, "learned.json"), "r") as file:
+            return set(json.loads(file.read()))
+    except (OSError, ValueError):
+        return set()
+
+def write_learned(folder:str, modules:set[str]) -> None:
+    tmp:str = os.path.join(folder, f"learned.{os.getpid()}.json")
+    try:
+        with open(tmp, "w") as file:
+            file.write(json.dumps(sorted(modules)))
+        os.replace(tmp, os.path.join(folder, "learned.json"))
+    except OSError:
+        pass
+
+def imported_third_party() -> set[str]:
+    modules:set[str] = set()
+    for name, module in list(sys.modules.items()):
+        filepath:str = getattr(module, "__file__", None) or ""
+        if ("." not in name) and any(part in filepath for part in LEARN_FROM):
+            modules.add(name)
+    return modules
+
+def send_msg(conn:socket.socket, msg:dict, fds:list[int]=[]) -> None:
+    data:bytes = json.dumps(msg).encode("utf-8") + b"\n"
+    if fds:
+        socket.send_fds(conn, [data], fds)
+    else:
+        conn.sendall(data)
+
+def recv_msg(conn:socket.socket, buffer:bytearray) -> dict|None:
+    while b"\n" not in buffer:
+        chunk:bytes = conn.recv(MAX_MESSAGE)
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    line, _, rest = bytes(buffer).partition(b"\n")
+    buffer[:] = rest
+    return json.loads(line.decode("utf-8"))
+
+
+class Server:
+    __slots__ = "folder", "path", "modules", "sock", "selector", "children", \
+                "accepting", "last_used"
+
+    def __init__(self, folder:str, modules:set[str]) -> Server:
+        self.path:str = os.path.join(folder, "server.sock")
+        self.children:dict[int:socket.socket] = {}
+        # Modules that fail to import still count (so that we don't restart
+        #   the server on every run because of them)
+        self.modules:set[str] = set(modules)
+        self.last_used:float = monotonic()
+        self.accepting:bool = True
+        self.folder:str = folder
+        for module in sorted(modules):
+            try:
+                import_module(module)
+            except BaseException:
+                pass
+        self.sock:socket.socket = socket.socket(socket.AF_UNIX)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.sock.bind(self.path)
+        self.sock.listen()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+
+    def serve(self) -> None:
+        while self.accepting or self.children:
+            for _ in self.selector.select(timeout=0.05):
+                self.accept()
+            self.reap()
+            if (not self.children) and self.accepting and \
+               (monotonic()-self.last_used > IDLE_TIMEOUT):
+                self.stop_accepting()
+        self.sock.close()
+
+    def stop_accepting(self) -> None:
+        if not self.accepting:
+            return None
+        self.accepting:bool = False
+        self.selector.unregister(self.sock)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def accept(self) -> None:
+        conn, _ = self.sock.accept()
+        self.last_used:float = monotonic()
+        try:
+            data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 3)
+            request:dict = json.loads(data.decode("utf-8"))
+        except (OSError, ValueError):
+            conn.close()
+            return None
+        if (len(fds) != 3) or (not set(request["modules"]) <= self.modules):
+            # The client will run cold and start a new server
+            send_msg(conn, {"ok":False})
+            conn.close()
+            for fd in fds:
+                os.close(fd)
+            self.stop_accepting()
+            return None
+        pid:int = os.fork()
+        if pid == 0:
+            self.sock.close()
+            conn.close()
+            run_child(request, fds, self.folder)
+        for fd in fds:
+            os.close(fd)
+        self.children[pid] = conn
+        send_msg(conn, {"ok":True, "pid":pid})
+
+    def reap(self) -> None:
+        for pid, conn in list(self.children.items()):
+            try:
+                done, status, rusage = os.wait4(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status, rusage = pid, 0, None
+            if done == 0:
+                continue
+            usage:dict[str:float]|None = None
+            if rusage is not None:
+                usage:dict[str:float] = {"user":rusage.ru_utime,
+                                         "sys":rusage.ru_stime,
+                                         "maxrss":rusage.ru_maxrss*MAXRSS_UNIT}
+            try:
+                send_msg(conn, {"exit_code":os.waitstatus_to_exitcode(status),
+                                "usage":usage})
+            except OSError:
+                pass
+            conn.close()
+            self.children.pop(pid)
+
+
+def run_child(request:dict, fds:list[int], folder:str) -> None:
+    """
+    Runs in the forked child. Never returns.
+    """
+    exit_code:int = 0
+    try:
+        for signame in FORWARDED_SIGNALS:
+            if hasattr(signal, signame):
+                signal.signal(getattr(signal, signame), signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for i, fd in enumerate(fds):
+            os.dup2(fd, i)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False,
+                          buffering=1 if os.isatty(1) else -1)
+        sys.stderr = open(2, "w", closefd=False, buffering=1,
+                          errors="backslashreplace")
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        exit_code:int = run_main(request["file"], request["argv"],
+                                 request["interactive"])
+        import atexit
+        atexit._run_exitfuncs()
+        learned:set[str] = read_learned(folder)
+        new:set[str] = imported_third_party()
+        if not (new <= learned):
+            write_learned(folder, learned|new)
+    except BaseException:
+        traceback.print_exc()
+        exit_code:int = 1
+    finally:
+        for file in (sys.stdout, sys.stderr):
+            try:
+                file.flush()
+            except BaseException:
+                pass
+        os._exit(exit_code)
+
+def run_main(filepath:str, argv:list[str], interactive:bool) -> int:
+    import builtins, types
+    main = types.ModuleType("__main__")
+    main.__file__:str = filepath
+    main.__builtins__ = builtins
+    sys.modules["__main__"] = main
+    sys.argv:list[str] = [filepath] + argv
+    sys.path[0] = os.path.dirname(os.path.abspath(filepath))
+    try:
+        with open(filepath, "rb") as file:
+            code = compile(file.read(), filepath, "exec")
+        exec(code, main.__dict__)
+    except SystemExit as error:
+        if not interactive:
+            return system_exit_code(error)
+        traceback.print_exc() # Like `python3 -i`
+    except BaseException:
+        traceback.print_exc()
+        if not interactive:
+            return 1
+    if not interactive:
+        return 0
+    import code
+    try:
+        import readline
+    except ImportError:
+        pass
+    try:
+        code.interact(banner="", local=main.__dict__, exitmsg="")
+    except SystemExit as error:
+        return system_exit_code(error)
+    return 0
+
+def system_exit_code(error:SystemExit) -> int:
+    if error.code is None:
+        return 0
+    if isinstance(error.code, int):
+        return error.code
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+class Client:
+    __slots__ = "folder", "modules", "file", "argv", "interactive", \
+                "usage_fd"
+
+    def __init__(self, modules:set[str], file:str, argv:list[str],
+                 interactive:bool) -> Client:
+        self.folder:str = state_folder(os.getcwd())
+        self.modules:set[str] = modules | read_learned(self.folder)
+        self.interactive:bool = interactive
+        self.argv:list[str] = argv
+        self.file:str = file
+        # Not for the program (or the fork server's child)
+        usage_fd:str = os.environ.pop(USAGE_FD_ENV, "")
+        self.usage_fd:int|None = int(usage_fd) if usage_fd.isdigit() else None
+
+    def run(self) -> None:
+        if hasattr(os, "fork") and hasattr(socket, "send_fds"):
+            exit_code:int|None = self.run_warm()
+            if exit_code is not None:
+                self.exit(exit_code)
+            self.start_server()
+        self.run_cold()
+
+    def run_warm(self) -> int|None:
+        conn:socket.socket = socket.socket(socket.AF_UNIX)
+        try:
+            conn.connect(os.path.join(self.folder, "server.sock"))
+            request:dict = {"modules":sorted(self.modules), "cwd":os.getcwd(),
+                            "env":dict(os.environ), "file":self.file,
+                            "argv":self.argv, "interactive":self.interactive}
+            send_msg(conn, request, [0, 1, 2])
+            buffer:bytearray = bytearray()
+            reply:dict|None = recv_msg(conn, buffer)
+            if (reply is None) or (not reply["ok"]):
+                return None
+            self.forward_signals(reply["pid"])
+            while True:
+                try:
+                    reply:dict|None = recv_msg(conn, buffer)
+                    break
+                except InterruptedError:
+                    continue
+            if reply is None:
+                return 1
+            self.report_usage(reply.get("usage", None))
+            return reply["exit_code"]
+        except OSError:
+            return None
+        finally:
+            conn.close()
+
+    def report_usage(self, usage:dict[str:float]|None) -> None:
+        if (self.usage_fd is None) or (usage is None):
+            return None
+        try:
+            os.write(self.usage_fd, json.dumps(usage).encode("utf-8"))
+        except OSError:
+            pass
+
+    def forward_signals(self, pid:int) -> None:
+        def forward(signum:int, frame:object) -> None:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+        for signame in FORWARDED_SIGNALS:
+            if hasattr(signal, signame):
+                signal.signal(getattr(signal, signame), forward)
+
+    def exit(self, exit_code:int) -> None:
+        sys.stdout.flush()
+        if exit_code < 0:
+            # Die from the same signal so that our parent sees it
+            signal.signal(-exit_code, signal.SIG_DFL)
+            os.kill(os.getpid(), -exit_code)
+        os._exit(exit_code & 0xff)
+
+    def start_server(self) -> None:
+        from subprocess import Popen, DEVNULL
+        os.makedirs(self.folder, exist_ok=True)
+        command:list[str] = [sys.executable, __file__, "--serve", self.folder,
+                             "--modules", ",".join(sorted(self.modules))]
+        Popen(command, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+              start_new_session=True, cwd=os.getcwd())
+
+    def run_cold(self) -> None:
+        command:list[str] = [sys.executable]
+        if self.interactive:
+            command.append("-i")
+        command += [self.file] + self.argv
+        if self.usage_fd is not None:
+            # Our own usage is the program's usage
+            os.close(self.usage_fd)
+        sys.stdout.flush()
+        os.execv(sys.executable, command)
+
+
+def parse_args(argv:list[str]) -> tuple[set[str],bool,list[str]]:
+    modules:set[str] = set()
+    interactive:bool = False
+    while argv:
+        if argv[0] == "--modules":
+            modules |= {module for module in argv[1].split(",") if module}
+            argv:list[str] = argv[2:]
+        elif argv[0] == "-i":
+            interactive:bool = True
+            argv:list[str] = argv[1:]
+        else:
+            break
+    return modules, interactive, argv
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        folder:str = sys.argv[2]
+        modules, _, _ = parse_args(sys.argv[3:])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        Server(folder, modules).serve()
+    else:
+        modules, interactive, argv = parse_args(sys.argv[1:])
+        if not argv:
+            print(f"Usage: {sys.argv[0]} [--modules a,b] [-i] file [args...]",
+                  file=sys.stderr)
+            sys.exit(2)
+        Client(modules, argv[0], argv[1:], interactive).run()
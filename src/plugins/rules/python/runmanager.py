@@ -3,6 +3,10 @@ from sys import executable
 import os
 
 from ..runmanager import RunManager as BaseRunManager
+from settings.settings import curr as settings
+
+
+FORKSERVER_PATH:str = os.path.join(os.path.dirname(__file__), "forkserver.py")
 
 
 class RunManager(BaseRunManager):
@@ -12,6 +16,26 @@ class RunManager(BaseRunManager):
     COMPILE:list[str] = []
     RUN:list[str] = [executable, "-i", "{file}"]
     # RUN:list[str] = ["bash", "-c", "source env/bin/activate && python3 -i {file}"]
+    TEST:list[str] = [executable, "{test}"]
+    TEST_RUN:list[str] = [executable, "{file}"]
+    WARM_RUN:list[str] = [executable, FORKSERVER_PATH, "--modules", "{modules}",
+                          "-i", "{file}"]
+    WARM_TEST_RUN:list[str] = [executable, FORKSERVER_PATH, "--modules",
+                               "{modules}", "{file}"]
 
     def cd(self, *, print_str:str="") -> None:
         super().cd(os.path.dirname(self.text.filepath), print_str=print_str)
+
+    def execute(self, args:Iterable[str], *, print_str:str="") -> None:
+        if not settings.python.warm_run:
+            return super().execute(args, print_str=print_str)
+        modules:str = ",".join(settings.python.warm_modules)
+        # Benchmarks (`self.bench`) don't need the interactive prompt
+        warm_run:list[str] = self.WARM_TEST_RUN if self.bench else \
+                             self.WARM_RUN
+        command = self.format(warm_run, {"file":self.text.filepath,
+                                         "modules":modules}) + list(args)
+        if print_str:
+            self.queue(["print!", print_str])
+        # The fork server's child does the work so report its usage
+        self.queue(command, child_usage=True, **self.execute_options())
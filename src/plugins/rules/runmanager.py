@@ -1,27 +1,42 @@
 from __future__ import annotations
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 from tempfile import TemporaryDirectory
+from sys import executable
+import json
 import os
 
-from bettertk.terminaltk.terminaltk import TerminalTk
+from bettertk.terminaltk.terminaltk import TerminalTk, TerminalPool, Script
+from settings.settings import curr as settings
 from bettertk.messagebox import tell as telluser
 from .baserule import Rule, SHIFT, ALT, CTRL
 
 
+TESTRUNNER_PATH:str = os.path.join(os.path.dirname(__file__), "helpers",
+                                   "testrunner.py")
+# Started terminals waiting to be used by any RunManager
+TERMINAL_POOL:TerminalPool = TerminalPool(size=settings.terminal.pool_size)
+
+
 class RunManager(Rule):
-    __slots__ = "text", "args", "term", "cwd", "tmp", "effective_cwd"
+    __slots__ = "text", "args", "term", "cwd", "tmp", "effective_cwd", \
+                "script", "bench"
     REQUESTED_LIBRARIES:list[tuple[str,bool]] = [("bind_all",True)]
 
     CD:list[str] = ["cd", "{folder}"]
     COMPILE:list[str] = None
     RUN:list[str] = None
-    TEST:list[str] = None # No key binding yet
+    TEST:list[str] = None # Runs a test file ("{test}")
+    TEST_RUN:list[str] = None # Runs a test case/benchmark (defaults to RUN)
     AFTER:list[str] = None
 
     def __init__(self, plugin:BasePlugin, text:tk.Text) -> Rule:
         evs:tuple[str] = (
                            # Run the code
                            "<F5>",
+                           # Benchmark the code
+                           "<Control-F5>",
+                           # Test the code (shift to only rerun failed tests)
+                           "<F6>",
                            # Set/Remove cwd
                            "a<<Explorer-Set-CWD>>", "a<<Explorer-Unset-CWD>>",
                          )
@@ -29,6 +44,8 @@ class RunManager(Rule):
         self.tmp:TemporaryDirectory = None
         self.text:tk.Text = self.widget
         self.term:TerminalTk = None
+        self.script:Script = None
+        self.bench:dict = {}
         self.args:list[str] = []
         self.cwd:str = None
 
@@ -39,11 +56,24 @@ class RunManager(Rule):
             value:str = value.strip(":")
         assert isinstance(value, str), "TypeError"
         os.environ[variable] = value # Security issue
-        self.term.queue(["export", variable, value], condition=(0).__eq__)
+        self.queue(["export", variable, value])
+
+    def queue(self, command:list[str], **options:dict) -> None:
+        """
+        Add a command to the script that is sent to the terminal (in one go)
+        at the end of `run`. Later commands are skipped if it fails. The
+        options are passed to `Script.add`.
+        """
+        options.setdefault("coalesce", settings.run.coalesce_output)
+        self.script.add(command, stop_on_failure=True, **options)
+
+    def report(self, name:str) -> str|None:
+        return name if settings.run.report_usage else None
 
     def attach(self) -> None:
         super().attach()
         self.text.event_generate("<<Explorer-Report-CWD>>")
+        TERMINAL_POOL.prewarm(self.text)
 
     def applies(self, event:tk.Event, on:str) -> tuple[...,Applies]:
         data:str = None
@@ -57,7 +87,7 @@ class RunManager(Rule):
     def destroy(self) -> None:
         if (self.term is not None) and (self.term.running()):
             self.term.queue_clear(stop_cur_proc=True)
-            self.term.close()
+            TERMINAL_POOL.release(self.term)
         self.cleanup()
         super().destroy()
 
@@ -72,6 +102,12 @@ class RunManager(Rule):
             else:
                 self.run(args=[])
             return False
+        if on == "control-f5":
+            self.run_benchmark()
+            return False
+        if on == "f6":
+            self.run(args=[], test=True, only_failed=shift)
+            return False
 
         if on == "<explorer-set-cwd>":
             self.cwd:str = data
@@ -87,7 +123,25 @@ class RunManager(Rule):
         print("Implement: saverunmanager@run_with_args")
         self.run(args=[])
 
-    def run(self, args:Iterable[str]) -> None:
+    def run_benchmark(self) -> None:
+        """
+        Runs the program `settings.run.benchmark_runs` times (with the same
+        stdin file) and reports the min/median/stddev of the times. The runs
+        use `TEST_RUN` (if set) so that they don't start an interactive
+        prompt after the program
+        """
+        stdin:str = askopenfilename(parent=self.text,
+                                    title="Stdin for the benchmark (cancel " \
+                                          "for none)")
+        self.bench:dict = {"repeat":settings.run.benchmark_runs,
+                           "stdin":stdin or os.devnull}
+        try:
+            self.run(args=[])
+        finally:
+            self.bench:dict = {}
+
+    def run(self, args:Iterable[str], *, test:bool=False,
+            only_failed:bool=False) -> None:
         if self.text.edit_modified():
             title:str = "Save first"
             msg:str = "You need to save before you can run the file."
@@ -96,7 +150,7 @@ class RunManager(Rule):
             return None
 
         if (self.term is None) or (not self.term.running()):
-            self.term = TerminalTk(self.widget)
+            self.term = TERMINAL_POOL.acquire(self.widget)
             # Nothing generates this event...
             # self.term.bind("<<Closing-Terminal>>", self.cleanup)
             print_str:str = self.center("Starting", "=")
@@ -111,10 +165,15 @@ class RunManager(Rule):
         self.term.topmost(True)
         self.term.topmost(False)
         self.term.focus_set()
+        self.script:Script = Script()
         self.cd(print_str=print_str)
         if self.compile(): # must be after self.cd
-            self.execute(args)
+            if test:
+                self.test(only_failed=only_failed)
+            else:
+                self.execute(args)
         self.after()
+        self.term.queue(self.script)
 
     def center(self, string:str, fill:str) -> str:
         return f" {string} ".center(80, fill) + "\n"
@@ -125,8 +184,8 @@ class RunManager(Rule):
         self.effective_cwd:str = self.cwd or req_cwd or self.tmp.name
         command:tuple[str] = self.format(self.CD, {"folder":self.effective_cwd})
         if print_str:
-            self.term.queue(["print!", print_str], condition=(0).__eq__)
-        self.term.queue(command, condition=(0).__eq__)
+            self.queue(["print!", print_str])
+        self.queue(command)
 
     def compile(self, *, print_str:str="", command:list[str]=None) -> bool:
         if (self.COMPILE is None) and (command is None):
@@ -137,18 +196,26 @@ class RunManager(Rule):
         command:list[str] = self.format(command, {"file":self.text.filepath,
                                                   "tmp":self.tmp.name})
         if print_str:
-            self.term.queue(["print!", print_str], condition=(0).__eq__)
-        self.term.queue(command, condition=(0).__eq__)
+            self.queue(["print!", print_str])
+        self.queue(command, report=self.report("Compiled"))
         return True
 
     def execute(self, args:Iterable[str], *, print_str:str="") -> None:
-        if self.RUN is None:
+        run:list[str]|None = self.RUN
+        if self.bench and (self.TEST_RUN is not None):
+            run:list[str] = self.TEST_RUN
+        if run is None:
             return None
-        command = self.format(self.RUN, {"file":self.text.filepath,
-                                         "tmp":self.tmp.name}) + list(args)
+        command = self.format(run, {"file":self.text.filepath,
+                                    "tmp":self.tmp.name}) + list(args)
         if print_str:
-            self.term.queue(["print!", print_str], condition=(0).__eq__)
-        self.term.queue(command, condition=(0).__eq__)
+            self.queue(["print!", print_str])
+        self.queue(command, **self.execute_options())
+
+    def execute_options(self) -> dict:
+        if self.bench:
+            return {"report":"Ran", **self.bench}
+        return {"report":self.report("Ran")}
 
     def after(self, *, print_str:str="", command:list[str]=None) -> None:
         if (self.AFTER is None) and (command is None):
@@ -156,15 +223,34 @@ class RunManager(Rule):
         command:list[str] = command or self.AFTER
         command:list[str] = self.format(command, {"file":self.text.filepath})
         if print_str:
-            self.term.queue(["print!", print_str], condition=(0).__eq__)
-        self.term.queue(command, condition=(0).__eq__)
+            self.queue(["print!", print_str])
+        self.queue(command)
 
-    def test(self, args:Iterable[str], *, print_str:str="") -> None:
+    def test(self, *, only_failed:bool=False, print_str:str="") -> None:
+        """
+        Runs the test cases next to the file (see helpers/testrunner.py) in
+        parallel using the program that `compile` built
+        """
         if self.RUN is None:
             return None
-        command = self.format(self.TEST, {"file":self.text.filepath,
-                                          "tmp":self.tmp.name}) + list(args)
-        self.term.queue(command, condition=(0).__eq__)
+        kwargs:dict[str:str] = {"file":self.text.filepath, "tmp":self.tmp.name}
+        plan:dict = {
+                      "source": os.path.abspath(self.text.filepath),
+                      "run": self.format(self.TEST_RUN or self.RUN, kwargs),
+                      "test": self.format(self.TEST or [], kwargs) or None,
+                      "timeout": settings.test.timeout,
+                      "jobs": settings.test.jobs,
+                      "state": os.path.join(self.tmp.name, "tests.json"),
+                      "only_failed": only_failed,
+                      "cwd": self.effective_cwd,
+                    }
+        plan_path:str = os.path.join(self.tmp.name, "tests-plan.json")
+        with open(plan_path, "w") as file:
+            file.write(json.dumps(plan))
+        if print_str:
+            self.queue(["print!", print_str])
+        self.queue([executable, TESTRUNNER_PATH, plan_path],
+                   report=self.report("Tested"))
 
     @staticmethod
     def format(text:list[str], kwargs:dict[str,str]) -> list[str]:
@@ -71,6 +71,7 @@ class RunManager(BaseRunManager):
 
     COMPILE:list[str] = []
     RUN:list[str] = ["bash", "--rcfile", "{tmp}/bashrc", "-i"]
+    TEST_RUN:list[str] = ["bash", "{file}"]
 
     def cd(self, *, print_str:str="") -> None:
         super().cd(os.path.dirname(self.text.filepath), print_str=print_str)
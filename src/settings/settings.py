@@ -129,3 +129,27 @@ curr.editor.set_default("blockcursor", False)
 curr.editor.set_default("padx", (3,3))
 curr.editor.set_default("xscroll_speed", 20)
 curr.editor.set_default("yscroll_speed", 35)
+
+curr.set_default("terminal", {})
+curr.terminal.set_default("pool_size", 1)
+
+curr.set_default("build", {})
+curr.build.set_default("incremental", True)
+curr.build.set_default("profile", "release") # or "debug" (no LTO/-O3)
+curr.build.set_default("jobs", 0) # 0 means one per core
+curr.build.set_default("precompiled_headers", True) # Only for C++
+
+curr.set_default("python", {})
+curr.python.set_default("warm_run", False) # Run using a fork server
+curr.python.set_default("warm_modules", []) # Imported by the fork server
+
+curr.set_default("run", {})
+curr.run.set_default("report_usage", True) # Time/memory after each run
+curr.run.set_default("benchmark_runs", 10) # For <Control-F5>
+# Opt-in: throttle programs that flood the terminal. It drops/merges output
+#   and breaks full screen (curses) programs so it's off by default
+curr.run.set_default("coalesce_output", False)
+
+curr.set_default("test", {})
+curr.test.set_default("timeout", 5) # Per test case (in seconds)
+curr.test.set_default("jobs", 0) # 0 means one per core